@@ -7,7 +7,16 @@ from flask_login import LoginManager
 import os
 #Importation du module os qui permet d'interagir avec le système d'exploitation.
 from .constantes import CONFIG
+from .cache import configurer_cache
+from .encodage import configurer_encodeur
+from .metriques import configurer_metriques
+from .lenteurs import configurer_lenteurs
+from .hachage import hachage
 import sqlite3
+#Importation de sqlite3 pour reconnaître les connexions SQLite lors de l'application du profil de connexion.
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+#Importation du système d'événements de SQLAlchemy, pour configurer chaque nouvelle connexion à la base.
 
 #Stockage du chemin absolu du fichier qui contient le code.
 chemin_actuel = os.path.dirname(os.path.abspath(__file__))
@@ -31,6 +40,23 @@ app = Flask(
 
 #Importation des routes depuis le dossier routes
 from .routes import api, generic
+from .modeles.recherche import creer_index
+from .modeles.unicite import uniques
+from .modeles.lecture import lecture
+from .migrations import migrer
+#Importation des commandes 'flask ...' depuis le fichier commandes.py
+from . import commandes
+
+@event.listens_for(Engine, "connect")
+def appliquer_pragmas(connexion, enregistrement):
+    """
+    Fonction appelée à l'ouverture de chaque connexion à la base : applique le profil SQLite (SQLITE_PRAGMAS) de la configuration.
+    """
+    if isinstance(connexion, sqlite3.Connection):
+        curseur = connexion.cursor()
+        for pragma, valeur in app.config.get("SQLITE_PRAGMAS", {}).items():
+            curseur.execute("PRAGMA {} = {}".format(pragma, valeur))
+        curseur.close()
 
 def config_app(config_name="production"):
     """ Fonction de configuration de l'application """
@@ -40,5 +66,20 @@ def config_app(config_name="production"):
     # Set up extensions
     db.init_app(app)
     login.init_app(app)
+    # Mise en place du cache des pages consultées par les visiteurs anonymes.
+    configurer_cache(app.config)
+    lecture.configurer(app.config)
+    configurer_encodeur(app.config)
+    # Mesure des requêtes (metriques.py), à mettre en place avant la première connexion à la base.
+    configurer_metriques(app)
+    configurer_lenteurs(app.config)
+    hachage.configurer(app.config)
+    # Mise à jour du schéma de la base (migrations.py), création (au premier lancement) de l'index plein-texte utilisé par la recherche,
+    # puis chargement de l'index d'unicité des identifiants externes et des noms (unicite.py) et du modèle de lecture (lecture.py).
+    with app.app_context():
+        migrer()
+        creer_index()
+        uniques.charger()
+        lecture.charger()
 
     return app
\ No newline at end of file
@@ -0,0 +1,406 @@
+import datetime
+#Importation du module datetime pour dater les résultats.
+import platform
+#Importation du module platform pour décrire la machine sur laquelle les mesures ont été faites.
+import random
+#Importation du module random : les notices, pages et mots-clés demandés sont tirés avec une graine, pour des mesures reproductibles.
+import sqlite3
+#Importation de sqlite3 pour connaître la version de SQLite utilisée.
+import subprocess
+#Importation de subprocess pour lire la version (commit git) du code mesuré.
+import time
+#Importation du module time pour mesurer la durée de chaque requête.
+from flask_login import login_user
+#Importation de login_user pour exécuter les méthodes d'écriture au nom d'un utilisateur, comme depuis les formulaires.
+from sqlalchemy import event
+#Importation du système d'événements de SQLAlchemy, pour compter les requêtes SQL envoyées à la base.
+from .app import app, db
+#Importation de l'application et de la base de données
+from .cache import configurer_cache
+#Importation de la configuration du cache de réponses, désactivé pendant les mesures des lectures.
+from .modeles.donnees import Poet, Publication, Military_status
+#Importation des classes dont les méthodes d'écriture sont mesurées, déclarées dans le fichier donnees.py
+from .modeles.importation import Importation
+#Importation de l'import en masse, déclaré dans le fichier importation.py
+from .modeles.synthese import enregistrements, deja_enregistre
+#Importation du générateur de notices synthétiques, déclaré dans le fichier synthese.py
+from .constantes import POETES_PAR_PAGE, API_ROUTE
+#Importation du nombre de résultats par page et du préfixe des routes de l'API
+
+# BANC DE MESURE DES PERFORMANCES #
+# Mesure, sur la base configurée (par exemple une base synthétique créée par 'flask generer', voir WWIPOETS_BASE dans constantes.py),
+# la durée et le nombre de requêtes SQL de chaque route de consultation et de chaque méthode d'écriture des modèles.
+# Les routes sont appelées avec le client de test de Flask (sans serveur ni réseau), pour un visiteur anonyme (modèle de lecture)
+# et pour un utilisateur connecté (lecture de la base) ; le cache de réponses est désactivé, sauf demande contraire.
+# Les résultats (percentiles des durées en millisecondes, requêtes SQL par appel) sont enregistrés en Json,
+# et peuvent être comparés à ceux d'une mesure de référence pour repérer une régression (commande 'flask banc').
+
+PROFILS = ("anonyme", "connecte")
+PERCENTILES = (50, 95, 99)
+MOTS_CLES = ["tranchée", "Verdun", "poèmes", "Paris", "soldat"]
+BANC_DEBUT = 10 ** 8
+#Numéro de la première notice créée par le banc : ses identifiants externes ne rencontrent pas ceux d'une base générée.
+IMPORT_TAILLE = 20
+#Nombre de notices par import mesuré.
+SUPPRESSION_TAILLE = 10
+#Nombre de notices par suppression mesurée.
+
+
+class CompteurRequetes:
+    """
+    Compteur des requêtes SQL envoyées à la base (une instruction exécutée pour plusieurs lignes, executemany, compte pour une).
+    """
+
+    def __init__(self, moteur):
+        """
+        :param moteur: moteur SQLAlchemy de l'application (db.engine)
+        """
+        self.moteur = moteur
+        self.nombre = 0
+
+    def compter(self, connexion, curseur, instruction, parametres, contexte, executemany):
+        """ Fonction appelée par SQLAlchemy avant chaque requête envoyée à la base. """
+        self.nombre += 1
+
+    def __enter__(self):
+        event.listen(self.moteur, "before_cursor_execute", self.compter)
+        return self
+
+    def __exit__(self, *exception):
+        event.remove(self.moteur, "before_cursor_execute", self.compter)
+
+
+def percentile(valeurs, rang):
+    """
+    Fonction qui renvoie un percentile d'une liste de valeurs triées (méthode du rang le plus proche).
+    :param valeurs: valeurs triées par ordre croissant
+    :type valeurs: list
+    :param rang: percentile demandé (entre 0 et 100)
+    :type rang: int
+    :rtype: float
+    """
+    if not valeurs:
+        return None
+    return valeurs[max(0, -(-rang * len(valeurs) // 100) - 1)]
+
+
+def resume(durees, requetes, erreurs):
+    """
+    Fonction qui résume les mesures d'un scénario.
+    :param durees: durées des appels en secondes
+    :type durees: list
+    :param requetes: nombre de requêtes SQL de chaque appel
+    :type requetes: list
+    :param erreurs: nombre d'appels en échec (code HTTP différent de 200, méthode d'écriture qui renvoie une erreur)
+    :type erreurs: int
+    :returns: dictionnaire (appels, erreurs, durées en millisecondes, requêtes SQL par appel)
+    :rtype: dict
+    """
+    durees = sorted(duree * 1000 for duree in durees)
+    mesure = {"appels": len(durees), "erreurs": erreurs}
+    for rang in PERCENTILES:
+        mesure["p{}_ms".format(rang)] = round(percentile(durees, rang), 3) if durees else None
+    mesure["moyenne_ms"] = round(sum(durees) / len(durees), 3) if durees else None
+    mesure["max_ms"] = round(durees[-1], 3) if durees else None
+    mesure["requetes_sql"] = round(sum(requetes) / len(requetes), 2) if requetes else None
+    mesure["requetes_sql_max"] = max(requetes) if requetes else None
+    return mesure
+
+
+def mesurer(action, appels, compteur, echauffement=0):
+    """
+    Fonction qui appelle une action plusieurs fois et mesure la durée et le nombre de requêtes SQL de chaque appel.
+    :param action: fonction (numéro de l'appel) -> booléen, True si l'appel a réussi
+    :param appels: nombre d'appels mesurés
+    :type appels: int
+    :param compteur: compteur de requêtes installé sur le moteur
+    :type compteur: CompteurRequetes
+    :param echauffement: nombre d'appels préalables, non mesurés (caches de SQLite et de l'application)
+    :type echauffement: int
+    :returns: résumé des mesures (voir resume)
+    :rtype: dict
+    """
+    for numero in range(echauffement):
+        action(numero)
+    durees, requetes, erreurs = [], [], 0
+    for numero in range(appels):
+        compteur.nombre = 0
+        debut = time.perf_counter()
+        reussi = action(echauffement + numero)
+        durees.append(time.perf_counter() - debut)
+        requetes.append(compteur.nombre)
+        if not reussi:
+            erreurs += 1
+    return resume(durees, requetes, erreurs)
+
+
+def echantillon(alea, taille=1000):
+    """
+    Fonction qui tire dans la base les notices, lieux et valeurs demandés par les scénarios de lecture.
+    :param alea: générateur aléatoire
+    :type alea: random.Random
+    :param taille: nombre de notices tirées
+    :type taille: int
+    :rtype: dict
+    """
+    poet_ids = [ligne[0] for ligne in db.session.execute("SELECT poet_id FROM Poet ORDER BY poet_id")]
+    publication_ids = [ligne[0] for ligne in db.session.execute("SELECT publication_id FROM Publication ORDER BY publication_id")]
+    publications = len(publication_ids)
+    tires = alea.sample(poet_ids, min(taille, len(poet_ids)))
+    noms = [ligne[0] for ligne in db.session.query(Poet.poet_name).filter(Poet.poet_id.in_(tires[:100]))]
+    annees = db.session.execute("SELECT min(poet_birth_year), max(poet_birth_year) FROM Poet").fetchone()
+    return {
+        "poet_ids": tires or [0],
+        "pages_poetes": max(1, -(-len(poet_ids) // POETES_PAR_PAGE)),
+        "pages_publications": max(1, -(-publications // POETES_PAR_PAGE)),
+        "publication_ids": publication_ids[::max(1, len(publication_ids) // taille)] or [0],
+        "place_ids": [ligne[0] for ligne in db.session.execute("SELECT place_id FROM Place ORDER BY place_id LIMIT 200")] or [0],
+        "pays": [ligne[0] for ligne in db.session.execute(
+            "SELECT poet_country FROM Poet WHERE poet_country IS NOT NULL GROUP BY poet_country ORDER BY count(*) DESC LIMIT 5"
+        )] or ["française"],
+        "mots": MOTS_CLES + noms,
+        "annees": (annees[0] or 1880, annees[1] or 1900),
+        "base": {
+            "poetes": len(poet_ids),
+            "publications": publications,
+            "statuts": db.session.execute("SELECT count(*) FROM Military_status").scalar(),
+        },
+    }
+
+
+def scenarios_lecture(tirage, alea):
+    """
+    Fonction qui décrit les scénarios de lecture : une route et la façon de tirer ses paramètres.
+    :param tirage: échantillon renvoyé par echantillon()
+    :type tirage: dict
+    :param alea: générateur aléatoire
+    :type alea: random.Random
+    :returns: liste de tuples (nom du scénario, fonction () -> URL)
+    :rtype: list
+    """
+    def annee():
+        return alea.randint(*tirage["annees"]) // 10 * 10
+
+    return [
+        ("accueil", lambda: "/"),
+        ("index_individus", lambda: "/index_individus?page={}".format(alea.randint(1, tirage["pages_poetes"]))),
+        ("index_publications", lambda: "/index_publications?page={}".format(alea.randint(1, tirage["pages_publications"]))),
+        ("notice", lambda: "/poets/{}".format(alea.choice(tirage["poet_ids"]))),
+        ("recherche_mots_cles", lambda: "/recherche?keyword={}".format(alea.choice(tirage["mots"]))),
+        ("recherche_filtres", lambda: "/recherche?country={}&born_after={}&born_before={}".format(
+            alea.choice(tirage["pays"]), annee(), annee() + 9)),
+        ("chronologie", lambda: "/timeline?start={}".format(annee())),
+        ("api_poete", lambda: API_ROUTE + "/poets/{}".format(alea.choice(tirage["poet_ids"]))),
+        ("api_poetes", lambda: API_ROUTE + "/poets?after={}&limit=50".format(alea.choice(tirage["poet_ids"]))),
+        ("api_publications", lambda: API_ROUTE + "/publications?after={}&limit=50".format(alea.choice(tirage["publication_ids"]))),
+        ("api_recherche", lambda: API_ROUTE + "/search?keyword={}".format(alea.choice(tirage["mots"]))),
+        ("api_statistiques", lambda: API_ROUTE + "/stats"),
+        ("api_chronologie", lambda: API_ROUTE + "/timeline?start={}".format(annee())),
+        ("api_lieux", lambda: API_ROUTE + "/places?geo=1"),
+        ("api_lieu", lambda: API_ROUTE + "/places/{}".format(alea.choice(tirage["place_ids"]))),
+    ]
+
+
+def banc_lectures(tirage, alea, appels, echauffement, compteur, profils, user_id):
+    """
+    Fonction qui mesure chaque scénario de lecture pour chaque profil de visiteur.
+    :returns: dictionnaire {'profil/scénario': mesures}
+    :rtype: dict
+    """
+    mesures = {}
+    for profil in profils:
+        client = app.test_client()
+        if profil == "connecte":
+            with client.session_transaction() as session_client:
+                session_client["_user_id"] = str(user_id)
+                session_client["_fresh"] = True
+        for nom, url in scenarios_lecture(tirage, alea):
+            mesures[profil + "/" + nom] = mesurer(lambda numero: client.get(url()).status_code == 200, appels, compteur, echauffement)
+    return mesures
+
+
+def banc_ecritures(compte, appels, compteur, graine):
+    """
+    Fonction qui mesure les méthodes d'écriture des modèles, au nom d'un utilisateur : création et modification des notices,
+    des publications et des ESM, import en masse, puis suppression de toutes les notices créées (la base retrouve ses notices d'origine).
+    :param compte: utilisateur auquel les écritures sont attribuées
+    :type compte: User
+    :param appels: nombre d'appels de chaque méthode
+    :type appels: int
+    :param compteur: compteur de requêtes installé sur le moteur
+    :type compteur: CompteurRequetes
+    :param graine: graine du générateur des notices créées
+    :type graine: int
+    :returns: dictionnaire {'ecriture/méthode': mesures}
+    :rtype: dict
+    """
+    notices = enregistrements(appels * (IMPORT_TAILLE + 1), graine, BANC_DEBUT, deja_enregistre)
+    crees, publications, statuts = [], [], []
+    mesures = {}
+
+    def creer_poete(numero):
+        notice = next(notices)
+        reussi, poete = Poet.create_poet(*[notice[champ] for champ in
+                                           ("nom", "prenom", "nationalite", "date_naissance", "date_deces", "lieu_naissance",
+                                            "lieu_deces", "description", "login_wiki")])
+        if reussi:
+            crees.append((poete.poet_id, notice))
+        return reussi
+
+    def modifier_poete(numero):
+        poet_id, notice = crees[numero % len(crees)]
+        reussi, poete = Poet.modif_poet(poet_id, notice["nom"], notice["prenom"], notice["nationalite"], notice["date_naissance"],
+                                        notice["date_deces"], notice["lieu_naissance"], notice["lieu_deces"],
+                                        notice["description"] + " ({})".format(numero), notice["login_wiki"])
+        return reussi
+
+    def creer_publication(numero):
+        poet_id, notice = crees[numero % len(crees)]
+        reussi, publication = Publication.create_publication("Recueil {}".format(numero), "1917", "poésie", poet_id,
+                                                             notice["login_wiki"][:7] + "b" + str(numero % 100))
+        if reussi:
+            publications.append(publication.publication_id)
+        return reussi
+
+    def modifier_publication(numero):
+        publication_id = publications[numero % len(publications)]
+        publication = Publication.query.get(publication_id)
+        reussi, publication = Publication.modif_pub(publication_id, publication.publication_poet_id, publication.publication_titre,
+                                                    "19/03/1918", "prose", publication.publication_external_login)
+        return reussi
+
+    def creer_statut(numero):
+        poet_id, notice = crees[numero % len(crees)]
+        reussi, statut = Military_status.create_military_status("mobilisé", "Paris 6e b", str(numero), poet_id, "soldat",
+                                                                notice["login_wiki"][:7] + "m" + str(numero % 100))
+        if reussi:
+            statuts.append(statut.military_status_id)
+        return reussi
+
+    def modifier_statut(numero):
+        military_status_id = statuts[numero % len(statuts)]
+        statut = Military_status.query.get(military_status_id)
+        reussi, statut = Military_status.modif_statut(military_status_id, statut.military_status_statut, "Lyon",
+                                                      statut.military_status_registre_matricule, "caporal",
+                                                      statut.military_status_external_login)
+        return reussi
+
+    def importer_lot(numero):
+        lot = [next(notices) for rang in range(IMPORT_TAILLE)]
+        importation = Importation(compte.user_id)
+        rapport = importation.importer((rang, notice, None) for rang, notice in enumerate(lot, 1))
+        crees.extend((poet_id, None) for poet_id in importation.poet_ids)
+        return not rapport["erreurs"]
+
+    def supprimer(numero):
+        lot = [poet_id for poet_id, notice in crees[numero * SUPPRESSION_TAILLE:(numero + 1) * SUPPRESSION_TAILLE]]
+        return Poet.delete_poets(lot) == len(lot)
+
+    with app.test_request_context():
+        login_user(compte)
+        mesures["ecriture/create_poet"] = mesurer(creer_poete, appels, compteur)
+        if crees:
+            mesures["ecriture/modif_poet"] = mesurer(modifier_poete, appels, compteur)
+            mesures["ecriture/create_publication"] = mesurer(creer_publication, appels, compteur)
+            mesures["ecriture/create_military_status"] = mesurer(creer_statut, appels, compteur)
+        if publications:
+            mesures["ecriture/modif_pub"] = mesurer(modifier_publication, appels, compteur)
+        if statuts:
+            mesures["ecriture/modif_statut"] = mesurer(modifier_statut, appels, compteur)
+        mesures["ecriture/import_{}".format(IMPORT_TAILLE)] = mesurer(importer_lot, max(1, appels // IMPORT_TAILLE), compteur)
+        mesures["ecriture/delete_poets_{}".format(SUPPRESSION_TAILLE)] = mesurer(
+            supprimer, -(-len(crees) // SUPPRESSION_TAILLE), compteur)
+    return mesures
+
+
+def version_code():
+    """
+    Fonction qui renvoie le commit git du code mesuré, ou None hors d'un dépôt git.
+    :rtype: str or None
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app.root_path, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executer(appels=100, echauffement=5, graine=0, profils=PROFILS, compte=None, ecritures=False, cache=False):
+    """
+    Fonction qui exécute le banc de mesure sur la base configurée.
+    :param appels: nombre d'appels mesurés par scénario
+    :type appels: int
+    :param echauffement: nombre d'appels préalables non mesurés par scénario de lecture
+    :type echauffement: int
+    :param graine: graine des tirages (notices, pages, mots-clés)
+    :type graine: int
+    :param profils: profils de visiteurs mesurés ('anonyme', 'connecte')
+    :type profils: tuple
+    :param compte: utilisateur du profil 'connecte' et des écritures
+    :type compte: User or None
+    :param ecritures: si True, les méthodes d'écriture sont aussi mesurées (la base est modifiée)
+    :type ecritures: booléen
+    :param cache: si True, le cache de réponses reste actif pendant les lectures
+    :type cache: booléen
+    :returns: résultats (environnement, base, paramètres et mesures de chaque scénario)
+    :rtype: dict
+    """
+    if not cache:
+        configurer_cache({"CACHE_REPONSES": None})
+    if compte is None:
+        profils = [profil for profil in profils if profil != "connecte"]
+    alea = random.Random(graine)
+    tirage = echantillon(alea)
+    with CompteurRequetes(db.engine) as compteur:
+        mesures = banc_lectures(tirage, alea, appels, echauffement, compteur, profils, compte.user_id if compte else None)
+        if ecritures and compte is not None:
+            mesures.update(banc_ecritures(compte, appels, compteur, graine))
+    return {
+        "environnement": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "code": version_code(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.platform(),
+        },
+        "base": tirage["base"],
+        "parametres": {
+            "appels": appels, "echauffement": echauffement, "graine": graine, "profils": list(profils),
+            "ecritures": bool(ecritures and compte is not None), "cache_reponses": cache,
+            "modele_lecture": app.config.get("MODELE_LECTURE", False), "encodeur_json": app.config.get("JSON_ENCODEUR", "json"),
+        },
+        "mesures": mesures,
+    }
+
+
+def comparer(resultats, reference, seuil=1.25, critere="p50_ms"):
+    """
+    Fonction qui compare des résultats à ceux d'une mesure de référence, scénario par scénario.
+    Un scénario régresse si sa durée (critère) dépasse 'seuil' fois celle de la référence, ou s'il envoie plus de requêtes SQL.
+    :param resultats: résultats renvoyés par executer()
+    :type resultats: dict
+    :param reference: résultats de référence (même format)
+    :type reference: dict
+    :param seuil: rapport des durées au-delà duquel le scénario régresse
+    :type seuil: float
+    :param critere: mesure de durée comparée ('p50_ms', 'p95_ms', 'p99_ms', 'moyenne_ms')
+    :type critere: str
+    :returns: liste de dictionnaires (scénario, durées, rapport, requêtes SQL, régression), scénarios communs aux deux mesures
+    :rtype: list
+    """
+    comparaison = []
+    for nom, mesure in sorted(resultats["mesures"].items()):
+        ancienne = reference.get("mesures", {}).get(nom)
+        if ancienne is None or not ancienne.get(critere) or mesure.get(critere) is None:
+            continue
+        rapport = mesure[critere] / ancienne[critere]
+        plus_de_requetes = (mesure["requetes_sql"] or 0) > (ancienne.get("requetes_sql") or 0)
+        comparaison.append({
+            "scenario": nom,
+            "reference_ms": ancienne[critere],
+            "mesure_ms": mesure[critere],
+            "rapport": round(rapport, 3),
+            "requetes_sql": (ancienne.get("requetes_sql"), mesure["requetes_sql"]),
+            "regression": rapport > seuil or plus_de_requetes,
+        })
+    return comparaison
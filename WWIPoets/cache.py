@@ -0,0 +1,312 @@
+import functools
+#Importation de functools pour conserver le nom des vues décorées (indispensable aux url_for).
+import hashlib
+#Importation de hashlib pour construire les ETag à partir des clés de version.
+import sqlite3
+#Importation de sqlite3 pour le cache de réponses partagé entre les processus du serveur.
+import threading
+#Importation du module threading : le cache est partagé par les fils d'exécution (threads) du serveur.
+import time
+#Importation du module time pour la durée de vie des entrées.
+from collections import OrderedDict
+#Importation d'OrderedDict qui conserve l'ordre d'utilisation des entrées (politique LRU : la moins récemment utilisée est évincée).
+from flask import request, session, make_response, Response, g
+#Importation des objets de Flask nécessaires à la mise en cache des réponses.
+from flask_login import current_user
+#Importation de current_user : les pages des utilisateurs connectés ne sont jamais mises en cache.
+
+
+class CacheTTL:
+    """
+    Cache en mémoire du processus, borné en nombre d'entrées (LRU) et dont chaque entrée expire après 'ttl' secondes.
+    Chaque processus (worker) du serveur possède son propre cache : la durée de vie borne le délai pendant lequel
+    un worker peut servir une valeur rendue obsolète par une écriture faite dans un autre worker.
+    """
+
+    def __init__(self, taille=1024, ttl=60):
+        """
+        :param taille: nombre maximal d'entrées conservées
+        :type taille: int
+        :param ttl: durée de vie d'une entrée en secondes (None pour ne jamais expirer)
+        :type ttl: int or None
+        """
+        self.taille = taille
+        self.ttl = ttl
+        self.entrees = OrderedDict()
+        self.verrou = threading.Lock()
+        self.succes = 0
+        self.echecs = 0
+
+    def obtenir(self, cle, defaut=None):
+        """
+        Fonction qui renvoie la valeur associée à une clé si elle est présente et n'a pas expiré.
+        :param cle: clé de l'entrée
+        :param defaut: valeur renvoyée en l'absence d'entrée valide
+        :returns: valeur en cache ou défaut
+        """
+        with self.verrou:
+            entree = self.entrees.get(cle)
+            if entree is not None:
+                expiration, valeur = entree
+                if expiration is None or expiration > time.monotonic():
+                    self.entrees.move_to_end(cle)
+                    self.succes += 1
+                    return valeur
+                del self.entrees[cle]
+            self.echecs += 1
+            return defaut
+
+    def enregistrer(self, cle, valeur):
+        """
+        Fonction qui enregistre une valeur dans le cache, en évinçant si besoin l'entrée la moins récemment utilisée.
+        :param cle: clé de l'entrée
+        :param valeur: valeur à conserver
+        :returns: None
+        """
+        expiration = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.verrou:
+            self.entrees[cle] = (expiration, valeur)
+            self.entrees.move_to_end(cle)
+            while len(self.entrees) > self.taille:
+                self.entrees.popitem(last=False)
+
+    def calculer(self, cle, fonction):
+        """
+        Fonction qui renvoie la valeur en cache, ou la calcule avec 'fonction' et l'enregistre si elle est absente.
+        :param cle: clé de l'entrée
+        :param fonction: fonction sans argument qui calcule la valeur
+        :returns: valeur
+        """
+        absent = object()
+        valeur = self.obtenir(cle, absent)
+        if valeur is absent:
+            valeur = fonction()
+            self.enregistrer(cle, valeur)
+        return valeur
+
+    def supprimer(self, cle):
+        """
+        Fonction qui retire une entrée du cache.
+        :param cle: clé de l'entrée
+        :returns: None
+        """
+        with self.verrou:
+            self.entrees.pop(cle, None)
+
+    def vider(self):
+        """
+        Fonction qui vide entièrement le cache.
+        :returns: None
+        """
+        with self.verrou:
+            self.entrees.clear()
+
+
+# CACHE DES RÉPONSES #
+# Les pages consultées par les visiteurs anonymes (accueil, index, notices, Json) ne changent que lorsqu'un utilisateur connecté
+# crée, modifie ou supprime une notice. Chaque réponse mise en cache porte des étiquettes (par exemple 'poete:12' ou 'index_individus') :
+# les méthodes d'écriture de donnees.py invalident précisément les étiquettes concernées.
+
+
+class MemoireReponses:
+    """
+    Cache de réponses en mémoire du processus (LRU avec durée de vie). Une invalidation ne retire que les réponses du processus
+    qui a fait l'écriture : ce cache ne convient qu'à un serveur à un seul worker.
+    """
+
+    def __init__(self, taille=1024, ttl=300):
+        self.cache = CacheTTL(taille=taille, ttl=ttl)
+        self.etiquettes = {}
+        self.verrou = threading.Lock()
+
+    def obtenir(self, cle):
+        return self.cache.obtenir(cle)
+
+    def enregistrer(self, cle, valeur, etiquettes):
+        self.cache.enregistrer(cle, valeur)
+        with self.verrou:
+            for etiquette in etiquettes:
+                cles = self.etiquettes.setdefault(etiquette, set())
+                cles.add(cle)
+                # On oublie les clés déjà évincées du cache pour que l'index des étiquettes reste borné.
+                if len(cles) > 2 * self.cache.taille:
+                    cles.intersection_update(self.cache.entrees.keys())
+
+    def invalider(self, etiquettes):
+        with self.verrou:
+            cles = set()
+            for etiquette in etiquettes:
+                cles.update(self.etiquettes.pop(etiquette, ()))
+        for cle in cles:
+            self.cache.supprimer(cle)
+
+    def vider(self):
+        with self.verrou:
+            self.etiquettes.clear()
+        self.cache.vider()
+
+
+class SQLiteReponses:
+    """
+    Cache de réponses stocké dans un fichier SQLite, partagé par tous les processus (workers) du serveur sur une même machine :
+    une invalidation faite par un worker est immédiatement visible des autres.
+    """
+
+    def __init__(self, fichier, ttl=300):
+        self.fichier = fichier
+        self.ttl = ttl
+        self.local = threading.local()
+        connexion = self.connexion()
+        connexion.execute("CREATE TABLE IF NOT EXISTS Reponse (cle TEXT PRIMARY KEY, expiration REAL, statut INTEGER, type TEXT, corps BLOB)")
+        connexion.execute("CREATE TABLE IF NOT EXISTS Reponse_etiquette (etiquette TEXT, cle TEXT, PRIMARY KEY (etiquette, cle))")
+        connexion.commit()
+
+    def connexion(self):
+        """
+        Fonction qui renvoie la connexion SQLite du fil d'exécution courant (une connexion sqlite3 ne se partage pas entre threads).
+        """
+        connexion = getattr(self.local, "connexion", None)
+        if connexion is None:
+            connexion = sqlite3.connect(self.fichier, timeout=5)
+            connexion.execute("PRAGMA journal_mode=WAL")
+            self.local.connexion = connexion
+        return connexion
+
+    def obtenir(self, cle):
+        ligne = self.connexion().execute(
+            "SELECT statut, type, corps FROM Reponse WHERE cle = ? AND expiration > ?", (cle, time.time())
+        ).fetchone()
+        return tuple(ligne) if ligne else None
+
+    def enregistrer(self, cle, valeur, etiquettes):
+        statut, type_mime, corps = valeur
+        connexion = self.connexion()
+        with connexion:
+            connexion.execute("INSERT OR REPLACE INTO Reponse VALUES (?, ?, ?, ?, ?)",
+                              (cle, time.time() + self.ttl, statut, type_mime, corps))
+            connexion.executemany("INSERT OR IGNORE INTO Reponse_etiquette VALUES (?, ?)",
+                                  [(etiquette, cle) for etiquette in etiquettes])
+
+    def invalider(self, etiquettes):
+        connexion = self.connexion()
+        with connexion:
+            for etiquette in etiquettes:
+                connexion.execute("DELETE FROM Reponse WHERE cle IN (SELECT cle FROM Reponse_etiquette WHERE etiquette = ?)", (etiquette,))
+                connexion.execute("DELETE FROM Reponse_etiquette WHERE etiquette = ?", (etiquette,))
+            connexion.execute("DELETE FROM Reponse WHERE expiration <= ?", (time.time(),))
+
+    def vider(self):
+        connexion = self.connexion()
+        with connexion:
+            connexion.execute("DELETE FROM Reponse")
+            connexion.execute("DELETE FROM Reponse_etiquette")
+
+
+#Cache de réponses de l'application, choisi par configurer_cache() selon la configuration (None : pas de cache).
+reponses = None
+
+
+def configurer_cache(config):
+    """
+    Fonction qui crée le cache de réponses décrit par la configuration de l'application :
+    CACHE_REPONSES vaut 'sqlite' (par défaut, partagé entre processus, fichier CACHE_REPONSES_FICHIER), 'memoire' (propre au processus,
+    pour un serveur à un seul worker) ou None (désactivé).
+    :param config: configuration de l'application (app.config)
+    :returns: None
+    """
+    global reponses
+    type_cache = config.get("CACHE_REPONSES", "sqlite")
+    ttl = config.get("CACHE_REPONSES_TTL", 300)
+    if type_cache == "memoire":
+        reponses = MemoireReponses(taille=config.get("CACHE_REPONSES_TAILLE", 1024), ttl=ttl)
+    elif type_cache == "sqlite":
+        reponses = SQLiteReponses(config["CACHE_REPONSES_FICHIER"], ttl=ttl)
+        #Les réponses enregistrées lors d'un lancement précédent (peut-être sur une autre base, voir WWIPOETS_BASE) sont écartées.
+        reponses.vider()
+    else:
+        reponses = None
+
+
+def invalider_reponses(etiquettes):
+    """
+    Fonction qui retire du cache toutes les réponses portant au moins une des étiquettes données.
+    :param etiquettes: liste d'étiquettes (par exemple ['poete:12', 'index_individus'])
+    :type etiquettes: list
+    :returns: None
+    """
+    if reponses is not None:
+        reponses.invalider(etiquettes)
+
+
+def mise_en_cache(etiquettes):
+    """
+    Décorateur de vue qui met en cache la réponse servie aux visiteurs anonymes, avec pour clé l'hôte, le chemin et les paramètres de la requête,
+    ainsi que l'ETag calculé par conditionnel() lorsque la vue en a un : une réponse en cache n'est jamais servie avec l'ETag d'une version plus récente.
+    Ne sont jamais mises en cache : les requêtes d'utilisateurs connectés, les réponses autres que 200, et les pages contenant un message flash.
+    :param etiquettes: fonction qui reçoit les arguments de la vue et renvoie la liste des étiquettes d'invalidation de la réponse
+    :returns: décorateur
+    """
+    def decorateur(vue):
+        @functools.wraps(vue)
+        def enveloppe(*args, **kwargs):
+            if reponses is None or request.method != "GET" or "_flashes" in session or current_user.is_authenticated:
+                return vue(*args, **kwargs)
+            cle = request.host + request.full_path + g.get("etag", "")
+            entree = reponses.obtenir(cle)
+            if entree is not None:
+                statut, type_mime, corps = entree
+                return Response(corps, status=statut, mimetype=type_mime)
+            reponse = make_response(vue(*args, **kwargs))
+            if reponse.status_code == 200 and not reponse.is_streamed and "_flashes" not in session:
+                reponses.enregistrer(cle, (reponse.status_code, reponse.mimetype, reponse.get_data()), etiquettes(**kwargs))
+            return reponse
+        return enveloppe
+    return decorateur
+
+
+# RÉPONSES CONDITIONNELLES #
+# Les robots et les miroirs qui resynchronisent la base renvoient l'ETag (If-None-Match) ou la date (If-Modified-Since) de leur copie :
+# si la version des données n'a pas changé, on répond '304 Not Modified' sans corps, et sans exécuter la vue.
+
+
+def conditionnel(version):
+    """
+    Décorateur de vue qui ajoute les en-têtes ETag et Last-Modified aux réponses, et répond 304 lorsque la copie du client est à jour.
+    L'ETag dépend aussi de l'utilisateur connecté, dont les pages contiennent des liens d'édition.
+    :param version: fonction qui reçoit les arguments de la vue et renvoie un tuple (clé de version, date de dernière modification ou None),
+    ou None si la version ne peut pas être calculée (la vue est alors exécutée normalement)
+    :returns: décorateur
+    """
+    def decorateur(vue):
+        @functools.wraps(vue)
+        def enveloppe(*args, **kwargs):
+            if request.method != "GET" or "_flashes" in session:
+                return vue(*args, **kwargs)
+            courante = version(**kwargs)
+            if courante is None:
+                return vue(*args, **kwargs)
+            cle, derniere_modification = courante
+            if current_user.is_authenticated:
+                cle += "-u{}".format(current_user.get_id())
+            # La vue fait partie de l'ETag : la notice HTML et le Json d'un même poète sont deux représentations distinctes.
+            etag = hashlib.sha1("{}:{}".format(request.endpoint, cle).encode("utf-8")).hexdigest()
+            g.etag = etag
+
+            if request.if_none_match:
+                a_jour = request.if_none_match.contains(etag)
+            else:
+                a_jour = derniere_modification is not None and request.if_modified_since is not None \
+                    and request.if_modified_since >= derniere_modification
+            if a_jour:
+                reponse = Response(status=304)
+            else:
+                reponse = make_response(vue(*args, **kwargs))
+                if reponse.status_code != 200:
+                    return reponse
+            reponse.set_etag(etag)
+            if derniere_modification is not None:
+                reponse.last_modified = derniere_modification
+            reponse.vary.add("Cookie")
+            return reponse
+        return enveloppe
+    return decorateur
@@ -0,0 +1,220 @@
+import click
+#Importation de click, la bibliothèque sur laquelle reposent les commandes 'flask ...'.
+import json
+#Importation du module json pour écrire et relire les résultats du banc de mesure.
+import secrets
+#Importation de secrets pour le mot de passe de l'utilisateur créé par 'flask generer'.
+from .app import app
+#Importation de l'application pour y déclarer les commandes.
+from .modeles.export import export, FORMATS, EXPORT_LOT
+#Importation du générateur d'export, déclaré dans le fichier export.py
+from .migrations import migrer, verifier_plans, requetes_critiques, plan
+#Importation des fonctions de migration et de vérification du schéma, déclarées dans le fichier migrations.py
+from .modeles.donnees import Poet
+#Importation de la classe Poet, déclarée dans le fichier donnees.py
+from .modeles.importation import importer, FORMATS_IMPORT, IMPORT_LOT
+#Importation de l'import en masse, déclaré dans le fichier importation.py
+from .modeles.utilisateurs import User
+#Importation de la classe User, déclarée dans le fichier utilisateurs.py
+from .modeles.dates import normaliser_dates
+#Importation du calcul des dates normalisées, déclaré dans le fichier dates.py
+from .modeles.lieux import charger_gazetteer, lier_lieux
+#Importation du chargement du gazetteer et du rattachement des lieux, déclarés dans le fichier lieux.py
+from .modeles.synthese import generer, enregistrements, GRAINE
+#Importation du générateur de notices synthétiques, déclaré dans le fichier synthese.py
+from .banc import executer, comparer, PROFILS
+#Importation du banc de mesure des performances, déclaré dans le fichier banc.py
+from .lenteurs import lire_journal, regrouper
+#Importation de l'analyse du journal des requêtes lentes, déclarée dans le fichier lenteurs.py
+from .constantes import LIEUX_FICHIER
+#Importation du chemin du gazetteer fourni avec l'application
+from .app import db
+#Importation de la base de données
+
+# COMMANDES EN LIGNE DE COMMANDE #
+# Elles s'utilisent depuis la racine du dépôt, par exemple : flask export --format csv --sortie WWIPoets.csv
+
+
+@app.cli.command("export")
+@click.option("--format", "format_export", type=click.Choice(FORMATS), default="ndjson", help="Format de l'export.")
+@click.option("--sortie", type=click.File("w", encoding="utf-8"), default="-", help="Fichier de sortie (par défaut, la sortie standard).")
+@click.option("--lot", type=int, default=EXPORT_LOT, help="Nombre de poètes lus par lot.")
+def commande_export(format_export, sortie, lot):
+    """ Exporte toute la base (poètes, publications et ESM) au format NDJSON ou CSV. """
+    # Un contexte de requête est nécessaire à url_for pour construire le lien Json de chaque notice.
+    with app.test_request_context():
+        for ligne in export(format_export, lot):
+            sortie.write(ligne)
+
+
+@app.cli.command("migrer")
+def commande_migrer():
+    """ Applique les migrations du schéma qui ne l'ont pas encore été. """
+    appliquees = migrer()
+    for etape in appliquees:
+        click.echo("Migration appliquée : " + etape)
+    if not appliquees:
+        click.echo("Le schéma est à jour.")
+
+
+@app.cli.command("plans")
+@click.option("--details", is_flag=True, help="Affiche le plan d'exécution de chaque requête.")
+def commande_plans(details):
+    """ Vérifie que les requêtes fréquentes utilisent un index (EXPLAIN QUERY PLAN). Code de sortie 1 en cas de lecture complète d'une table. """
+    if details:
+        for nom, requete in requetes_critiques():
+            click.echo(nom + " : " + " | ".join(plan(requete)))
+    defauts = verifier_plans()
+    for nom, lignes in defauts:
+        click.echo("Requête sans index : {} ({})".format(nom, " | ".join(lignes)), err=True)
+    if defauts:
+        raise SystemExit(1)
+    click.echo("Toutes les requêtes critiques utilisent un index.")
+
+
+@app.cli.command("dates")
+def commande_dates():
+    """ Recalcule les dates normalisées (année, mois, jour, précision) de toutes les notices à partir des dates saisies. """
+    #Les déclencheurs de la table Facette tiennent les décennies à jour pendant le recalcul.
+    with db.engine.begin() as connexion:
+        nombre = normaliser_dates(connexion)
+    click.echo("{} date(s) normalisée(s).".format(nombre))
+
+
+@app.cli.command("lieux")
+@click.option("--fichier", type=click.Path(exists=True, dir_okay=False), default=LIEUX_FICHIER,
+              help="Gazetteer CSV (code, nom, pays, latitude, longitude, variantes) ; par défaut, celui fourni avec l'application.")
+def commande_lieux(fichier):
+    """ Recharge le gazetteer des lieux et rattache de nouveau les lieux saisis de toutes les notices aux lieux canoniques. """
+    #Les déclencheurs de la table Facette tiennent les nombres de poètes par lieu à jour pendant le rattachement.
+    with db.engine.begin() as connexion:
+        nombre_lieux = charger_gazetteer(connexion, fichier)
+        nombre = lier_lieux(connexion)
+    click.echo("{} lieu(x) chargé(s) ; {} lieu(x) saisi(s) rattaché(s).".format(nombre_lieux, nombre))
+
+
+@app.cli.command("supprimer")
+@click.argument("poet_ids", nargs=-1, type=int, required=True)
+def commande_supprimer(poet_ids):
+    """ Supprime en une seule transaction les notices des poètes dont les identifiants sont donnés (avec publications, ESM et historique). """
+    supprimes = Poet.delete_poets(poet_ids)
+    if supprimes is None:
+        click.echo("Échec de la suppression : aucune notice n'a été supprimée.", err=True)
+        raise SystemExit(1)
+    click.echo("{} notice(s) supprimée(s).".format(supprimes))
+
+
+@app.cli.command("import")
+@click.argument("fichier", type=click.File("r", encoding="utf-8"))
+@click.option("--utilisateur", required=True, help="Login de l'utilisateur auquel les créations sont attribuées.")
+@click.option("--format", "format_import", type=click.Choice(FORMATS_IMPORT), default=None,
+              help="Format du fichier (par défaut, déduit de son extension).")
+@click.option("--lot", type=int, default=IMPORT_LOT, help="Nombre d'enregistrements insérés par transaction.")
+def commande_import(fichier, utilisateur, format_import, lot):
+    """ Importe en masse des notices de poètes (avec publications et ESM) depuis un fichier CSV, JSON ou NDJSON. """
+    compte = User.query.filter(User.user_login == utilisateur).first()
+    if compte is None:
+        raise click.BadParameter("Utilisateur inconnu : " + utilisateur, param_hint="--utilisateur")
+    if format_import is None:
+        format_import = fichier.name.rsplit(".", 1)[-1].lower()
+        if format_import not in FORMATS_IMPORT:
+            raise click.BadParameter("Impossible de déduire le format du fichier : utilisez --format", param_hint="--format")
+    try:
+        rapport = importer(fichier, format_import, compte.user_id, lot)
+    except ValueError as erreur:
+        raise click.ClickException(str(erreur))
+    for erreur in rapport["erreurs"]:
+        click.echo("Enregistrement {} : {}".format(erreur["ligne"], " ; ".join(erreur["erreurs"])), err=True)
+    click.echo("{} notice(s), {} publication(s) et {} ESM importé(s), {} enregistrement(s) refusé(s).".format(
+        rapport["importes"], rapport["publications"], rapport["statuts"], len(rapport["erreurs"])))
+    if rapport["erreurs"]:
+        raise SystemExit(1)
+
+
+@app.cli.command("generer")
+@click.option("--poetes", type=int, default=1000, help="Nombre de notices générées (par exemple 1000, 100000 ou 1000000).")
+@click.option("--graine", type=int, default=GRAINE, help="Graine du générateur : une même graine donne les mêmes notices.")
+@click.option("--utilisateur", default="synthese", help="Login de l'utilisateur auquel les créations sont attribuées (créé s'il n'existe pas).")
+@click.option("--sortie", type=click.File("w", encoding="utf-8"), default=None,
+              help="Écrit les notices dans un fichier NDJSON (à importer avec 'flask import') au lieu de les insérer dans la base.")
+@click.option("--ajouter", is_flag=True, help="Autorise l'ajout de notices synthétiques à une base qui contient déjà des notices.")
+@click.option("--lot", type=int, default=IMPORT_LOT, help="Nombre de notices insérées par transaction.")
+def commande_generer(poetes, graine, utilisateur, sortie, ajouter, lot):
+    """ Génère une prosopographie synthétique (notices, publications et ESM) pour les mesures de performance.
+    La base visée est choisie par la variable d'environnement WWIPOETS_BASE, par exemple : WWIPOETS_BASE=banc.db flask generer --poetes 100000 """
+    if sortie is not None:
+        for enregistrement in enregistrements(poetes, graine):
+            sortie.write(json.dumps(enregistrement, ensure_ascii=False) + "\n")
+        click.echo("{} notice(s) écrite(s).".format(poetes))
+        return
+    existantes = Poet.query.count()
+    if existantes and not ajouter:
+        raise click.ClickException("La base contient déjà {} notice(s) : choisissez une autre base (WWIPOETS_BASE) "
+                                   "ou confirmez l'ajout avec --ajouter".format(existantes))
+    compte = User.query.filter(User.user_login == utilisateur).first()
+    if compte is None:
+        reussi, compte = User.creer(utilisateur, utilisateur + "@example.org", utilisateur, secrets.token_urlsafe(16))
+        if not reussi:
+            raise click.ClickException(" ; ".join(compte))
+    #Les numéros des notices ajoutées suivent ceux de la base : leurs identifiants externes ne rencontrent pas les précédents.
+    rapport = generer(poetes, compte.user_id, graine, debut=db.session.query(db.func.max(Poet.poet_id)).scalar() or 0, lot=lot)
+    click.echo("{} notice(s), {} publication(s) et {} ESM générés, {} enregistrement(s) refusé(s).".format(
+        rapport["importes"], rapport["publications"], rapport["statuts"], len(rapport["erreurs"])))
+
+
+@app.cli.command("banc")
+@click.option("--appels", type=int, default=100, help="Nombre d'appels mesurés par scénario.")
+@click.option("--echauffement", type=int, default=5, help="Nombre d'appels préalables, non mesurés, par scénario de lecture.")
+@click.option("--graine", type=int, default=0, help="Graine des tirages (notices, pages et mots-clés demandés).")
+@click.option("--profil", "profils", type=click.Choice(PROFILS), multiple=True, default=PROFILS,
+              help="Profil de visiteur mesuré (option répétable) : anonyme (modèle de lecture) ou connecte (lecture de la base).")
+@click.option("--utilisateur", default="synthese", help="Login de l'utilisateur du profil 'connecte' et des écritures.")
+@click.option("--ecritures", is_flag=True, help="Mesure aussi les méthodes d'écriture : modifie la base, à réserver à une base synthétique.")
+@click.option("--cache", is_flag=True, help="Laisse actif le cache de réponses pendant les lectures.")
+@click.option("--sortie", type=click.File("w", encoding="utf-8"), default=None, help="Fichier Json où enregistrer les résultats.")
+@click.option("--reference", type=click.File("r", encoding="utf-8"), default=None,
+              help="Résultats Json d'une mesure de référence, auxquels comparer cette mesure.")
+@click.option("--seuil", type=float, default=1.25, help="Rapport des durées (p50) au-delà duquel un scénario est signalé comme une régression.")
+def commande_banc(appels, echauffement, graine, profils, utilisateur, ecritures, cache, sortie, reference, seuil):
+    """ Mesure la durée (percentiles) et le nombre de requêtes SQL de chaque route et de chaque méthode d'écriture.
+    Code de sortie 1 si un scénario régresse par rapport à la mesure de référence. """
+    compte = User.query.filter(User.user_login == utilisateur).first()
+    if compte is None and ("connecte" in profils or ecritures):
+        click.echo("Utilisateur inconnu : {} ; le profil 'connecte' et les écritures ne sont pas mesurés.".format(utilisateur), err=True)
+    resultats = executer(appels, echauffement, graine, profils, compte, ecritures, cache)
+    click.echo("{poetes} notice(s), {publications} publication(s), {statuts} ESM".format(**resultats["base"]))
+    click.echo("{:<40} {:>10} {:>10} {:>10} {:>8} {:>7}".format("scénario", "p50 ms", "p95 ms", "p99 ms", "SQL", "échecs"))
+    for nom, mesure in resultats["mesures"].items():
+        click.echo("{:<40} {:>10} {:>10} {:>10} {:>8} {:>7}".format(
+            nom, mesure["p50_ms"], mesure["p95_ms"], mesure["p99_ms"], mesure["requetes_sql"], mesure["erreurs"]))
+    if sortie is not None:
+        json.dump(resultats, sortie, ensure_ascii=False, indent=2)
+    if reference is not None:
+        regressions = [ecart for ecart in comparer(resultats, json.load(reference), seuil) if ecart["regression"]]
+        for ecart in regressions:
+            click.echo("Régression : {scenario} ({reference_ms} ms -> {mesure_ms} ms, x{rapport} ; requêtes SQL {requetes_sql})".format(
+                **ecart), err=True)
+        if regressions:
+            raise SystemExit(1)
+        click.echo("Aucune régression par rapport à la mesure de référence.")
+
+
+@app.cli.command("lenteurs")
+@click.option("--fichier", type=click.Path(dir_okay=False), default=None,
+              help="Journal des requêtes lentes (par défaut, REQUETES_LENTES_FICHIER) ; ses archives sont lues aussi.")
+@click.option("--nombre", type=int, default=10, help="Nombre d'empreintes affichées.")
+@click.option("--plans", "afficher_plans", is_flag=True, help="Affiche le plan d'exécution de la requête la plus lente de chaque empreinte.")
+def commande_lenteurs(fichier, nombre, afficher_plans):
+    """ Regroupe les requêtes du journal des requêtes lentes par empreinte (texte normalisé) et affiche les plus coûteuses en durée cumulée. """
+    groupes = regrouper(lire_journal(fichier or app.config["REQUETES_LENTES_FICHIER"]))
+    if not groupes:
+        click.echo("Aucune requête lente n'a été journalisée.")
+        return
+    for groupe in groupes[:nombre]:
+        click.echo("{empreinte}  {nombre} requête(s), {total_ms} ms au total, {moyenne_ms} ms en moyenne, {max_ms} ms au plus".format(**groupe)
+                   + ("  [lecture complète d'une table]" if groupe["lecture_complete"] else ""))
+        click.echo("    " + groupe["sql"][:300])
+        click.echo("    origine : " + ", ".join("{} ({})".format(appel, compte) for appel, compte in groupe["appels"][:3]))
+        click.echo("    routes : " + ", ".join("{} ({})".format(route, compte) for route, compte in groupe["routes"][:3]))
+        if afficher_plans and groupe["plan"]:
+            click.echo("    plan : " + " | ".join(groupe["plan"]))
@@ -1,32 +1,138 @@
 from warnings import warn
+import os
+from sqlalchemy.pool import QueuePool
 
 POETES_PAR_PAGE = 20
 # Variable qui définit le nombre de résultats par page (utilisée pour les index d'individus et de production)
+COMPTEURS_TTL = 60
+# Durée de vie (en secondes) des nombres de lignes mis en cache pour la pagination des index et de la recherche
+UTILISATEURS_TTL = 60
+# Durée de vie (en secondes) des utilisateur.rice.s connecté.e.s mis.es en cache entre deux requêtes (voir modeles/utilisateurs.py)
+UTILISATEURS_CACHE = 256
+# Nombre maximal d'utilisateur.rice.s conservé.e.s dans ce cache
 API_ROUTE = "/api"
+API_LIMITE_MAX = 200
+# Nombre maximal d'éléments renvoyés par page par les routes de collection de l'API (/api/poets, /api/publications, /api/military_status)
+CHRONOLOGIE_ANNEES = 10
+# Nombre d'années par page de la chronologie (/timeline et /api/timeline)
+CHRONOLOGIE_ANNEES_MAX = 50
+# Nombre maximal d'années par page de la chronologie que l'on peut demander (paramètre 'years')
+CHRONOLOGIE_EVENEMENTS = 100
+# Nombre d'événements par page de la chronologie ; la suite d'un intervalle d'années se lit par curseur (paramètre 'after')
+LIEUX_FICHIER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modeles", "lieux.csv")
+# Gazetteer fourni avec l'application : lieux canoniques, variantes d'écriture et coordonnées (voir modeles/lieux.py)
+LECTURE_VERIFICATION = 5
+# Intervalle (en secondes) entre deux vérifications de fraîcheur du modèle de lecture en mémoire (écritures faites par un autre processus)
+BASE = os.environ.get("WWIPOETS_BASE")
+# Chemin d'un autre fichier de base de données (variable d'environnement WWIPOETS_BASE), par exemple une base synthétique
+# créée par 'flask generer' pour les mesures de performance ; par défaut, la base WWIPoets.db du dépôt.
 
 SECRET_KEY = "JE SUIS UN SECRET !"
 #Variable utilisée comme clé cryptographique
 if SECRET_KEY == "JE SUIS UN SECRET !":
     warn("Le secret par défaut n'a pas été changé, vous devriez le faire", Warning)
 
-"""
-class _TEST:
-    SECRET_KEY = SECRET_KEY
-    # On configure la base de données
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///WWIPoets.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-"""
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    # Journal en écriture anticipée : les lectures ne sont plus bloquées pendant l'écriture d'une modification (et inversement).
+    "synchronous": "NORMAL",
+    # En mode WAL, NORMAL reste sûr en cas d'arrêt de l'application et évite une synchronisation disque à chaque validation.
+    "busy_timeout": 5000,
+    # Temps d'attente (en millisecondes) d'un verrou d'écriture avant d'abandonner, au lieu d'échouer immédiatement.
+    "cache_size": -32000,
+    # Cache de pages de chaque connexion (valeur négative : en kibioctets, soit 32 Mo).
+    "mmap_size": 268435456,
+    # Lecture du fichier de la base en mémoire projetée (256 Mo au maximum).
+}
+# Profil SQLite appliqué à chaque nouvelle connexion (voir app.py)
+
+SQLITE_POOL = {
+    "poolclass": QueuePool,
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 10,
+    "connect_args": {"check_same_thread": False},
+}
+# Réserve de connexions réutilisées d'une requête à l'autre (par défaut, Flask-SQLAlchemy ouvre une nouvelle connexion SQLite à chaque requête).
+# Une connexion de la réserve n'est utilisée que par un fil d'exécution à la fois, d'où check_same_thread désactivé.
 
 class _PRODUCTION:
     SECRET_KEY = SECRET_KEY
     # configuration du secret
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///WWIPoets.db'
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(BASE) if BASE else 'sqlite:///WWIPoets.db'
     # configuration de la base de données production
-    # Chemin relatif vers la base de données en mode production
+    # Chemin relatif vers la base de données en mode production (ou chemin donné par WWIPOETS_BASE)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = SQLITE_POOL
+    # Options de création du moteur SQLAlchemy (réserve de connexions)
+    SQLITE_PRAGMAS = SQLITE_PRAGMAS
+    # Profil SQLite appliqué à chaque connexion
+    CACHE_REPONSES = "sqlite"
+    # Cache des pages servies aux visiteurs anonymes : "sqlite" (partagé entre les processus : une écriture invalide les pages
+    # de tous les workers), "memoire" (propre à chaque processus, réservé à un serveur à un seul worker : les autres workers
+    # serviraient les anciennes pages jusqu'à expiration) ou None (désactivé)
+    CACHE_REPONSES_TTL = 300
+    # Durée de vie (en secondes) d'une réponse en cache ; avec "memoire" et plusieurs workers, c'est le délai pendant lequel
+    # une page modifiée peut encore être servie : le réduire (par exemple à 10 secondes)
+    CACHE_REPONSES_TAILLE = 1024
+    # Nombre maximal de réponses conservées par le cache "memoire"
+    CACHE_REPONSES_FICHIER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_reponses.db")
+    # Fichier utilisé par le cache "sqlite"
+    MODELE_LECTURE = True
+    # Modèle de lecture en mémoire (voir modeles/lecture.py) : les pages consultées par les visiteurs anonymes lisent des instantanés
+    # des notices chargés au lancement, au lieu de la base. False pour lire la base à chaque requête.
+    MODELE_LECTURE_VERIFICATION = LECTURE_VERIFICATION
+    # Intervalle (en secondes) de vérification des écritures faites par un autre processus
+    JSON_ENCODEUR = "json"
+    # Encodeur des documents Json de l'API (voir encodage.py) : "json" (module standard) ou "orjson" (plus rapide, s'il est installé)
+    METRIQUES = True
+    # Mesure des requêtes (durée, requêtes SQL, lignes lues, rendu des gabarits), publiée par la route /metrics (voir metriques.py)
+    METRIQUES_ECHANTILLONNAGE = 0.1
+    # Part des requêtes mesurées, entre 0 (requêtes seulement comptées, sans compter les lignes lues) et 1 (toutes les requêtes)
+    METRIQUES_ADRESSES = ["127.0.0.1", "::1"]
+    # Adresses des clients autorisés à lire /metrics (derrière un serveur mandataire, toutes les requêtes viennent de son adresse :
+    # vider alors la liste et utiliser METRIQUES_JETON)
+    METRIQUES_JETON = os.environ.get("WWIPOETS_METRIQUES_JETON")
+    # Jeton qui autorise aussi la lecture de /metrics depuis une autre adresse (en-tête 'Authorization: Bearer <jeton>') ; None pour aucun
+    METRIQUES_SERVER_TIMING = True
+    # Renvoi des durées mesurées dans l'en-tête Server-Timing (affiché par les outils de développement des navigateurs)
+    REQUETES_LENTES_SEUIL = 0.1
+    # Durée (en secondes) au-delà de laquelle une requête SQL est écrite dans le journal des requêtes lentes (voir lenteurs.py) ; None pour le désactiver
+    REQUETES_LENTES_FICHIER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requetes_lentes.log")
+    # Journal des requêtes lentes (une ligne Json par requête)
+    REQUETES_LENTES_TAILLE = 10 * 1024 * 1024
+    # Taille (en octets) à partir de laquelle le journal est archivé (requetes_lentes.log.1, .2...)
+    REQUETES_LENTES_ARCHIVES = 5
+    # Nombre d'archives du journal conservées
+    REQUETES_LENTES_PLANS = True
+    # Lecture du plan d'exécution (EXPLAIN QUERY PLAN) de chaque requête lente
+    MOTS_DE_PASSE_METHODE = "pbkdf2:sha256:260000"
+    # Méthode de hachage des mots de passe (voir hachage.py) : algorithme et nombre d'itérations, au format de Werkzeug
+    MOTS_DE_PASSE_SEL = 16
+    # Longueur du sel des empreintes ; une empreinte calculée avec une autre méthode ou un autre sel est recalculée à la connexion
+    MOTS_DE_PASSE_PARALLELISME = max(1, (os.cpu_count() or 2) // 2)
+    # Nombre de mots de passe vérifiés en même temps (0 : vérification dans le fil de la requête, sans limite)
+    MOTS_DE_PASSE_FILE = 8
+    # Nombre de vérifications en attente au-delà duquel les connexions sont refusées (erreur 503)
+    MOTS_DE_PASSE_ATTENTE = 5
+    # Délai (en secondes) au-delà duquel une vérification en attente est abandonnée (erreur 503)
+
+class _TEST(_PRODUCTION):
+    # Configuration des tests (dossier tests/) : mêmes réglages que la production, sur la base désignée par WWIPOETS_BASE (une copie),
+    # sans les caches et mesures qui feraient varier le nombre de requêtes SQL d'un appel à l'autre.
+    CACHE_REPONSES = None
+    # Pas de cache des réponses : chaque appel exécute la vue
+    MODELE_LECTURE_VERIFICATION = 3600
+    # Pas de vérification de fraîcheur du modèle de lecture pendant les tests (aucun autre processus n'écrit dans la base)
+    METRIQUES = False
+    # Pas de mesure des requêtes
+    REQUETES_LENTES_SEUIL = None
+    # Pas de journal des requêtes lentes
+    MOTS_DE_PASSE_PARALLELISME = 0
+    # Empreintes des mots de passe calculées dans le fil de la requête
 
 CONFIG = {
-    #"test": _TEST,
+    "test": _TEST,
     "production": _PRODUCTION
-    # Les deux classes sont regroupées dans un dictionnaire afin de pouvoir les appeler facilement. Nous désactivons le mode test pour travailler d'abord en production.
+    # Les deux classes sont regroupées dans un dictionnaire afin de pouvoir les appeler facilement.
 }
\ No newline at end of file
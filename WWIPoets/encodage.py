@@ -0,0 +1,95 @@
+import json
+#Importation du module json, encodeur Json par défaut.
+from warnings import warn
+#Importation de warn pour signaler un encodeur demandé mais non installé.
+from flask import Response
+#Importation de Response pour renvoyer des documents Json déjà encodés, sans passer par jsonify.
+try:
+    import orjson
+    #Importation facultative d'orjson, encodeur Json plus rapide (pip install orjson).
+except ImportError:
+    orjson = None
+
+# ENCODAGE JSON #
+# Les documents Json servis par l'API peuvent être encodés une fois pour toutes en octets (voir modeles/lecture.py), puis
+# écrits tels quels dans la réponse. L'encodeur est choisi par la configuration (JSON_ENCODEUR) : 'json' (module standard,
+# octets identiques à ceux de jsonify : clés triées, séparateurs compacts, caractères non ASCII échappés) ou 'orjson'
+# (plus rapide, clés triées, caractères non ASCII écrits en UTF-8).
+
+
+def encoder_json(document):
+    """
+    Fonction qui encode un document avec le module json, comme jsonify.
+    :param document: dictionnaire ou liste
+    :returns: document encodé
+    :rtype: bytes
+    """
+    return json.dumps(document, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def encoder_orjson(document):
+    """
+    Fonction qui encode un document avec orjson.
+    :param document: dictionnaire ou liste
+    :returns: document encodé
+    :rtype: bytes
+    """
+    return orjson.dumps(document, option=orjson.OPT_SORT_KEYS)
+
+
+ENCODEURS = {"json": encoder_json}
+if orjson is not None:
+    ENCODEURS["orjson"] = encoder_orjson
+
+#Encodeur de l'application, choisi par configurer_encodeur() au lancement.
+encodeur = encoder_json
+
+
+def configurer_encodeur(config):
+    """
+    Fonction qui choisit l'encodeur Json décrit par la configuration de l'application (JSON_ENCODEUR, 'json' par défaut).
+    Un encodeur non installé est remplacé par le module json, avec un avertissement.
+    :param config: configuration de l'application (app.config)
+    :returns: None
+    """
+    global encodeur
+    nom = config.get("JSON_ENCODEUR", "json")
+    if nom not in ENCODEURS:
+        warn("L'encodeur Json '{}' n'est pas disponible, le module json est utilisé".format(nom), Warning)
+        nom = "json"
+    encodeur = ENCODEURS[nom]
+
+
+def encoder(document):
+    """
+    Fonction qui encode un document avec l'encodeur de l'application.
+    :param document: dictionnaire ou liste
+    :rtype: bytes
+    """
+    return encodeur(document)
+
+
+def reponse_json(octets, statut=200):
+    """
+    Fonction qui renvoie une réponse Json à partir d'un document déjà encodé (terminé, comme avec jsonify, par un saut de ligne).
+    :param octets: document encodé
+    :type octets: bytes
+    :param statut: code HTTP de la réponse
+    :type statut: int
+    :rtype: Response
+    """
+    return Response(octets + b"\n", status=statut, mimetype="application/json")
+
+
+def assembler(membres):
+    """
+    Fonction qui encode un objet Json dont certains membres sont déjà encodés (par exemple la liste 'data' d'une page de collection).
+    :param membres: liste de tuples (clé, valeur), la valeur étant un document encodé (bytes) ou un document à encoder
+    :type membres: list
+    :returns: objet encodé, clés dans l'ordre alphabétique
+    :rtype: bytes
+    """
+    return b"{" + b",".join(
+        encoder(cle) + b":" + (valeur if isinstance(valeur, bytes) else encoder(valeur))
+        for cle, valeur in sorted(membres, key=lambda membre: membre[0])
+    ) + b"}"
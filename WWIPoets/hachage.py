@@ -0,0 +1,139 @@
+import os
+#Importation du module os pour connaître le nombre de processeurs de la machine.
+import threading
+#Importation du module threading pour borner le nombre de calculs d'empreintes en cours ou en attente.
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as DelaiDepasse
+#Importation de la réserve de fils d'exécution (threads) qui calcule les empreintes des mots de passe.
+from warnings import warn
+#Importation de warn pour signaler une méthode de hachage invalide.
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+#Importation des fonctions de hachage des mots de passe de Werkzeug.
+
+# HACHAGE DES MOTS DE PASSE #
+# Le calcul d'une empreinte de mot de passe (PBKDF2) est volontairement coûteux. Il est confié à une petite réserve de fils
+# d'exécution (MOTS_DE_PASSE_PARALLELISME) : PBKDF2 libère le verrou global de Python pendant le calcul, si bien qu'une vague
+# de connexions occupe au plus ce nombre de processeurs et laisse les autres aux pages consultées. Au-delà de
+# MOTS_DE_PASSE_FILE calculs en attente, ou après MOTS_DE_PASSE_ATTENTE secondes d'attente, la connexion est refusée (Surcharge)
+# au lieu de s'ajouter à la file.
+# La méthode (algorithme et nombre d'itérations, MOTS_DE_PASSE_METHODE) et la longueur du sel (MOTS_DE_PASSE_SEL) sont réglées
+# dans constantes.py ; une empreinte calculée avec une autre politique est recalculée à la connexion suivante de l'utilisateur.
+
+METHODE = "pbkdf2:sha256:260000"
+SEL = 16
+#Politique par défaut : PBKDF2-SHA256 à 260 000 itérations, sel de 16 caractères.
+
+
+class Surcharge(Exception):
+    """
+    Exception levée lorsque trop de calculs d'empreintes sont en cours ou en attente.
+    """
+
+
+def methode_complete(methode):
+    """
+    Fonction qui renvoie la méthode telle que Werkzeug l'écrit dans les empreintes ('pbkdf2:sha256' devient 'pbkdf2:sha256:150000').
+    :param methode: méthode de hachage de Werkzeug
+    :type methode: str
+    :rtype: str
+    """
+    if methode.startswith("pbkdf2:") and methode.count(":") == 1:
+        return "{}:{}".format(methode, DEFAULT_PBKDF2_ITERATIONS)
+    return methode
+
+
+class Hachage:
+    """
+    Politique de hachage des mots de passe et réserve de fils d'exécution qui calcule les empreintes.
+    """
+
+    def __init__(self):
+        self.methode = METHODE
+        self.sel = SEL
+        self.reserve = None
+        self.admission = None
+        self.attente = None
+
+    def configurer(self, config):
+        """
+        Fonction qui applique la configuration de l'application : MOTS_DE_PASSE_METHODE, MOTS_DE_PASSE_SEL,
+        MOTS_DE_PASSE_PARALLELISME (0 pour calculer les empreintes dans le fil de la requête), MOTS_DE_PASSE_FILE et MOTS_DE_PASSE_ATTENTE.
+        Une méthode refusée par Werkzeug est remplacée par la méthode par défaut, avec un avertissement.
+        :param config: configuration de l'application (app.config)
+        :returns: None
+        """
+        methode = config.get("MOTS_DE_PASSE_METHODE", METHODE)
+        self.sel = config.get("MOTS_DE_PASSE_SEL", SEL)
+        try:
+            generate_password_hash("", methode, self.sel)
+        except (TypeError, ValueError):
+            warn("La méthode de hachage '{}' n'est pas disponible, '{}' est utilisée".format(methode, METHODE), Warning)
+            methode = METHODE
+        self.methode = methode_complete(methode)
+        if self.reserve is not None:
+            self.reserve.shutdown(wait=False)
+            self.reserve = None
+        parallelisme = config.get("MOTS_DE_PASSE_PARALLELISME", max(1, (os.cpu_count() or 2) // 2))
+        if parallelisme:
+            self.reserve = ThreadPoolExecutor(max_workers=parallelisme, thread_name_prefix="hachage")
+            self.admission = threading.BoundedSemaphore(parallelisme + config.get("MOTS_DE_PASSE_FILE", 8))
+            self.attente = config.get("MOTS_DE_PASSE_ATTENTE", 5)
+
+    def executer(self, fonction, *args):
+        """
+        Fonction qui exécute un calcul d'empreinte dans la réserve et attend son résultat.
+        :param fonction: fonction de calcul
+        :returns: résultat de la fonction
+        :raises Surcharge: si la file d'attente est pleine ou si le résultat n'est pas obtenu à temps
+        """
+        if self.reserve is None:
+            return fonction(*args)
+        if not self.admission.acquire(blocking=False):
+            raise Surcharge("Trop de connexions en cours")
+        try:
+            futur = self.reserve.submit(fonction, *args)
+        except RuntimeError:
+            self.admission.release()
+            raise
+        #La place est rendue à la fin du calcul (ou à son annulation), même si la requête a cessé de l'attendre.
+        futur.add_done_callback(lambda futur: self.admission.release())
+        try:
+            return futur.result(timeout=self.attente)
+        except DelaiDepasse:
+            futur.cancel()
+            raise Surcharge("Délai de connexion dépassé")
+
+    def hacher(self, motdepasse):
+        """
+        Fonction qui calcule l'empreinte d'un mot de passe selon la politique configurée.
+        :param motdepasse: mot de passe
+        :type motdepasse: str
+        :rtype: str
+        :raises Surcharge: voir executer()
+        """
+        return self.executer(generate_password_hash, motdepasse, self.methode, self.sel)
+
+    def verifier(self, empreinte, motdepasse):
+        """
+        Fonction qui vérifie un mot de passe avec son empreinte enregistrée.
+        :param empreinte: empreinte enregistrée
+        :type empreinte: str
+        :param motdepasse: mot de passe saisi
+        :type motdepasse: str
+        :rtype: booléen
+        :raises Surcharge: voir executer()
+        """
+        return self.executer(check_password_hash, empreinte, motdepasse)
+
+    def obsolete(self, empreinte):
+        """
+        Fonction qui indique si une empreinte a été calculée avec une autre politique (méthode, itérations ou longueur du sel)
+        que la politique configurée, et doit être recalculée.
+        :param empreinte: empreinte enregistrée ('méthode$sel$condensé')
+        :type empreinte: str
+        :rtype: booléen
+        """
+        parties = empreinte.split("$")
+        return len(parties) != 3 or parties[0] != self.methode or len(parties[1]) != self.sel
+
+
+hachage = Hachage()
@@ -0,0 +1,254 @@
+import datetime
+#Importation du module datetime pour dater les requêtes lentes.
+import glob
+#Importation de glob pour relire le journal courant et ses archives.
+import hashlib
+#Importation de hashlib pour calculer l'empreinte d'une requête.
+import json
+#Importation du module json : chaque requête lente est une ligne Json du journal.
+import logging
+from logging.handlers import RotatingFileHandler
+#Importation du module logging et du gestionnaire de fichiers à rotation : le journal est archivé lorsqu'il atteint sa taille maximale.
+import os
+#Importation du module os pour les chemins des fichiers du code de l'application.
+import re
+#Importation du module re pour normaliser le texte des requêtes.
+import sqlite3
+#Importation de sqlite3 pour lire le plan d'exécution d'une requête lente sur sa propre connexion.
+import sys
+#Importation de sys pour remonter la pile d'appels jusqu'au code de l'application.
+import time
+#Importation du module time pour mesurer la durée des requêtes.
+from flask import has_request_context, request
+#Importation de request pour attribuer une requête lente à la route qui l'a exécutée.
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+#Importation du système d'événements de SQLAlchemy, pour chronométrer chaque requête SQL.
+
+# JOURNAL DES REQUÊTES LENTES #
+# Toute requête SQL plus longue que REQUETES_LENTES_SEUIL (en secondes) est écrite dans un journal Json (une ligne par requête),
+# avec son texte, la forme de ses paramètres (types et nombre, jamais les valeurs saisies), sa durée, son plan d'exécution
+# (EXPLAIN QUERY PLAN) et son origine : la chaîne des fonctions de l'application qui l'ont exécutée (méthode du modèle, vue)
+# et la route de la requête HTTP. Le journal tourne lorsqu'il atteint REQUETES_LENTES_TAILLE octets.
+# La commande 'flask lenteurs' regroupe les requêtes du journal par empreinte (texte normalisé) et classe les plus coûteuses.
+
+CHEMIN_APPLICATION = os.path.dirname(os.path.abspath(__file__))
+APPELS_MAX = 6
+#Nombre maximal de fonctions de l'application rapportées pour chaque requête lente, de la plus proche à la plus lointaine.
+PLANS = ("select", "with", "update", "delete", "insert", "replace")
+#Instructions dont le plan d'exécution est demandé.
+
+journal = logging.getLogger("wwipoets.lenteurs")
+journal.propagate = False
+seuil = None
+#Durée (en secondes) au-delà de laquelle une requête est journalisée, ou None si le journal est désactivé.
+avec_plans = True
+#Si True, le plan d'exécution de chaque requête lente est lu et journalisé.
+
+
+def forme(valeurs):
+    """
+    Fonction qui décrit la forme des paramètres d'une requête (types, et nombre de valeurs de même type qui se suivent) sans leurs valeurs.
+    :param valeurs: paramètres d'une requête (tuple, liste ou dictionnaire)
+    :returns: par exemple ['int×500', 'str'] ou {'cle': 'str'}
+    :rtype: list or dict
+    """
+    if isinstance(valeurs, dict):
+        return {cle: type(valeur).__name__ for cle, valeur in valeurs.items()}
+    resultat, precedent, nombre = [], None, 0
+    for valeur in valeurs or ():
+        nom = type(valeur).__name__
+        if nom == precedent:
+            nombre += 1
+            continue
+        if precedent is not None:
+            resultat.append(precedent + ("×{}".format(nombre) if nombre > 1 else ""))
+        precedent, nombre = nom, 1
+    if precedent is not None:
+        resultat.append(precedent + ("×{}".format(nombre) if nombre > 1 else ""))
+    return resultat
+
+
+def normaliser(instruction):
+    """
+    Fonction qui normalise le texte d'une requête : littéraux remplacés par '?', listes IN (?, ?, ...) réduites à IN (?...),
+    espaces regroupés. Deux requêtes qui ne diffèrent que par leurs valeurs ont le même texte normalisé.
+    :param instruction: texte SQL
+    :type instruction: str
+    :rtype: str
+    """
+    texte = re.sub(r"'(?:[^']|'')*'", "?", instruction)
+    texte = re.sub(r"\b\d+(?:\.\d+)?\b", "?", texte)
+    texte = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?...)", texte)
+    return re.sub(r"\s+", " ", texte).strip()
+
+
+def empreinte(instruction):
+    """
+    Fonction qui renvoie l'empreinte d'une requête (condensé de son texte normalisé).
+    :rtype: str
+    """
+    return hashlib.sha1(normaliser(instruction).encode("utf-8")).hexdigest()[:12]
+
+
+def lecture_complete(detail):
+    """
+    Fonction qui indique si une ligne d'un plan d'exécution SQLite est la lecture complète d'une table (sans index).
+    'SCAN (subquery-n)' parcourt le résultat d'une sous-requête déjà restreinte, et non une table ; 'SCAN ... VIRTUAL TABLE INDEX'
+    interroge l'index d'une table virtuelle (par exemple l'index plein-texte).
+    :param detail: ligne du plan (colonne 'detail' d'EXPLAIN QUERY PLAN)
+    :type detail: str
+    :rtype: booléen
+    """
+    return detail.startswith("SCAN ") and "USING" not in detail and not detail.startswith("SCAN (") and "VIRTUAL TABLE INDEX" not in detail
+
+
+def plan(curseur, instruction, parametres):
+    """
+    Fonction qui lit le plan d'exécution d'une requête sur la connexion qui l'a exécutée (la requête n'est pas exécutée de nouveau).
+    :param curseur: curseur DB-API de la requête
+    :param instruction: texte SQL
+    :type instruction: str
+    :param parametres: paramètres de la requête
+    :returns: lignes du plan, ou None si le plan ne peut pas être lu
+    :rtype: list or None
+    """
+    if not instruction.lstrip().lower().startswith(PLANS) or not isinstance(curseur, sqlite3.Cursor):
+        return None
+    try:
+        #Un curseur SQLite ordinaire : la lecture du plan n'entre pas dans les métriques des requêtes (voir metriques.py).
+        lecteur = sqlite3.Cursor(curseur.connection)
+        try:
+            return [ligne[-1] for ligne in lecteur.execute("EXPLAIN QUERY PLAN " + instruction, parametres or ())]
+        finally:
+            lecteur.close()
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+def appels():
+    """
+    Fonction qui remonte la pile d'appels et renvoie les fonctions de l'application (hors de ce fichier) qui ont exécuté la requête,
+    de la plus proche (par exemple Poet.delete_poets) à la plus lointaine (par exemple la vue).
+    :returns: liste de chaînes 'fichier:ligne fonction', fichiers relatifs au dossier de l'application
+    :rtype: list
+    """
+    resultat = []
+    cadre = sys._getframe(1)
+    while cadre is not None and len(resultat) < APPELS_MAX:
+        fichier = cadre.f_code.co_filename
+        if fichier.startswith(CHEMIN_APPLICATION) and fichier != __file__:
+            resultat.append("{}:{} {}".format(os.path.relpath(fichier, CHEMIN_APPLICATION), cadre.f_lineno, cadre.f_code.co_name))
+        cadre = cadre.f_back
+    return resultat
+
+
+def avant_requete(connexion, curseur, instruction, parametres, contexte, executemany):
+    """ Fonction appelée par SQLAlchemy avant chaque requête SQL : note l'heure de début. """
+    connexion.info["debut_lenteurs"] = time.perf_counter()
+
+
+def apres_requete(connexion, curseur, instruction, parametres, contexte, executemany):
+    """ Fonction appelée par SQLAlchemy après chaque requête SQL : journalise la requête si elle a dépassé le seuil. """
+    debut = connexion.info.pop("debut_lenteurs", None)
+    if debut is None:
+        return
+    duree = time.perf_counter() - debut
+    if seuil is None or duree < seuil:
+        return
+    premiers = parametres[0] if executemany and parametres else parametres
+    entree = {
+        "date": datetime.datetime.now().isoformat(timespec="milliseconds"),
+        "duree_ms": round(duree * 1000, 3),
+        "empreinte": empreinte(instruction),
+        "sql": instruction,
+        "parametres": forme(premiers),
+        "lignes_parametres": len(parametres) if executemany else 1,
+        "plan": plan(curseur, instruction, premiers) if avec_plans else None,
+        "appels": appels(),
+        "route": None,
+    }
+    if has_request_context():
+        entree["route"] = {"vue": request.endpoint, "methode": request.method, "chemin": request.path}
+    journal.info(json.dumps(entree, ensure_ascii=False))
+
+
+def configurer_lenteurs(config):
+    """
+    Fonction qui met en place le journal des requêtes lentes décrit par la configuration de l'application :
+    REQUETES_LENTES_SEUIL (en secondes, None pour désactiver), REQUETES_LENTES_FICHIER, REQUETES_LENTES_TAILLE (taille maximale
+    du journal en octets), REQUETES_LENTES_ARCHIVES (nombre d'archives conservées) et REQUETES_LENTES_PLANS (plans d'exécution).
+    :param config: configuration de l'application (app.config)
+    :returns: None
+    """
+    global seuil, avec_plans
+    seuil = config.get("REQUETES_LENTES_SEUIL")
+    avec_plans = config.get("REQUETES_LENTES_PLANS", True)
+    for gestionnaire in list(journal.handlers):
+        journal.removeHandler(gestionnaire)
+        gestionnaire.close()
+    if seuil is None:
+        return
+    gestionnaire = RotatingFileHandler(config["REQUETES_LENTES_FICHIER"], maxBytes=config.get("REQUETES_LENTES_TAILLE", 0),
+                                       backupCount=config.get("REQUETES_LENTES_ARCHIVES", 0), encoding="utf-8", delay=True)
+    gestionnaire.setFormatter(logging.Formatter("%(message)s"))
+    journal.addHandler(gestionnaire)
+    journal.setLevel(logging.INFO)
+    if not event.contains(Engine, "before_cursor_execute", avant_requete):
+        event.listen(Engine, "before_cursor_execute", avant_requete)
+        event.listen(Engine, "after_cursor_execute", apres_requete)
+
+
+# ANALYSE DU JOURNAL #
+
+
+def lire_journal(fichier):
+    """
+    Générateur des requêtes lentes enregistrées dans le journal et dans ses archives (fichier.1, fichier.2...).
+    Les lignes illisibles (par exemple une ligne tronquée par un arrêt du serveur) sont ignorées.
+    :param fichier: chemin du journal
+    :type fichier: str
+    :returns: générateur de dictionnaires
+    """
+    for chemin in sorted(glob.glob(glob.escape(fichier) + ".*"), reverse=True) + [fichier]:
+        if not os.path.exists(chemin):
+            continue
+        with open(chemin, encoding="utf-8") as flux:
+            for ligne in flux:
+                try:
+                    yield json.loads(ligne)
+                except ValueError:
+                    continue
+
+
+def regrouper(entrees):
+    """
+    Fonction qui regroupe les requêtes lentes par empreinte et les classe par durée cumulée décroissante.
+    :param entrees: requêtes lentes lues par lire_journal()
+    :returns: liste de dictionnaires (empreinte, nombre, durées cumulée, moyenne et maximale, texte normalisé,
+        plan de la requête la plus lente, lecture complète d'une table, origines et routes les plus fréquentes)
+    :rtype: list
+    """
+    groupes = {}
+    for entree in entrees:
+        groupe = groupes.setdefault(entree["empreinte"], {
+            "empreinte": entree["empreinte"], "nombre": 0, "total_ms": 0.0, "max_ms": 0.0, "sql": normaliser(entree["sql"]),
+            "plan": None, "appels": {}, "routes": {},
+        })
+        groupe["nombre"] += 1
+        groupe["total_ms"] += entree["duree_ms"]
+        if entree["duree_ms"] >= groupe["max_ms"]:
+            groupe["max_ms"] = entree["duree_ms"]
+            groupe["plan"] = entree.get("plan")
+        origine = entree["appels"][0] if entree.get("appels") else "?"
+        groupe["appels"][origine] = groupe["appels"].get(origine, 0) + 1
+        route = (entree.get("route") or {}).get("vue") or "-"
+        groupe["routes"][route] = groupe["routes"].get(route, 0) + 1
+    resultat = sorted(groupes.values(), key=lambda groupe: groupe["total_ms"], reverse=True)
+    for groupe in resultat:
+        groupe["total_ms"] = round(groupe["total_ms"], 3)
+        groupe["moyenne_ms"] = round(groupe["total_ms"] / groupe["nombre"], 3)
+        groupe["lecture_complete"] = any(lecture_complete(ligne) for ligne in groupe["plan"] or ())
+        groupe["appels"] = sorted(groupe["appels"].items(), key=lambda element: element[1], reverse=True)
+        groupe["routes"] = sorted(groupe["routes"].items(), key=lambda element: element[1], reverse=True)
+    return resultat
@@ -0,0 +1,374 @@
+import hmac
+#Importation du module hmac pour comparer le jeton d'accès aux métriques en temps constant.
+import random
+#Importation du module random pour l'échantillonnage des requêtes mesurées.
+import sqlite3
+#Importation de sqlite3 pour compter les lignes lues par les curseurs des connexions à la base.
+import threading
+#Importation du module threading : les mesures de la requête en cours sont propres à chaque fil d'exécution (thread) du serveur.
+import time
+#Importation du module time pour mesurer les durées.
+from bisect import bisect_left
+#Importation de bisect_left pour trouver l'intervalle d'histogramme d'une valeur.
+from flask import request
+#Importation de request pour lire la vue (endpoint) et la méthode de la requête mesurée.
+from jinja2 import Template
+#Importation de la classe des gabarits Jinja, dont le rendu est chronométré.
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+#Importation du système d'événements de SQLAlchemy, pour mesurer chaque requête SQL.
+
+# MÉTRIQUES #
+# Chaque requête HTTP échantillonnée (METRIQUES_ECHANTILLONNAGE, entre 0 et 1) est mesurée : durée totale, nombre et durée
+# des requêtes SQL, lignes lues dans la base et durée du rendu des gabarits (qui comprend les requêtes des chargements différés).
+# Les mesures sont cumulées par vue (endpoint) et publiées au format texte de Prometheus par la route /metrics ;
+# elles sont aussi renvoyées au navigateur dans l'en-tête Server-Timing (METRIQUES_SERVER_TIMING).
+# Les requêtes non échantillonnées sont seulement comptées : avec un échantillonnage à 0, le coût se limite à ce compteur
+# (les connexions à la base utilisent alors les curseurs ordinaires de sqlite3, qui ne comptent pas les lignes lues).
+# La route /metrics n'est servie qu'aux adresses de METRIQUES_ADRESSES, ou sur présentation du jeton METRIQUES_JETON.
+# Comme le cache de réponses en mémoire, les métriques sont propres à chaque processus (worker) du serveur.
+
+DUREES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+#Bornes (en secondes) de l'histogramme des durées des requêtes HTTP.
+NOMBRES_REQUETES = (0, 1, 2, 5, 10, 20, 50, 100)
+#Bornes de l'histogramme du nombre de requêtes SQL par requête HTTP.
+VUE_INCONNUE = "inconnue"
+#Étiquette des requêtes qui ne correspondent à aucune route (404).
+
+#Mesure de la requête HTTP en cours dans chaque fil d'exécution (None si elle n'est pas échantillonnée).
+courante = threading.local()
+
+
+class Mesure:
+    """
+    Mesures d'une requête HTTP échantillonnée.
+    """
+    __slots__ = ("debut", "requetes", "duree_sql", "debut_sql", "lignes", "rendu")
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        self.requetes = 0
+        self.duree_sql = 0.0
+        self.debut_sql = None
+        self.lignes = 0
+        self.rendu = 0.0
+
+
+class Histogramme:
+    """
+    Histogramme cumulatif au sens de Prometheus : nombre d'observations inférieures ou égales à chaque borne, somme et nombre total.
+    """
+
+    def __init__(self, bornes):
+        self.bornes = bornes
+        self.comptes = [0] * len(bornes)
+        self.somme = 0.0
+        self.nombre = 0
+
+    def observer(self, valeur):
+        """
+        Fonction qui ajoute une observation (le compte de la première borne supérieure ou égale est incrémenté,
+        les comptes sont cumulés à la publication).
+        """
+        rang = bisect_left(self.bornes, valeur)
+        if rang < len(self.bornes):
+            self.comptes[rang] += 1
+        self.somme += valeur
+        self.nombre += 1
+
+    def cumuls(self):
+        """
+        :returns: liste de tuples (borne, nombre d'observations inférieures ou égales), puis ('+Inf', nombre total)
+        :rtype: list
+        """
+        cumul, lignes = 0, []
+        for borne, compte in zip(self.bornes, self.comptes):
+            cumul += compte
+            lignes.append((format(borne, "g"), cumul))
+        lignes.append(("+Inf", self.nombre))
+        return lignes
+
+
+class Registre:
+    """
+    Métriques cumulées du processus, par vue. Les mises à jour sont protégées par un verrou (serveur multi-thread).
+    """
+
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.requetes = {}
+        #(vue, méthode, code HTTP) -> nombre de requêtes
+        self.durees = {}
+        #vue -> histogramme des durées
+        self.nombres_sql = {}
+        #vue -> histogramme du nombre de requêtes SQL
+        self.cumuls = {}
+        #vue -> [requêtes SQL, durée SQL, lignes lues, durée du rendu]
+        self.caches = {}
+        #nom -> cache en mémoire (CacheTTL) dont les succès et échecs sont publiés
+
+    def compter(self, vue, methode, statut):
+        """
+        Fonction qui compte une requête HTTP (échantillonnée ou non).
+        """
+        cle = (vue, methode, statut)
+        with self.verrou:
+            self.requetes[cle] = self.requetes.get(cle, 0) + 1
+
+    def enregistrer(self, vue, duree, mesure):
+        """
+        Fonction qui ajoute les mesures d'une requête HTTP échantillonnée aux métriques de sa vue.
+        :param vue: nom de la vue (endpoint)
+        :type vue: str
+        :param duree: durée totale de la requête en secondes
+        :type duree: float
+        :param mesure: mesures de la requête
+        :type mesure: Mesure
+        :returns: None
+        """
+        with self.verrou:
+            if vue not in self.durees:
+                self.durees[vue] = Histogramme(DUREES)
+                self.nombres_sql[vue] = Histogramme(NOMBRES_REQUETES)
+                self.cumuls[vue] = [0, 0.0, 0, 0.0]
+            self.durees[vue].observer(duree)
+            self.nombres_sql[vue].observer(mesure.requetes)
+            cumuls = self.cumuls[vue]
+            cumuls[0] += mesure.requetes
+            cumuls[1] += mesure.duree_sql
+            cumuls[2] += mesure.lignes
+            cumuls[3] += mesure.rendu
+
+    def suivre(self, nom, cache):
+        """
+        Fonction qui ajoute un cache en mémoire (CacheTTL) aux métriques publiées : succès, échecs et nombre d'entrées.
+        :param nom: nom du cache, publié dans l'étiquette 'cache'
+        :type nom: str
+        :param cache: cache suivi
+        :type cache: CacheTTL
+        :returns: None
+        """
+        with self.verrou:
+            self.caches[nom] = cache
+
+    def vider(self):
+        with self.verrou:
+            self.requetes.clear()
+            self.durees.clear()
+            self.nombres_sql.clear()
+            self.cumuls.clear()
+
+    def exposer(self, taux):
+        """
+        Fonction qui écrit les métriques au format texte de Prometheus (version 0.0.4).
+        :param taux: taux d'échantillonnage, publié pour extrapoler les mesures à l'ensemble des requêtes
+        :type taux: float
+        :rtype: str
+        """
+        lignes = []
+
+        def entete(nom, type_metrique, aide):
+            lignes.append("# HELP {} {}".format(nom, aide))
+            lignes.append("# TYPE {} {}".format(nom, type_metrique))
+
+        def histogramme(nom, aide, histogrammes):
+            entete(nom, "histogram", aide)
+            for vue, valeurs in sorted(histogrammes.items()):
+                for borne, cumul in valeurs.cumuls():
+                    lignes.append("{}_bucket{} {}".format(nom, etiquettes(endpoint=vue, le=borne), cumul))
+                lignes.append("{}_sum{} {}".format(nom, etiquettes(endpoint=vue), repr(float(valeurs.somme))))
+                lignes.append("{}_count{} {}".format(nom, etiquettes(endpoint=vue), valeurs.nombre))
+
+        with self.verrou:
+            entete("wwipoets_metrics_sample_rate", "gauge", "Part des requêtes HTTP mesurées (échantillonnage).")
+            lignes.append("wwipoets_metrics_sample_rate {}".format(repr(float(taux))))
+            entete("wwipoets_http_requests_total", "counter", "Requêtes HTTP servies, par vue, méthode et code de réponse.")
+            for (vue, methode, statut), nombre in sorted(self.requetes.items()):
+                lignes.append("wwipoets_http_requests_total{} {}".format(etiquettes(endpoint=vue, method=methode, status=statut), nombre))
+            histogramme("wwipoets_http_request_duration_seconds", "Durée des requêtes HTTP mesurées.", self.durees)
+            histogramme("wwipoets_db_queries_per_request", "Nombre de requêtes SQL par requête HTTP mesurée.", self.nombres_sql)
+            for rang, nom, aide in (
+                (0, "wwipoets_db_queries_total", "Requêtes SQL envoyées par les requêtes HTTP mesurées."),
+                (1, "wwipoets_db_duration_seconds_total", "Durée cumulée des requêtes SQL des requêtes HTTP mesurées."),
+                (2, "wwipoets_db_rows_fetched_total", "Lignes lues dans la base par les requêtes HTTP mesurées."),
+                (3, "wwipoets_template_render_seconds_total", "Durée cumulée du rendu des gabarits des requêtes HTTP mesurées."),
+            ):
+                entete(nom, "counter", aide)
+                for vue, cumuls in sorted(self.cumuls.items()):
+                    valeur = cumuls[rang]
+                    lignes.append("{}{} {}".format(nom, etiquettes(endpoint=vue), repr(float(valeur)) if isinstance(valeur, float) else valeur))
+            for nom, type_metrique, aide, lire in (
+                ("wwipoets_cache_hits_total", "counter", "Lectures servies par un cache en mémoire.", lambda cache: cache.succes),
+                ("wwipoets_cache_misses_total", "counter", "Lectures absentes ou expirées d'un cache en mémoire.", lambda cache: cache.echecs),
+                ("wwipoets_cache_entries", "gauge", "Entrées conservées dans un cache en mémoire.", lambda cache: len(cache.entrees)),
+            ):
+                entete(nom, type_metrique, aide)
+                for cache, valeurs in sorted(self.caches.items()):
+                    lignes.append("{}{} {}".format(nom, etiquettes(cache=cache), lire(valeurs)))
+        return "\n".join(lignes) + "\n"
+
+
+def etiquettes(**valeurs):
+    """
+    Fonction qui écrit les étiquettes d'une métrique ({nom="valeur",...}), en échappant les caractères réservés.
+    :rtype: str
+    """
+    return "{" + ",".join('{}="{}"'.format(nom, str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                          for nom, valeur in valeurs.items()) + "}"
+
+
+registre = Registre()
+
+
+# MESURE DE LA BASE ET DES GABARITS #
+
+
+class CurseurMesure(sqlite3.Cursor):
+    """
+    Curseur SQLite qui ajoute à la mesure de la requête HTTP en cours le nombre de lignes qu'il renvoie.
+    """
+
+    def fetchone(self):
+        ligne = super().fetchone()
+        mesure = getattr(courante, "mesure", None)
+        if mesure is not None and ligne is not None:
+            mesure.lignes += 1
+        return ligne
+
+    def fetchmany(self, *args, **kwargs):
+        lignes = super().fetchmany(*args, **kwargs)
+        mesure = getattr(courante, "mesure", None)
+        if mesure is not None:
+            mesure.lignes += len(lignes)
+        return lignes
+
+    def fetchall(self):
+        lignes = super().fetchall()
+        mesure = getattr(courante, "mesure", None)
+        if mesure is not None:
+            mesure.lignes += len(lignes)
+        return lignes
+
+
+class ConnexionMesuree(sqlite3.Connection):
+    """
+    Connexion SQLite dont les curseurs comptent les lignes lues (voir CurseurMesure).
+    """
+
+    def cursor(self, factory=CurseurMesure):
+        return super().cursor(factory)
+
+
+class GabaritMesure(Template):
+    """
+    Gabarit Jinja dont le rendu est chronométré pour la requête HTTP en cours.
+    """
+
+    def render(self, *args, **kwargs):
+        mesure = getattr(courante, "mesure", None)
+        if mesure is None:
+            return super().render(*args, **kwargs)
+        debut = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            mesure.rendu += time.perf_counter() - debut
+
+
+def avant_sql(connexion, curseur, instruction, parametres, contexte, executemany):
+    """ Fonction appelée par SQLAlchemy avant chaque requête SQL : note l'heure de début pour la requête HTTP mesurée. """
+    mesure = getattr(courante, "mesure", None)
+    if mesure is not None:
+        mesure.debut_sql = time.perf_counter()
+
+
+def apres_sql(connexion, curseur, instruction, parametres, contexte, executemany):
+    """ Fonction appelée par SQLAlchemy après chaque requête SQL : ajoute sa durée à la mesure de la requête HTTP. """
+    mesure = getattr(courante, "mesure", None)
+    if mesure is not None and mesure.debut_sql is not None:
+        mesure.requetes += 1
+        mesure.duree_sql += time.perf_counter() - mesure.debut_sql
+        mesure.debut_sql = None
+
+
+# CYCLE DES REQUÊTES HTTP #
+
+
+def debut_requete(taux):
+    """
+    Fonction appelée avant chaque requête HTTP : décide si elle est mesurée (échantillonnage).
+    """
+    courante.mesure = Mesure() if taux >= 1 or (taux > 0 and random.random() < taux) else None
+
+
+def fin_requete(reponse, server_timing):
+    """
+    Fonction appelée après chaque requête HTTP : compte la requête, enregistre ses mesures et ajoute l'en-tête Server-Timing.
+    :param reponse: réponse de la vue
+    :param server_timing: si True, les durées mesurées sont renvoyées dans l'en-tête Server-Timing
+    :type server_timing: booléen
+    :returns: la réponse
+    """
+    vue = request.endpoint or VUE_INCONNUE
+    if vue == "metriques":
+        courante.mesure = None
+        return reponse
+    registre.compter(vue, request.method, reponse.status_code)
+    mesure = getattr(courante, "mesure", None)
+    courante.mesure = None
+    if mesure is None:
+        return reponse
+    duree = time.perf_counter() - mesure.debut
+    registre.enregistrer(vue, duree, mesure)
+    if server_timing:
+        reponse.headers.add("Server-Timing", 'sql;dur={:.3f};desc="{} SQL"'.format(mesure.duree_sql * 1000, mesure.requetes))
+        reponse.headers.add("Server-Timing", "rendu;dur={:.3f}".format(mesure.rendu * 1000))
+        reponse.headers.add("Server-Timing", "total;dur={:.3f}".format(duree * 1000))
+    return reponse
+
+
+def abandon_requete(exception=None):
+    """
+    Fonction appelée à la fin de chaque requête HTTP, y compris en cas d'erreur : la mesure ne doit pas passer à la requête suivante du fil.
+    """
+    courante.mesure = None
+
+
+def acces_autorise(config):
+    """
+    Fonction qui indique si la requête en cours peut lire les métriques : le client a une adresse de METRIQUES_ADRESSES,
+    ou présente le jeton METRIQUES_JETON dans l'en-tête 'Authorization: Bearer <jeton>'.
+    :param config: configuration de l'application (app.config)
+    :rtype: booléen
+    """
+    if request.remote_addr in config.get("METRIQUES_ADRESSES", ()):
+        return True
+    jeton = config.get("METRIQUES_JETON")
+    autorisation = request.headers.get("Authorization", "")
+    return bool(jeton) and autorisation.startswith("Bearer ") and hmac.compare_digest(autorisation[7:].encode(), jeton.encode())
+
+
+def configurer_metriques(app):
+    """
+    Fonction qui met en place les métriques décrites par la configuration de l'application : METRIQUES (activation),
+    METRIQUES_ECHANTILLONNAGE (part des requêtes mesurées) et METRIQUES_SERVER_TIMING (en-tête Server-Timing).
+    Elle doit être appelée avant la création du moteur de la base, dont les connexions comptent alors les lignes lues
+    (seulement si une part des requêtes est mesurée).
+    :param app: application Flask
+    :returns: None
+    """
+    if not app.config.get("METRIQUES", False):
+        return
+    taux = float(app.config.get("METRIQUES_ECHANTILLONNAGE", 0.1))
+    server_timing = app.config.get("METRIQUES_SERVER_TIMING", True)
+    if taux > 0:
+        options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+        options["connect_args"] = dict(options.get("connect_args", {}), factory=ConnexionMesuree)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+    app.jinja_env.template_class = GabaritMesure
+    if not event.contains(Engine, "before_cursor_execute", avant_sql):
+        event.listen(Engine, "before_cursor_execute", avant_sql)
+        event.listen(Engine, "after_cursor_execute", apres_sql)
+    app.before_request(lambda: debut_requete(taux))
+    app.after_request(lambda reponse: fin_requete(reponse, server_timing))
+    app.teardown_request(abandon_requete)
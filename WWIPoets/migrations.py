@@ -0,0 +1,243 @@
+from sqlalchemy import inspect, text
+#Importation de inspect pour lire le schéma réel de la base (tables et index existants), et de text pour les requêtes écrites en SQL.
+from .app import db
+#Importation de la base de données
+from .modeles import donnees, utilisateurs, lieux
+#Importation des modèles, dont les tables et les index déclarés décrivent le schéma attendu.
+from .modeles.statistiques import creer_statistiques
+#Importation de la création de la table des statistiques (facettes) et de ses déclencheurs, déclarée dans le fichier statistiques.py
+from .modeles.dates import normaliser_dates
+#Importation du calcul des dates normalisées des notices existantes, déclaré dans le fichier dates.py
+from .modeles.chronologie import creer_chronologie, recreer_chronologie
+#Importation de la création de la chronologie matérialisée (table Evenement), déclarée dans le fichier chronologie.py
+from .modeles.lieux import charger_gazetteer, lier_lieux
+#Importation du chargement du gazetteer et du rattachement des lieux saisis, déclarés dans le fichier lieux.py
+from .modeles.lecture import creer_suppressions, MODIFICATIONS_LECTURE
+#Importation de la création de la table Suppression et de la requête de fraîcheur du modèle de lecture, déclarées dans le fichier lecture.py
+from .lenteurs import lecture_complete
+#Importation de la détection des lectures complètes de tables dans un plan d'exécution, déclarée dans le fichier lenteurs.py
+
+# MIGRATIONS DU SCHÉMA #
+# La version du schéma est conservée dans la base elle-même (PRAGMA user_version, qui vaut 0 pour la base d'origine).
+# Au lancement de l'application, chaque étape dont le numéro est supérieur à cette version est appliquée dans l'ordre,
+# puis la version est mise à jour. Une étape doit pouvoir être rejouée sans erreur (création 'si absent').
+# Pour faire évoluer le schéma : déclarer la colonne ou l'index sur le modèle dans donnees.py, puis ajouter une étape à la fin de MIGRATIONS.
+
+
+def creer_elements_manquants(connexion, uniques=True):
+    """
+    Fonction qui crée les tables, les colonnes et les index déclarés sur les modèles qui n'existent pas encore dans la base.
+    Les colonnes ajoutées à une table existante (ALTER TABLE ... ADD COLUMN) valent NULL pour les lignes déjà enregistrées.
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :param uniques: si False, les index UNIQUE ne sont pas créés (ils le sont par une étape ultérieure, après nettoyage des données)
+    :type uniques: booléen
+    :returns: liste des noms des éléments créés
+    :rtype: list
+    """
+    crees = []
+    inspecteur = inspect(connexion)
+    tables = set(inspecteur.get_table_names())
+    for table in db.Model.metadata.sorted_tables:
+        if table.name not in tables:
+            table.create(connexion)
+            crees.append(table.name)
+            continue
+        colonnes = set(colonne["name"] for colonne in inspecteur.get_columns(table.name))
+        for colonne in table.columns:
+            if colonne.name not in colonnes:
+                connexion.execute('ALTER TABLE "{}" ADD COLUMN "{}" {}'.format(
+                    table.name, colonne.name, colonne.type.compile(dialect=connexion.dialect)))
+                crees.append(table.name + "." + colonne.name)
+        #Les noms sont lus dans sqlite_master : l'inspecteur de SQLAlchemy ignore les index sur expression.
+        existants = set(ligne[0] for ligne in connexion.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table.name,)
+        ))
+        for index in table.indexes:
+            if index.name not in existants and (uniques or not index.unique):
+                index.create(connexion)
+                crees.append(index.name)
+    return crees
+
+
+# Colonnes des identifiants externes. Dans la base d'origine, certaines notices créées sans identifiant portent le texte 'None'.
+IDENTIFIANTS_EXTERNES = [
+    ("Poet", "poet_external_login"),
+    ("Publication", "publication_external_login"),
+    ("Military_status", "military_status_external_login"),
+]
+
+
+def creer_index_uniques(connexion):
+    """
+    Fonction qui rend uniques les identifiants externes et les couples (nom, prénom) des poètes.
+    Les identifiants 'None' (absence d'identifiant) sont remplacés par NULL, que l'index UNIQUE autorise plusieurs fois ;
+    les index des identifiants externes créés par l'étape 1 sont remplacés par les index UNIQUE déclarés sur les modèles.
+    La base d'origine contient des notices en double (même nom, même prénom) : l'index UNIQUE sur le nom et le prénom est partiel
+    et exclut ces doublons existants, qui restent à fusionner à la main, tout en refusant les nouveaux.
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :returns: None
+    """
+    for table, colonne in IDENTIFIANTS_EXTERNES:
+        connexion.execute("UPDATE {0} SET {1} = NULL WHERE {1} = 'None'".format(table, colonne))
+    for table in db.Model.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.unique:
+                connexion.execute('DROP INDEX IF EXISTS "{}"'.format(index.name))
+                index.create(connexion)
+    doublons = [ligne[0] for ligne in connexion.execute(
+        "SELECT poet_id FROM Poet AS doublon WHERE EXISTS (SELECT 1 FROM Poet WHERE poet_name = doublon.poet_name "
+        "AND poet_firstname = doublon.poet_firstname AND poet_id < doublon.poet_id)"
+    )]
+    condition = " WHERE poet_id NOT IN ({})".format(", ".join(str(int(poet_id)) for poet_id in doublons)) if doublons else ""
+    connexion.execute("DROP INDEX IF EXISTS ux_poet_nom_prenom")
+    connexion.execute("CREATE UNIQUE INDEX ux_poet_nom_prenom ON Poet (poet_name, poet_firstname)" + condition)
+
+
+def creer_dates_normalisees(connexion):
+    """
+    Fonction qui ajoute les colonnes des dates normalisées (année, mois, jour, précision) et leurs index, les calcule pour
+    les notices existantes, puis recrée les statistiques, dont les décennies sont désormais lues dans ces colonnes.
+    Les index sur l'année extraite du texte (étape 4) sont remplacés par les index des colonnes normalisées.
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :returns: None
+    """
+    for index in ("ix_poet_annee_naissance", "ix_poet_annee_deces"):
+        connexion.execute("DROP INDEX IF EXISTS {}".format(index))
+    creer_elements_manquants(connexion)
+    normaliser_dates(connexion)
+    creer_statistiques(connexion)
+
+
+def creer_lieux(connexion):
+    """
+    Fonction qui crée les tables Place et Place_variant et les colonnes des identifiants de lieu, charge le gazetteer,
+    rattache les lieux des notices existantes, puis recrée les statistiques, dont les déclencheurs comptent désormais les poètes par lieu.
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :returns: None
+    """
+    creer_elements_manquants(connexion)
+    charger_gazetteer(connexion)
+    lier_lieux(connexion)
+    creer_statistiques(connexion)
+
+
+MIGRATIONS = [
+    (1, "Index secondaires sur les clés étrangères, les noms, les titres et les identifiants externes",
+     lambda connexion: creer_elements_manquants(connexion, uniques=False)),
+    (2, "Index UNIQUE sur les identifiants externes et sur les noms et prénoms des poètes", creer_index_uniques),
+    (3, "Table Facette des statistiques précalculées, tenue à jour par des déclencheurs", creer_statistiques),
+    (4, "Index des filtres de la recherche structurée (nationalité, années, grade, statut, lieu de recrutement, genre)", creer_elements_manquants),
+    (5, "Dates normalisées (année, mois, jour, précision) des poètes et des publications", creer_dates_normalisees),
+    (6, "Table Evenement de la chronologie (naissances, décès, publications, recrutements)", creer_chronologie),
+    (7, "Gazetteer des lieux (tables Place et Place_variant) et lieux canoniques des naissances, décès et recrutements", creer_lieux),
+    (8, "Table Evenement : mois et jour inconnus notés 0, pour la pagination de la chronologie par curseur", recreer_chronologie),
+    (9, "Table Suppression : trace des poètes supprimés, lue par le modèle de lecture des autres processus", creer_suppressions),
+]
+
+
+def version_schema(connexion):
+    """
+    Fonction qui renvoie la version du schéma enregistrée dans la base.
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :rtype: int
+    """
+    return connexion.execute("PRAGMA user_version").scalar()
+
+
+def migrer():
+    """
+    Fonction qui applique les étapes de migration qui ne l'ont pas encore été. Elle doit être appelée dans un contexte d'application.
+    :returns: liste des descriptions des étapes appliquées
+    :rtype: list
+    """
+    appliquees = []
+    with db.engine.begin() as connexion:
+        version = version_schema(connexion)
+        for numero, description, etape in MIGRATIONS:
+            if numero > version:
+                etape(connexion)
+                connexion.execute("PRAGMA user_version = {}".format(int(numero)))
+                appliquees.append("{} : {}".format(numero, description))
+    return appliquees
+
+
+# VÉRIFICATION DES PLANS D'EXÉCUTION #
+# Les requêtes les plus fréquentes de l'application doivent s'appuyer sur un index. 'SCAN <table>' sans index
+# (lecture de toute la table) ou 'USE TEMP B-TREE' (tri de toute la table) dans EXPLAIN QUERY PLAN signale un index manquant.
+
+def requetes_critiques():
+    """
+    Fonction qui renvoie les requêtes fréquentes de l'application dont le plan d'exécution doit utiliser un index.
+    :returns: liste de tuples (nom, requête SQLAlchemy)
+    :rtype: list
+    """
+    Poet, Publication, Military_status = donnees.Poet, donnees.Publication, donnees.Military_status
+    return [
+        ("index_individus", Poet.query.order_by(Poet.poet_name).limit(20).offset(40)),
+        ("index_publications", Publication.query.order_by(Publication.publication_titre).limit(20).offset(40)),
+        ("create_poet (nom et prénom)", Poet.query.filter(db.and_(Poet.poet_name == "Apollinaire", Poet.poet_firstname == "Guillaume"))),
+        ("create_poet (identifiant externe)", Poet.query.filter(Poet.poet_external_login == "login")),
+        ("create_publication (identifiant externe)", Publication.query.filter(Publication.publication_external_login == "login")),
+        ("create_military_status (identifiant externe)", Military_status.query.filter(Military_status.military_status_external_login == "login")),
+        ("notice (publications)", Publication.query.filter(Publication.publication_poet_id.in_([1, 2]))),
+        ("notice (ESM)", Military_status.query.filter(Military_status.military_status_poet_id.in_([1, 2]))),
+        ("version d'une notice", donnees.VERSION_POETE.bindparams(poet_id=1)),
+        ("recherche structurée (nationalité et années)", Poet.query.filter(
+            Poet.poet_country == "française", Poet.poet_birth_year >= 1890, Poet.poet_birth_year <= 1895)),
+        ("recherche structurée (année de décès)", Poet.query.filter(Poet.poet_death_year <= 1918)),
+        ("publications par intervalle d'années", Publication.query.filter(
+            Publication.publication_year >= 1914, Publication.publication_year <= 1918)),
+        ("chronologie (page d'années)", text(
+            "SELECT type, objet_id, nom FROM Evenement WHERE annee BETWEEN :debut AND :fin ORDER BY annee, mois, jour, type, objet_id"
+        ).bindparams(debut=1914, fin=1918)),
+        ("chronologie (suite d'une page, par curseur)", text(
+            "SELECT type, objet_id, nom FROM Evenement WHERE annee BETWEEN :debut AND :fin "
+            "AND (annee, mois, jour, type, objet_id) > (:annee, :mois, :jour, :type, :objet_id) "
+            "ORDER BY annee, mois, jour, type, objet_id LIMIT :limite"
+        ).bindparams(debut=1914, fin=1918, annee=1916, mois=7, jour=0, type="publication", objet_id=42, limite=101)),
+        ("chronologie (page suivante)", text("SELECT min(annee) FROM Evenement WHERE annee > :annee").bindparams(annee=1918)),
+        ("liste des lieux (page suivante)", lieux.requete_lieux(True, 10, 21)),
+        ("page d'un lieu (naissances)", lieux.requete_liste_lieu("naissances", 1, 10, 21)),
+        ("page d'un lieu (décès)", lieux.requete_liste_lieu("deces", 1, 10, 21)),
+        ("page d'un lieu (recrutements)", lieux.requete_liste_lieu("recrutements", 1, 10, 21)),
+        ("modèle de lecture (écritures depuis la dernière vérification)",
+         MODIFICATIONS_LECTURE.bindparams(poete=600, publication=40, statut=10, suppression=0)),
+        ("rattachement d'un lieu saisi", lieux.Place_variant.query.filter(lieux.Place_variant.place_variant_cle == "paris")),
+        ("recherche structurée (grade)", db.session.query(Military_status.military_status_poet_id).filter(
+            Military_status.military_status_grade == "lieutenant")),
+        ("recherche structurée (genre)", db.session.query(Publication.publication_poet_id).filter(
+            Publication.publication_genre_litteraire == "poésie")),
+    ]
+
+
+def plan(requete):
+    """
+    Fonction qui renvoie le plan d'exécution SQLite (EXPLAIN QUERY PLAN) d'une requête SQLAlchemy.
+    :param requete: requête ORM (Query) ou expression SQL
+    :returns: liste des lignes 'detail' du plan
+    :rtype: list
+    """
+    instruction = requete.statement if hasattr(requete, "statement") else requete
+    compilee = instruction.compile(dialect=db.engine.dialect)
+    parametres = [compilee.params[nom] for nom in compilee.positiontup]
+    connexion = db.engine.raw_connection()
+    try:
+        return [ligne[-1] for ligne in connexion.execute("EXPLAIN QUERY PLAN " + str(compilee), parametres).fetchall()]
+    finally:
+        connexion.close()
+
+
+def verifier_plans():
+    """
+    Fonction qui vérifie que les requêtes critiques n'entraînent ni lecture complète d'une table ni tri temporaire.
+    :returns: liste de tuples (nom, plan) des requêtes en défaut (vide si tout va bien)
+    :rtype: list
+    """
+    defauts = []
+    for nom, requete in requetes_critiques():
+        details = plan(requete)
+        for detail in details:
+            if lecture_complete(detail) or detail.startswith("USE TEMP B-TREE"):
+                defauts.append((nom, details))
+                break
+    return defauts
@@ -0,0 +1,279 @@
+from sqlalchemy import text, bindparam
+#Importation de text et bindparam pour les requêtes SQL sur la table Evenement.
+from ..app import db
+#Importation de la base de données
+from ..constantes import CHRONOLOGIE_ANNEES, CHRONOLOGIE_ANNEES_MAX, CHRONOLOGIE_EVENEMENTS, API_LIMITE_MAX
+#Importation du nombre d'années et du nombre d'événements par page de la chronologie
+
+# CHRONOLOGIE #
+# La table Evenement rassemble, dans l'ordre chronologique, les naissances et les décès des poètes, leurs publications et leur
+# recrutement militaire. Elle est matérialisée : la réunion (UNION ALL) des tables Poet, Publication et Military_status n'est
+# calculée qu'à l'écriture, pour les seuls poètes concernés, par les méthodes de donnees.py et par l'import en masse
+# (comme l'index plein-texte). Une page de la chronologie est alors une lecture de l'index ix_evenement_date sur un intervalle d'années,
+# bornée à CHRONOLOGIE_EVENEMENTS événements : la suite de l'intervalle se lit par curseur (paramètre 'after', clé du dernier événement
+# de la page), par 'WHERE (annee, mois, jour, type, objet_id) > (:curseur) ... LIMIT :n' sur le même index, dont le coût ne dépend
+# ni de la taille de la base ni de la profondeur de la page. Le mois et le jour inconnus sont notés 0 (et non NULL), pour que la
+# comparaison du curseur suive l'ordre de l'index.
+# Les dates sont les dates normalisées (voir dates.py) : les dates dont l'année n'a pas pu être lue n'apparaissent pas.
+# Les ESM ne portent pas de date : le recrutement est daté de la classe du poète (année de ses 20 ans), année sous laquelle
+# le registre matricule est tenu. Seuls les ESM qui indiquent un lieu de recrutement donnent un événement.
+
+NAISSANCE = "naissance"
+DECES = "deces"
+PUBLICATION = "publication"
+RECRUTEMENT = "recrutement"
+TYPES_EVENEMENTS = (NAISSANCE, DECES, PUBLICATION, RECRUTEMENT)
+LIBELLES_EVENEMENTS = [(NAISSANCE, "Naissances"), (DECES, "Décès"), (PUBLICATION, "Publications"), (RECRUTEMENT, "Recrutements")]
+
+AGE_CLASSE = 20
+#Âge auquel un homme est recensé dans sa classe de recrutement.
+
+CREATION_EVENEMENT = [
+    """
+    CREATE TABLE IF NOT EXISTS Evenement (
+        type TEXT NOT NULL,
+        objet_id INTEGER NOT NULL,
+        annee INTEGER NOT NULL,
+        mois INTEGER NOT NULL DEFAULT 0,
+        jour INTEGER NOT NULL DEFAULT 0,
+        precision TEXT,
+        poet_id INTEGER NOT NULL,
+        nom TEXT,
+        detail TEXT,
+        PRIMARY KEY (type, objet_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_evenement_date ON Evenement (annee, mois, jour, type, objet_id)",
+    "CREATE INDEX IF NOT EXISTS ix_evenement_poete ON Evenement (poet_id)",
+]
+
+NOM_POETE = "trim(coalesce(Poet.poet_firstname, '') || ' ' || Poet.poet_name)"
+
+# Événements des poètes qui satisfont la condition {condition} (sur Poet.poet_id) : une sélection par type d'événement.
+SELECTION_EVENEMENTS = """
+SELECT '{naissance}', Poet.poet_id, Poet.poet_birth_year, coalesce(Poet.poet_birth_month, 0), coalesce(Poet.poet_birth_day, 0),
+       Poet.poet_birth_precision,
+       Poet.poet_id, {nom}, nullif(trim(Poet.poet_birthplace), '')
+FROM Poet WHERE Poet.poet_birth_year IS NOT NULL AND {{condition}}
+UNION ALL
+SELECT '{deces}', Poet.poet_id, Poet.poet_death_year, coalesce(Poet.poet_death_month, 0), coalesce(Poet.poet_death_day, 0),
+       Poet.poet_death_precision,
+       Poet.poet_id, {nom}, nullif(trim(Poet.poet_deathplace), '')
+FROM Poet WHERE Poet.poet_death_year IS NOT NULL AND {{condition}}
+UNION ALL
+SELECT '{publication}', Publication.publication_id, Publication.publication_year, coalesce(Publication.publication_month, 0),
+       coalesce(Publication.publication_day, 0), Publication.publication_precision, Poet.poet_id, {nom}, Publication.publication_titre
+FROM Publication JOIN Poet ON Poet.poet_id = Publication.publication_poet_id
+WHERE Publication.publication_year IS NOT NULL AND {{condition}}
+UNION ALL
+SELECT '{recrutement}', Military_status.military_status_id, Poet.poet_birth_year + {age}, 0, 0, 'annee', Poet.poet_id, {nom},
+       trim(Military_status.military_status_lieu_recrutement)
+FROM Military_status JOIN Poet ON Poet.poet_id = Military_status.military_status_poet_id
+WHERE Poet.poet_birth_year IS NOT NULL AND nullif(trim(Military_status.military_status_lieu_recrutement), '') IS NOT NULL
+  AND {{condition}}
+""".format(naissance=NAISSANCE, deces=DECES, publication=PUBLICATION, recrutement=RECRUTEMENT, age=AGE_CLASSE, nom=NOM_POETE)
+
+INSERTION_EVENEMENTS = "INSERT INTO Evenement (type, objet_id, annee, mois, jour, precision, poet_id, nom, detail) " + SELECTION_EVENEMENTS
+
+
+def creer_chronologie(connexion):
+    """
+    Fonction qui crée la table Evenement et ses index, puis la remplit à partir des tables existantes (étape de migrations.py).
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :returns: None
+    """
+    for instruction in CREATION_EVENEMENT:
+        connexion.execute(instruction)
+    connexion.execute("DELETE FROM Evenement")
+    connexion.execute(INSERTION_EVENEMENTS.format(condition="1"))
+
+
+def recreer_chronologie(connexion):
+    """
+    Fonction qui recrée la table Evenement avec le mois et le jour inconnus notés 0 (étape de migrations.py).
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :returns: None
+    """
+    connexion.execute("DROP TABLE IF EXISTS Evenement")
+    creer_chronologie(connexion)
+
+
+def rafraichir_evenements(poet_ids):
+    """
+    Fonction qui recalcule les événements de plusieurs poètes (notice, publications et ESM) en deux instructions.
+    Comme indexer_poete (recherche.py), elle est ajoutée à la transaction en cours : c'est à l'appelant de la valider (commit).
+    Un(e) poète(sse) supprimé(e) n'a plus d'événement.
+    :param poet_ids: identifiants numériques des individus
+    :type poet_ids: list
+    :returns: None
+    """
+    poet_ids = [poet_id for poet_id in poet_ids if poet_id is not None]
+    if not poet_ids:
+        return
+    parametres = {"poet_ids": poet_ids}
+    db.session.execute(
+        text("DELETE FROM Evenement WHERE poet_id IN :poet_ids").bindparams(bindparam("poet_ids", expanding=True)), parametres
+    )
+    db.session.execute(
+        text(INSERTION_EVENEMENTS.format(condition="Poet.poet_id IN :poet_ids")).bindparams(bindparam("poet_ids", expanding=True)),
+        parametres
+    )
+
+
+def condition_types(types):
+    """
+    Fonction qui renvoie la condition SQL qui restreint les événements à certains types, et ses paramètres.
+    :param types: types d'événements demandés, ou None pour tous
+    :type types: list or None
+    :returns: tuple (condition SQL, dictionnaire des paramètres)
+    :rtype: tuple
+    """
+    if not types:
+        return "", {}
+    parametres = {"type{}".format(numero): type_evenement for numero, type_evenement in enumerate(types)}
+    return " AND type IN ({})".format(", ".join(":" + nom for nom in parametres)), parametres
+
+
+def curseur(evenement):
+    """
+    Fonction qui renvoie le curseur d'un événement : sa clé dans l'ordre de l'index ix_evenement_date, sous la forme
+    'annee.mois.jour.type.objet_id' (par exemple '1916.7.0.publication.42').
+    :param evenement: événement lu par evenements()
+    :type evenement: dict
+    :rtype: str
+    """
+    return "{}.{}.{}.{}.{}".format(evenement["annee"], evenement["mois"] or 0, evenement["jour"] or 0, evenement["type"], evenement["objet_id"])
+
+
+def lire_curseur(valeur):
+    """
+    Fonction qui lit un curseur écrit par curseur().
+    :param valeur: curseur
+    :type valeur: str
+    :returns: tuple (annee, mois, jour, type, objet_id)
+    :rtype: tuple
+    :raises ValueError: si le curseur est invalide
+    """
+    parties = valeur.split(".")
+    if len(parties) != 5 or parties[3] not in TYPES_EVENEMENTS or not all(partie.isdigit() for partie in parties[:3] + parties[4:]):
+        raise ValueError("Le paramètre 'after' doit être le curseur d'un événement (par exemple 1916.7.0.publication.42)")
+    return int(parties[0]), int(parties[1]), int(parties[2]), parties[3], int(parties[4])
+
+
+def evenements(debut, fin, types=None, apres=None, limite=None):
+    """
+    Fonction qui lit les événements d'un intervalle d'années (bornes incluses), par ordre chronologique.
+    À année égale, les événements dont seule l'année est connue précèdent ceux dont le mois ou le jour est connu.
+    :param debut: première année de l'intervalle
+    :type debut: int
+    :param fin: dernière année de l'intervalle
+    :type fin: int
+    :param types: types d'événements demandés (voir TYPES_EVENEMENTS), ou None pour tous
+    :type types: list or None
+    :param apres: curseur (voir lire_curseur) : seuls les événements qui le suivent sont lus, ou None
+    :type apres: tuple or None
+    :param limite: nombre maximal d'événements lus, ou None
+    :type limite: int or None
+    :returns: liste de dictionnaires (type, objet_id, annee, mois, jour, precision, poet_id, nom, detail) ; mois et jour valent None s'ils sont inconnus
+    :rtype: list
+    """
+    condition, parametres = condition_types(types)
+    if apres is not None:
+        condition += " AND (annee, mois, jour, type, objet_id) > (:apres_annee, :apres_mois, :apres_jour, :apres_type, :apres_objet)"
+        parametres.update(zip(("apres_annee", "apres_mois", "apres_jour", "apres_type", "apres_objet"), apres))
+    if limite is not None:
+        condition += " ORDER BY annee, mois, jour, type, objet_id LIMIT :limite"
+        parametres["limite"] = limite
+    else:
+        condition += " ORDER BY annee, mois, jour, type, objet_id"
+    lignes = db.session.execute(text(
+        "SELECT type, objet_id, annee, mois, jour, precision, poet_id, nom, detail FROM Evenement "
+        "WHERE annee BETWEEN :debut AND :fin" + condition
+    ), dict(parametres, debut=debut, fin=fin))
+    return [dict(ligne, mois=ligne["mois"] or None, jour=ligne["jour"] or None) for ligne in lignes]
+
+
+def annee_voisine(annee, suivante, types=None):
+    """
+    Fonction qui renvoie l'année du premier événement après une année (ou du dernier avant), pour passer d'un intervalle au suivant
+    sans afficher d'intervalle vide.
+    :param annee: année de départ (exclue)
+    :type annee: int or None
+    :param suivante: True pour chercher après l'année, False avant ; avec annee=None, la première ou la dernière année de la chronologie
+    :type suivante: booléen
+    :param types: types d'événements demandés, ou None pour tous
+    :type types: list or None
+    :returns: année, ou None s'il n'y a pas d'événement
+    :rtype: int or None
+    """
+    condition, parametres = condition_types(types)
+    if annee is None:
+        borne = "1"
+    else:
+        borne = "annee > :annee" if suivante else "annee < :annee"
+    return db.session.execute(text(
+        "SELECT {}(annee) FROM Evenement WHERE {}{}".format("min" if suivante else "max", borne, condition)
+    ), dict(parametres, annee=annee)).scalar()
+
+
+def lire_fenetre(arguments):
+    """
+    Fonction qui lit les paramètres d'une page de la chronologie : 'start' (première année), 'years' (nombre d'années),
+    'types' (types d'événements séparés par des virgules), 'after' (curseur du dernier événement de la page précédente)
+    et 'limit' (nombre d'événements par page, au plus API_LIMITE_MAX).
+    :param arguments: paramètres de la requête (request.args)
+    :returns: tuple (première année ou None, nombre d'années, types ou None, curseur ou None, nombre d'événements)
+    :rtype: tuple
+    :raises ValueError: si un paramètre est invalide
+    """
+    debut = arguments.get("start", "").strip()
+    annees = arguments.get("years", "").strip()
+    limite = arguments.get("limit", "").strip()
+    if (debut and not debut.isdigit()) or (annees and not annees.isdigit()) or (limite and not limite.isdigit()):
+        raise ValueError("Les paramètres 'start', 'years' et 'limit' doivent être des années et des nombres entiers")
+    annees = max(1, min(int(annees), CHRONOLOGIE_ANNEES_MAX)) if annees else CHRONOLOGIE_ANNEES
+    limite = max(1, min(int(limite), API_LIMITE_MAX)) if limite else CHRONOLOGIE_EVENEMENTS
+    apres = arguments.get("after", "").strip()
+    apres = lire_curseur(apres) if apres else None
+    types = [type_evenement.strip() for type_evenement in arguments.get("types", "").split(",") if type_evenement.strip()]
+    inconnus = [type_evenement for type_evenement in types if type_evenement not in TYPES_EVENEMENTS]
+    if inconnus:
+        raise ValueError("Type(s) d'événement inconnu(s) : {}. Types disponibles : {}".format(", ".join(inconnus), ", ".join(TYPES_EVENEMENTS)))
+    return (int(debut) if debut else None), annees, (types or None), apres, limite
+
+
+def fenetre(debut=None, annees=CHRONOLOGIE_ANNEES, types=None, apres=None, limite=CHRONOLOGIE_EVENEMENTS):
+    """
+    Fonction qui renvoie une page de la chronologie : au plus 'limite' événements de 'annees' années à partir de 'debut'
+    (après le curseur 'apres'), le curseur de la suite de l'intervalle s'il reste des événements, et la première année
+    des intervalles précédent et suivant (les intervalles sans événement sont sautés).
+    :param debut: première année, ou None pour commencer à l'année du curseur ou au premier événement
+    :type debut: int or None
+    :param annees: nombre d'années de la page
+    :type annees: int
+    :param types: types d'événements demandés, ou None pour tous
+    :type types: list or None
+    :param apres: curseur du dernier événement de la page précédente (voir lire_curseur), ou None
+    :type apres: tuple or None
+    :param limite: nombre maximal d'événements de la page
+    :type limite: int
+    :returns: dictionnaire (debut, fin, evenements, curseur, precedente, suivante)
+    :rtype: dict
+    """
+    if debut is None:
+        debut = apres[0] if apres is not None else annee_voisine(None, True, types)
+    if debut is None:
+        return {"debut": None, "fin": None, "evenements": [], "curseur": None, "precedente": None, "suivante": None}
+    fin = debut + annees - 1
+    #Un événement de plus que la limite est lu pour savoir s'il reste des événements dans l'intervalle, sans requête COUNT.
+    lignes = evenements(debut, fin, types, apres, limite + 1)
+    suite = curseur(lignes[limite - 1]) if len(lignes) > limite else None
+    precedente = annee_voisine(debut, False, types)
+    return {
+        "debut": debut,
+        "fin": fin,
+        "evenements": lignes[:limite],
+        "curseur": suite,
+        "precedente": precedente - annees + 1 if precedente is not None else None,
+        "suivante": annee_voisine(fin, True, types),
+    }
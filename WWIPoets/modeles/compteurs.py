@@ -0,0 +1,53 @@
+from flask_sqlalchemy import Pagination
+#Importation de la classe Pagination afin de conserver la même interface que .paginate() dans les templates.
+from ..cache import CacheTTL
+#Importation du cache en mémoire, déclaré dans le fichier cache.py
+from ..metriques import registre
+#Importation des métriques, qui publient les succès et échecs du cache, déclarées dans le fichier metriques.py
+from ..constantes import COMPTEURS_TTL
+
+compteurs = CacheTTL(taille=512, ttl=COMPTEURS_TTL)
+#Cache des nombres de lignes (COUNT(*)) utilisés par la pagination, vidé à chaque écriture dans la base.
+registre.suivre("compteurs", compteurs)
+
+
+def compter(cle, fonction):
+    """
+    Fonction qui renvoie un nombre de lignes mis en cache, ou le calcule avec 'fonction' s'il est absent ou expiré.
+    :param cle: clé du compteur (par exemple ('index', 'Poet') ou ('recherche', expression))
+    :type cle: tuple
+    :param fonction: fonction sans argument qui exécute le COUNT(*)
+    :returns: nombre de lignes
+    :rtype: int
+    """
+    return compteurs.calculer(cle, fonction)
+
+
+def invalider_compteurs():
+    """
+    Fonction qui vide le cache des compteurs. Elle est appelée après chaque création, modification ou suppression.
+    :returns: None
+    """
+    compteurs.vider()
+
+
+def paginer(requete, page, par_page, cle):
+    """
+    Fonction qui remplace .paginate() : une seule requête lit la page demandée (LIMIT/OFFSET), et le nombre total de lignes
+    provient du cache des compteurs au lieu d'un COUNT(*) à chaque affichage.
+    Si la première page est vide, la table (ou la recherche) est vide et aucun COUNT(*) n'est exécuté.
+    :param requete: requête SQLAlchemy triée
+    :param page: numéro de la page demandée
+    :type page: int
+    :param par_page: nombre d'éléments par page
+    :type par_page: int
+    :param cle: clé du compteur associé à la requête
+    :type cle: tuple
+    :returns: objet Pagination (items, total, page, iter_pages) identique à celui de .paginate()
+    :rtype: Pagination
+    """
+    elements = requete.limit(par_page).offset((page - 1) * par_page).all()
+    if not elements and page == 1:
+        return Pagination(requete, page, par_page, 0, elements)
+    total = compter(cle, lambda: requete.order_by(None).count())
+    return Pagination(requete, page, par_page, total, elements)
@@ -0,0 +1,139 @@
+import datetime
+#Importation du module datetime pour vérifier qu'un jour existe dans le mois et l'année lus.
+import re
+#Importation du module re (expressions régulières) pour découper les dates saisies en texte libre.
+
+# NORMALISATION DES DATES #
+# Les dates de naissance, de décès et de publication sont saisies en texte libre (au plus 12 caractères) : '22/01/1885', '1946',
+# '14.08/1881', '26/08/80'... Le texte saisi est conservé tel quel ; à côté, l'année, le mois et le jour lus dans ce texte sont
+# enregistrés dans des colonnes entières, avec la précision de la date ('jour', 'mois' ou 'annee'). Ces colonnes sont indexées :
+# les filtres par intervalle d'années et les tris chronologiques sont alors des lectures d'index, sans analyse du texte.
+# La normalisation est faite à chaque création ou modification (donnees.py, importation.py) et, pour les notices existantes,
+# par l'étape 5 des migrations (commande 'flask dates' pour la relancer).
+
+JOUR = "jour"
+MOIS = "mois"
+ANNEE = "annee"
+
+SEPARATEURS = re.compile(r"[/.\-\s]+")
+ANNEE_SEULE = re.compile(r"(?<!\d)(\d{4})(?!\d)")
+
+PIVOT_SIECLE = 30
+#Années écrites sur deux chiffres : jusqu'à 30, elles sont lues 19xx (décès '09/11/18' -> 1918), au-delà 18xx (naissance '26/08/80' -> 1880).
+
+NOMS_MOIS = {
+    "janvier": 1, "fevrier": 2, "février": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6, "juillet": 7,
+    "aout": 8, "août": 8, "septembre": 9, "octobre": 10, "novembre": 11, "decembre": 12, "décembre": 12,
+}
+
+# Suffixe des colonnes normalisées, ajouté au préfixe de chaque date (par exemple 'poet_birth' -> 'poet_birth_year').
+SUFFIXES = ("year", "month", "day", "precision")
+
+
+def lire_annee(texte):
+    """
+    Fonction qui lit une année écrite sur quatre chiffres, ou sur deux chiffres (voir PIVOT_SIECLE).
+    :param texte: partie numérique de la date
+    :type texte: str
+    :returns: année, ou None si le texte n'est pas une année
+    :rtype: int or None
+    """
+    if len(texte) == 4 and texte.isdigit() and int(texte) > 0:
+        return int(texte)
+    if len(texte) == 2 and texte.isdigit():
+        return int(texte) + (1900 if int(texte) <= PIVOT_SIECLE else 1800)
+    return None
+
+
+def lire_mois(texte):
+    """
+    Fonction qui lit un mois écrit en chiffres ou en toutes lettres.
+    :param texte: partie de la date
+    :type texte: str
+    :returns: numéro du mois, ou None
+    :rtype: int or None
+    """
+    if texte.isdigit() and 1 <= int(texte) <= 12:
+        return int(texte)
+    return NOMS_MOIS.get(texte.lower())
+
+
+def normaliser_date(texte):
+    """
+    Fonction qui lit l'année, le mois et le jour d'une date saisie en texte libre.
+    Formats reconnus : JJ/MM/AAAA (séparateurs '/', '.', '-' ou espace), JJ/MM/AA, MM/AAAA, AAAA, AAAA-MM-JJ, '3 juin 1916'.
+    À défaut, une année sur quatre chiffres présente dans le texte ('vers 1890') est retenue avec la précision 'annee'.
+    :param texte: date saisie, ou None
+    :type texte: str or None
+    :returns: tuple (année, mois, jour, précision) ; (None, None, None, None) si aucune année n'est lisible
+    :rtype: tuple
+    """
+    texte = (texte or "").strip()
+    parties = [partie for partie in SEPARATEURS.split(texte) if partie]
+    if len(parties) == 3 and len(parties[0]) == 4:
+        #Format ISO : AAAA-MM-JJ.
+        parties = parties[::-1]
+    if len(parties) == 3:
+        jour, mois, annee = parties[0], lire_mois(parties[1]), lire_annee(parties[2])
+        if annee is not None and mois is not None and jour.isdigit():
+            try:
+                datetime.date(annee, mois, int(jour))
+                return annee, mois, int(jour), JOUR
+            except ValueError:
+                return annee, mois, None, MOIS
+    elif len(parties) == 2:
+        mois, annee = lire_mois(parties[0]), lire_annee(parties[1])
+        if len(parties[0]) == 4:
+            mois, annee = lire_mois(parties[1]), lire_annee(parties[0])
+        if annee is not None and mois is not None:
+            return annee, mois, None, MOIS
+    elif len(parties) == 1 and len(parties[0]) == 4:
+        annee = lire_annee(parties[0])
+        if annee is not None:
+            return annee, None, None, ANNEE
+    trouvee = ANNEE_SEULE.search(texte)
+    if trouvee and int(trouvee.group(1)) > 0:
+        return int(trouvee.group(1)), None, None, ANNEE
+    return None, None, None, None
+
+
+def colonnes_date(prefixe, texte):
+    """
+    Fonction qui renvoie les valeurs des colonnes normalisées d'une date, à enregistrer à côté du texte saisi.
+    :param prefixe: préfixe des colonnes ('poet_birth', 'poet_death' ou 'publication')
+    :type prefixe: str
+    :param texte: date saisie, ou None
+    :type texte: str or None
+    :returns: dictionnaire {nom de colonne: valeur}, par exemple {'poet_birth_year': 1885, 'poet_birth_month': 1, ...}
+    :rtype: dict
+    """
+    return {prefixe + "_" + suffixe: valeur for suffixe, valeur in zip(SUFFIXES, normaliser_date(texte))}
+
+
+# Dates normalisées : (table, clé primaire, colonne du texte saisi, préfixe des colonnes normalisées).
+DATES = [
+    ("Poet", "poet_id", "poet_birthdate", "poet_birth"),
+    ("Poet", "poet_id", "poet_deathdate", "poet_death"),
+    ("Publication", "publication_id", "publication_date", "publication"),
+]
+
+
+def normaliser_dates(connexion, lot=500):
+    """
+    Fonction qui (re)calcule les colonnes normalisées de toutes les dates déjà enregistrées (étape de migrations.py, commande 'flask dates').
+    Les mises à jour sont envoyées par lots, en une instruction exécutée pour toutes les lignes du lot (executemany).
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :param lot: nombre de lignes par lot
+    :type lot: int
+    :returns: nombre de dates lues
+    :rtype: int
+    """
+    nombre = 0
+    for table, identifiant, colonne, prefixe in DATES:
+        colonnes = [prefixe + "_" + suffixe for suffixe in SUFFIXES]
+        instruction = "UPDATE {} SET {} WHERE {} = ?".format(table, ", ".join(nom + " = ?" for nom in colonnes), identifiant)
+        lignes = connexion.execute("SELECT {}, {} FROM {}".format(identifiant, colonne, table)).fetchall()
+        for debut in range(0, len(lignes), lot):
+            connexion.execute(instruction, [normaliser_date(texte) + (cle,) for cle, texte in lignes[debut:debut + lot]])
+        nombre += len(lignes)
+    return nombre
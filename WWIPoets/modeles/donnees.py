@@ -4,12 +4,146 @@ import datetime
 #Importation du module datetime pour accéder aux données de date et horaires dans le fuseau adéquat.
 from flask_login import current_user
 #Importation de la variable current_user depuis flask_login
+from sqlalchemy import text
+#Importation de text pour les requêtes SQL de version, écrites directement en SQL.
+from sqlalchemy.exc import IntegrityError
+#Importation de l'erreur levée par la base lorsqu'une écriture viole un index UNIQUE (doublon créé entre-temps par un autre processus).
+from sqlalchemy.orm import selectinload
+#Importation de selectinload pour charger les publications et les ESM d'un ou plusieurs poètes en une requête par relation.
 from ..app import db
 #Importation de la base de données
+from .recherche import indexer_poete, desindexer_poetes
+#Importation des fonctions de mise à jour de l'index plein-texte, déclarées dans le fichier recherche.py
+from .compteurs import invalider_compteurs, compter
+#Importation de la fonction qui vide le cache des compteurs, déclarée dans le fichier compteurs.py
+from ..cache import invalider_reponses
+#Importation de la fonction d'invalidation du cache des réponses, déclarée dans le fichier cache.py
+from .unicite import uniques, conflits_poete, POETE, NOM, PUBLICATION, STATUT
+#Importation de l'index d'unicité en mémoire (identifiants externes, noms et prénoms), déclaré dans le fichier unicite.py
+from .dates import colonnes_date
+#Importation de la normalisation des dates saisies en texte libre (année, mois, jour, précision), déclarée dans le fichier dates.py
+from .chronologie import rafraichir_evenements
+#Importation de la mise à jour de la chronologie matérialisée (table Evenement), déclarée dans le fichier chronologie.py
+from .lieux import colonnes_lieu
+#Importation du rattachement des lieux saisis en texte libre aux lieux canoniques du gazetteer, déclaré dans le fichier lieux.py
+from .lecture import lecture, noter_suppressions
+#Importation du modèle de lecture en mémoire et de la trace des suppressions qu'il lit, déclarés dans le fichier lecture.py
+
+# Étiquettes des pages en cache touchées par chaque type d'écriture, en plus de la notice et du Json du/de la poète(sse) ('poete:<id>').
+# Toute écriture peut modifier les statistiques ('statistiques', voir statistiques.py) et la chronologie ('chronologie', voir chronologie.py).
+PAGES_POETE = ["accueil", "index_individus", "statistiques", "chronologie"]
+PAGES_SUPPRESSION = ["accueil", "index_individus", "index_publications", "statistiques", "chronologie"]
+PAGES_PUBLICATION = ["index_publications", "statistiques", "chronologie"]
+PAGES_STATUT = ["statistiques", "chronologie"]
+PAGES_IMPORT = ["accueil", "index_individus", "index_publications", "statistiques", "chronologie"]
+
+SUPPRESSION_LOT = 500
+#Nombre d'identifiants par instruction DELETE ... WHERE ... IN (...) lors d'une suppression groupée (SQLite limite le nombre de paramètres d'une requête).
+
+
+def apres_ecriture(poet_id, pages):
+    """
+    Fonction appelée après chaque création, modification ou suppression validée dans la base,
+    afin de mettre à jour les données dérivées (caches, modèle de lecture) qui dépendent du/de la poète(sse) concerné(e).
+    :param poet_id: identifiant numérique du/de la poète(sse) modifié(e), ou auteur(e) de la publication ou de l'ESM modifié(e),
+    ou liste d'identifiants (suppression ou import en masse)
+    :type poet_id: int or list
+    :param pages: étiquettes des pages en cache à invalider en plus de celles du/de la poète(sse)
+    :type pages: list
+    :returns: None
+    """
+    poet_ids = poet_id if isinstance(poet_id, (list, tuple, set)) else [poet_id]
+    invalider_compteurs()
+    lecture.rafraichir(poet_ids)
+    invalider_reponses(["poete:{}".format(identifiant) for identifiant in poet_ids] + pages)
+
+
+# VERSIONS DES DONNÉES #
+# Chaque création ou modification ajoute une ligne datée dans Authorship_poet, Authorship_publication ou Authorship_military_status.
+# Le nombre de ces lignes et la date de la plus récente suffisent donc à savoir si une notice a changé, sans charger le poète ni ses relations.
+# Seules les dates au format ISO (AAAA-MM-JJ ...) sont retenues pour la date de dernière modification : quelques anciennes lignes ont une date saisie à la main.
+# La même requête renvoie les plus grands identifiants d'historique et de suppression du poète : le modèle de lecture (lecture.py)
+# les compare à sa signature pour ne jamais servir un instantané plus ancien que la version annoncée (ETag).
+
+VERSION_POETE = text("""
+SELECT count(*), max(CASE WHEN date LIKE '____-__-__%' THEN date END),
+       coalesce(max(CASE WHEN historique = 'poete' THEN identifiant END), 0),
+       coalesce(max(CASE WHEN historique = 'publication' THEN identifiant END), 0),
+       coalesce(max(CASE WHEN historique = 'statut' THEN identifiant END), 0),
+       coalesce((SELECT max(suppression_id) FROM Suppression WHERE poet_id = :poet_id), 0)
+FROM (
+    SELECT 'poete' AS historique, authorship_poet_id AS identifiant, authorship_poet_date AS date FROM Authorship_poet
+     WHERE authorship_poet_poet_id = :poet_id
+    UNION ALL
+    SELECT 'publication', authorship_publication_id, authorship_publication_date FROM Authorship_publication
+      JOIN Publication ON Publication.publication_id = Authorship_publication.authorship_publication_publication_id
+     WHERE Publication.publication_poet_id = :poet_id
+    UNION ALL
+    SELECT 'statut', authorship_military_status_id, authorship_military_status_date FROM Authorship_military_status
+      JOIN Military_status ON Military_status.military_status_id = Authorship_military_status.authorship_military_status_military_status_id
+     WHERE Military_status.military_status_poet_id = :poet_id
+)
+""")
+
+# Pour les index, les plus grands identifiants des trois tables d'historique et de la table Suppression (lus sur la clé primaire)
+# changent à chaque écriture.
+VERSION_BASE = text("""
+SELECT coalesce((SELECT max(authorship_poet_id) FROM Authorship_poet), 0),
+       coalesce((SELECT max(authorship_publication_id) FROM Authorship_publication), 0),
+       coalesce((SELECT max(authorship_military_status_id) FROM Authorship_military_status), 0),
+       coalesce((SELECT max(suppression_id) FROM Suppression), 0),
+       (SELECT max(date) FROM (
+            SELECT (SELECT authorship_poet_date FROM Authorship_poet ORDER BY authorship_poet_id DESC LIMIT 1) AS date
+            UNION ALL
+            SELECT (SELECT authorship_publication_date FROM Authorship_publication ORDER BY authorship_publication_id DESC LIMIT 1)
+            UNION ALL
+            SELECT (SELECT authorship_military_status_date FROM Authorship_military_status ORDER BY authorship_military_status_id DESC LIMIT 1)
+        ) WHERE date LIKE '____-__-__%')
+""")
+
+
+def date_historique(valeur):
+    """
+    Fonction qui convertit une date lue dans une table d'historique (texte ISO) en objet datetime, sans les microsecondes.
+    :param valeur: date au format AAAA-MM-JJ HH:MM:SS[.ffffff], ou None
+    :type valeur: str or None
+    :returns: date, ou None si la valeur est absente ou illisible
+    :rtype: datetime.datetime or None
+    """
+    if not valeur:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(valeur).replace(microsecond=0)
+    except ValueError:
+        return None
+
+
+def version_base():
+    """
+    Fonction qui renvoie la version courante de l'ensemble de la base, utilisée par les pages d'index.
+    Le modèle de lecture est d'abord mis à jour s'il est plus ancien que cette version (voir lecture.py).
+    :returns: tuple (clé de version, date de dernière modification ou None)
+    :rtype: tuple
+    """
+    auteurs, publications, statuts, suppressions, date = db.session.execute(VERSION_BASE).fetchone()
+    lecture.exiger((auteurs, publications, statuts, suppressions))
+    nb_poetes = compter(("index", "Poet"), lambda: Poet.query.count())
+    nb_publications = compter(("index", "Publication"), lambda: Publication.query.count())
+    cle = "base-{}-{}-{}-{}-{}-{}".format(auteurs, publications, statuts, suppressions, nb_poetes, nb_publications)
+    return cle, date_historique(date)
 
 
 class Poet(db.Model):
     __tablename__ = "Poet"
+    #Index secondaires (créés dans la base par migrations.py) : tri de l'index des individus par nom, recherche d'un doublon par nom et prénom,
+    #filtre de la recherche structurée par nationalité, filtres par intervalle de dates et tris chronologiques sur les dates normalisées.
+    #L'unicité du couple (nom, prénom) est garantie par un index UNIQUE partiel, créé par migrations.py, qui tolère les doublons de la base d'origine.
+    __table_args__ = (
+        db.Index("ix_poet_nom_prenom", "poet_name", "poet_firstname"),
+        db.Index("ix_poet_pays", "poet_country"),
+        db.Index("ix_poet_naissance", "poet_birth_year", "poet_birth_month", "poet_birth_day"),
+        db.Index("ix_poet_deces", "poet_death_year", "poet_death_month", "poet_death_day"),
+    )
     poet_id = db.Column(db.Integer, unique=True, nullable=False, autoincrement=True, primary_key=True)
     poet_name = db.Column(db.Text, nullable=False)
     poet_firstname = db.Column(db.Text)
@@ -19,13 +153,66 @@ class Poet(db.Model):
     poet_birthplace = db.Column(db.Text)
     poet_deathplace = db.Column(db.Text)
     poet_description = db.Column(db.Text)
-    poet_external_login=db.Column(db.Text, nullable=False)
+    poet_external_login=db.Column(db.Text, nullable=False, index=True, unique=True)
+    #Dates de naissance et de décès normalisées (voir dates.py), calculées à partir du texte saisi à chaque création ou modification.
+    poet_birth_year = db.Column(db.Integer)
+    poet_birth_month = db.Column(db.Integer)
+    poet_birth_day = db.Column(db.Integer)
+    poet_birth_precision = db.Column(db.Text)
+    poet_death_year = db.Column(db.Integer)
+    poet_death_month = db.Column(db.Integer)
+    poet_death_day = db.Column(db.Integer)
+    poet_death_precision = db.Column(db.Text)
+    #Lieux de naissance et de décès canoniques (voir lieux.py), rattachés au texte saisi à chaque création ou modification.
+    poet_birthplace_id = db.Column(db.Integer, db.ForeignKey("Place.place_id"), index=True)
+    poet_deathplace_id = db.Column(db.Integer, db.ForeignKey("Place.place_id"), index=True)
     #Jointures entre les tables Authorship_poet et Poet; entre les tables Publication et Poet; ainsi qu'entre les tables Military_status et Poet.
     authorships_poet = db.relationship("Authorship_poet", back_populates="poet", cascade="all, delete")
     link_publication = db.relationship("Publication", primaryjoin="Poet.poet_id==Publication.publication_poet_id", cascade="all, delete")
     link_military_status = db.relationship("Military_status", primaryjoin="Poet.poet_id==Military_status.military_status_poet_id", cascade="all, delete")
     #Le comportement en cascade, configuré en 'all, delete' au niveau du côté one de la relation one to many permet d'appliquer l'action exercée sur l'objet parent à ses enfants automatiquement. 'Delete' signifie que l'objet enfant doit également être supprimé lorsque son parent n'existe plus.
 
+    @staticmethod
+    def chargement_complet():
+        """
+        Fonction qui renvoie les options de chargement de la notice complète d'un(e) poète(sse) : les publications et les ESM
+        sont chargés par une requête 'SELECT ... WHERE ... IN (...)' chacun, quel que soit le nombre de poètes demandés,
+        au lieu d'une requête par poète lors du premier accès à link_publication ou link_military_status.
+        :returns: tuple d'options à passer à Query.options()
+        :rtype: tuple
+        """
+        return (
+            selectinload(Poet.link_publication),
+            selectinload(Poet.link_military_status)
+        )
+
+    @staticmethod
+    def notice_complete(poet_id):
+        """
+        Fonction qui récupère un(e) poète(sse) avec ses publications et son ESM en un nombre fixe de requêtes (trois).
+        :param poet_id: identifiant numérique de l'individu
+        :type poet_id: int
+        :returns: objet Poet ou None si l'identifiant n'existe pas
+        :rtype: Poet or None
+        """
+        return Poet.query.options(*Poet.chargement_complet()).get(poet_id)
+
+    @staticmethod
+    def version(poet_id):
+        """
+        Fonction qui renvoie la version courante de la notice d'un(e) poète(sse) (notice, publications et ESM),
+        calculée à partir des tables d'historique par les index sur l'identifiant du poète, sans charger la notice.
+        Le modèle de lecture est d'abord mis à jour s'il est plus ancien que cette version (voir lecture.py) :
+        la notice servie à un visiteur anonyme correspond toujours à l'ETag qui l'accompagne.
+        :param poet_id: identifiant numérique de l'individu
+        :type poet_id: int
+        :returns: tuple (clé de version, date de dernière modification ou None)
+        :rtype: tuple
+        """
+        nombre, date, *maxima = db.session.execute(VERSION_POETE, {"poet_id": poet_id}).fetchone()
+        lecture.exiger(maxima)
+        return "poete-{}-{}-{}-{}".format(poet_id, nombre, date, maxima[-1]), date_historique(date)
+
     def poete_to_json(self):
         """
         Fonction qui permet l'export en format Json des informations principales de la notice d'un poète.
@@ -58,23 +245,14 @@ class Poet(db.Model):
 
 
     @staticmethod
-    def create_poet(nom, prenom, nationalite, date_naissance, date_deces, lieu_naissance, lieu_deces, description, login_wiki):
+    def valider(nom, prenom, nationalite, date_naissance, date_deces, lieu_naissance, lieu_deces, description, login_wiki):
         """
-        Fonction permettant la création d'un(e) nouveau/nouvelle poète(sse) dans la base de données.
-        :param nom : nom de l'individu
-        :param prenom : prénom de l'individu
-        :param nationalite : nationalité (d'origine ou par naturalisation) de l'individu
-        :param date_naissance : date de naissance de l'individu
-        :param date_deces : date de déces de l'individu
-        :param lieu_naissance: lieu de naissance de l'individu
-        :param lieu_deces: lieu de décès de l'individu
-        :param description : description de l'individu en rapport avec la Première Guerre mondiale
-        :param login_wiki : identifiant externe créé par l'utilisateur lors d'une création de notice
-        :type nom, prenom, nationalite, date_naissance, date_deces, lieu_naissance, lieu_deces, description, login_wiki: string
-        returns : Tuple (booléen, liste/objet).
-        S'il y a une erreur, la fonction renvoie False suivi d'une liste d'erreurs.
+        Fonction qui vérifie les champs saisis pour une notice de poète, sans interroger la base (l'unicité est vérifiée à part).
+        Elle est utilisée par create_poet et par l'import en masse (importation.py), qui appliquent ainsi les mêmes règles.
+        Les paramètres sont ceux de create_poet.
+        :returns: liste des erreurs (vide si la saisie est valide)
+        :rtype: list
         """
-
         errors = []
         #Création d'une liste vide pour y stocker les erreurs.
         if not (nom or prenom):
@@ -92,32 +270,44 @@ class Poet(db.Model):
         #Vérifie que les champs 'nom', 'prenom', 'nationalite', 'description', 'date_naissance', 'date_deces', 'lieu_naissance', 'lieu_deces' et login_wiki soient remplis.
         #Si au moins un champ reste vide, retourne une erreur.
         if len(errors) > 0:
-            return False, errors
+            return errors
 
         # Vérifie que la taille des caractères insérés ne dépasse pas 12 afin que la date puisse avoir un format lisible.
-        if len(date_naissance) > 12 or len(date_deces) > 12:
+        if len(date_naissance or "") > 12 or len(date_deces or "") > 12:
             errors.append("La taille des caractères des dates a été dépassée")
         #Sinon, retourne une erreur.
         if len(errors) > 0:
-            return False, errors
+            return errors
 
         # Vérifie que la taille des caractères insérés (login_wiki) ne dépasse pas la limite de 10.
         if len(login_wiki) > 10:
             errors.append("La taille des caractères du champ Identifiant de notice a été dépassée")
-        if len(errors) > 0:
-            return False, errors
-
-        # Vérifie si le/la poète(sse) existe déjà dans la base de données.
-        poete = Poet.query.filter(db.and_(Poet.poet_name == nom, Poet.poet_firstname == prenom)).count()
-        if poete > 0:
-            errors.append("La personne est déjà inscrite dans la base de données")
+        return errors
 
-        #Vérifie si le login wiki existe déjà
-        poete = Poet.query.filter(Poet.poet_external_login==login_wiki).count()
+    @staticmethod
+    def create_poet(nom, prenom, nationalite, date_naissance, date_deces, lieu_naissance, lieu_deces, description, login_wiki):
+        """
+        Fonction permettant la création d'un(e) nouveau/nouvelle poète(sse) dans la base de données.
+        :param nom : nom de l'individu
+        :param prenom : prénom de l'individu
+        :param nationalite : nationalité (d'origine ou par naturalisation) de l'individu
+        :param date_naissance : date de naissance de l'individu
+        :param date_deces : date de déces de l'individu
+        :param lieu_naissance: lieu de naissance de l'individu
+        :param lieu_deces: lieu de décès de l'individu
+        :param description : description de l'individu en rapport avec la Première Guerre mondiale
+        :param login_wiki : identifiant externe créé par l'utilisateur lors d'une création de notice
+        :type nom, prenom, nationalite, date_naissance, date_deces, lieu_naissance, lieu_deces, description, login_wiki: string
+        returns : Tuple (booléen, liste/objet).
+        S'il y a une erreur, la fonction renvoie False suivi d'une liste d'erreurs.
+        """
 
-        if poete > 0:
-            errors.append("Cet identifiant est déjà utilisé")
+        errors = Poet.valider(nom, prenom, nationalite, date_naissance, date_deces, lieu_naissance, lieu_deces, description, login_wiki)
+        if len(errors) > 0:
+            return False, errors
 
+        # Vérifie si le/la poète(sse) ou le login wiki existent déjà dans la base de données, grâce à l'index d'unicité en mémoire.
+        errors = conflits_poete(nom, prenom, login_wiki)
         if len(errors) > 0:
             return False, errors
         # Sinon, on crée une nouvelle entrée dans la table Poet
@@ -130,21 +320,40 @@ class Poet(db.Model):
             poet_birthplace=lieu_naissance,
             poet_deathplace=lieu_deces,
             poet_description=description,
-            poet_external_login=login_wiki
+            poet_external_login=login_wiki,
+            **colonnes_date("poet_birth", date_naissance),
+            **colonnes_date("poet_death", date_deces),
+            **colonnes_lieu("poet_birthplace_id", lieu_naissance),
+            **colonnes_lieu("poet_deathplace_id", lieu_deces)
         )
+        #La création, son enregistrement dans Authorship_poet et la mise à jour de l'index plein-texte forment une seule transaction :
+        #soit tout est enregistré, soit rien ne l'est.
         try:
-            #Ajout de cette nouvelle entrée dans la base de données.
+            #Ajout de cette nouvelle entrée dans la base de données. flush() envoie l'insertion sans valider la transaction, ce qui attribue l'identifiant poet_id.
             db.session.add(created_poet)
-            db.session.commit()
+            db.session.flush()
 
             #Création d'un enregistrement dans authorship_poet avec utilisation de la fonction authorship_event.
-            creation = Poet.query.filter(Poet.poet_external_login==login_wiki).one()
-            authorship_poet=Authorship_poet.authorship_event(
-                updated=creation)
+            Authorship_poet.authorship_event(updated=created_poet)
+            db.session.flush()
+            #Ajout du/de la poète(sse) à l'index plein-texte et à la chronologie.
+            indexer_poete(created_poet.poet_id)
+            rafraichir_evenements([created_poet.poet_id])
+            db.session.commit()
+            uniques.ajouter(NOM, (nom, prenom))
+            uniques.ajouter(POETE, login_wiki)
+            apres_ecriture(created_poet.poet_id, PAGES_POETE)
             #Renvoi des informations d'enregistrement vers le contributeur
             return True, created_poet
 
+        except IntegrityError as doublon:
+            #Un doublon a été enregistré entre-temps par un autre processus : l'index d'unicité est rechargé pour le signaler.
+            db.session.rollback()
+            uniques.charger()
+            return False, conflits_poete(nom, prenom, login_wiki) or [str(doublon)]
+
         except Exception as error_creation:
+            db.session.rollback()
             return False, [str(error_creation)]
 
     @staticmethod
@@ -211,6 +420,13 @@ class Poet(db.Model):
             errors.append("L'identifiant ne doit pas dépasser 10 caractères'")
         if len(errors) > 0:
             return False, errors
+
+        # Vérifie que les nouveaux nom et prénom, ou le nouveau login wiki, ne sont pas déjà ceux d'une autre notice.
+        nouveau_nom = nom if (nom, prenom) != (poete.poet_name, poete.poet_firstname) else None
+        nouveau_login = login_wiki if login_wiki != poete.poet_external_login else None
+        errors = conflits_poete(nouveau_nom, prenom, nouveau_login)
+        if len(errors) > 0:
+            return False, errors
         #Mise à jour des données de la notice.
         else:
             poete.poet_name = nom
@@ -222,52 +438,112 @@ class Poet(db.Model):
             poete.poet_country = nationalite
             poete.poet_description = description
             poete.poet_external_login = login_wiki
-        #Ajout de la mise à jour dans la base de données.
+            for colonne, valeur in {**colonnes_date("poet_birth", date_naissance), **colonnes_date("poet_death", date_deces),
+                                    **colonnes_lieu("poet_birthplace_id", lieu_naissance),
+                                    **colonnes_lieu("poet_deathplace_id", lieu_deces)}.items():
+                setattr(poete, colonne, valeur)
+        #Ajout de la mise à jour dans la base de données, avec son enregistrement dans Authorship_poet, en une seule transaction.
         try:
             db.session.add(poete)
+            Authorship_poet.authorship_event(updated=poete)
+            db.session.flush()
+            #Mise à jour de l'index plein-texte et de la chronologie.
+            indexer_poete(poet_id)
+            rafraichir_evenements([poet_id])
             db.session.commit()
-        #Création d'un enregistrement dans Authorship_poet.
-            authorship_poet=Authorship_poet.authorship_event(
-                updated=Poet.query.get(poet_id)
-            )
+            #Les anciennes clés ne sont pas retirées de l'index d'unicité : elles le seront lors de leur prochaine vérification (voir unicite.py).
+            uniques.ajouter(NOM, (nom, prenom))
+            uniques.ajouter(POETE, login_wiki)
+            apres_ecriture(poet_id, PAGES_POETE)
 
             return True, poete
 
+        except IntegrityError as doublon:
+            db.session.rollback()
+            uniques.charger()
+            return False, conflits_poete(nouveau_nom, prenom, nouveau_login) or [str(doublon)]
+
         except Exception as error_modif_poet:
+            db.session.rollback()
             return False, [str(error_modif_poet)]
 
     @staticmethod
     def delete_poet(poet_id):
         """
-        Fonction qui supprime la notice d'un(e) poète(sse)
+        Fonction qui supprime la notice d'un(e) poète(sse), ainsi que ses publications, son ESM et l'historique de chacun.
         :param poet_id: identifiant numérique de l'individu
         :type poet_id: integer
         :returns: True si la suppression a réussi, sinon False.
         :rtype: booléen
 
         """
-        poete = Poet.query.get(poet_id)
-        #On enregistre cette suppression dans la base de données. Suppression des enregistrements liés dans Authorship_poet.
+        return Poet.delete_poets([poet_id]) == 1
+
+    @staticmethod
+    def delete_poets(poet_ids):
+        """
+        Fonction qui supprime en une seule transaction les notices de plusieurs poètes, avec leurs publications, leurs ESM
+        et les enregistrements correspondants des tables Authorship_poet, Authorship_publication et Authorship_military_status.
+        La suppression est inscrite dans la table Suppression, où les autres processus du serveur la lisent (voir lecture.py).
+        Au lieu de charger chaque objet pour le supprimer (cascade de l'ORM), chaque table est vidée par une instruction
+        DELETE ... WHERE ... IN (...) : le nombre d'instructions ne dépend pas du nombre de publications ou d'ESM de chaque poète.
+        :param poet_ids: identifiants numériques des individus
+        :type poet_ids: list
+        :returns: nombre de poètes supprimés, ou None en cas d'échec (rien n'est alors supprimé)
+        :rtype: int or None
+        """
+        poet_ids = sorted(set(int(poet_id) for poet_id in poet_ids))
+        supprimes = 0
         try:
-            Authorship_poet.delete_logs(
-                id_poet=poet_id
-            )
-            db.session.delete(poete)
+            for debut in range(0, len(poet_ids), SUPPRESSION_LOT):
+                lot = poet_ids[debut:debut + SUPPRESSION_LOT]
+                publications = db.session.query(Publication.publication_id).filter(Publication.publication_poet_id.in_(lot))
+                statuts = db.session.query(Military_status.military_status_id).filter(Military_status.military_status_poet_id.in_(lot))
+                #L'historique est supprimé avant les lignes auxquelles il fait référence.
+                Authorship_publication.query.filter(
+                    Authorship_publication.authorship_publication_publication_id.in_(publications.subquery())
+                ).delete(synchronize_session=False)
+                Authorship_military_status.query.filter(
+                    Authorship_military_status.authorship_military_status_military_status_id.in_(statuts.subquery())
+                ).delete(synchronize_session=False)
+                Authorship_poet.delete_logs(id_poet=lot)
+                Publication.query.filter(Publication.publication_poet_id.in_(lot)).delete(synchronize_session=False)
+                Military_status.query.filter(Military_status.military_status_poet_id.in_(lot)).delete(synchronize_session=False)
+                supprimes += Poet.query.filter(Poet.poet_id.in_(lot)).delete(synchronize_session=False)
+                desindexer_poetes(lot)
+                rafraichir_evenements(lot)
+                noter_suppressions(lot)
             db.session.commit()
-            return True
         except Exception as failed:
+            db.session.rollback()
             print(failed)
-            return False
+            return None
+        #Les objets éventuellement chargés dans la session ne correspondent plus à la base.
+        #Les clés des notices supprimées restent dans l'index d'unicité jusqu'à leur prochaine vérification, qui les retire (voir unicite.py).
+        db.session.expire_all()
+        apres_ecriture(poet_ids, PAGES_SUPPRESSION)
+        return supprimes
 
 
 class Publication(db.Model):
     __tablename__ = "Publication"
+    #Index du filtre par genre littéraire de la recherche structurée : il contient aussi l'identifiant du poète, que le filtre renvoie.
+    #Index de la date normalisée, pour les filtres par intervalle d'années et les tris chronologiques.
+    __table_args__ = (
+        db.Index("ix_publication_genre_poete", "publication_genre_litteraire", "publication_poet_id"),
+        db.Index("ix_publication_date", "publication_year", "publication_month", "publication_day"),
+    )
     publication_id = db.Column(db.Integer, unique=True, nullable=False, primary_key=True, autoincrement=True)
-    publication_titre = db.Column(db.Text)
+    publication_titre = db.Column(db.Text, index=True)
     publication_date = db.Column(db.Text)
     publication_genre_litteraire = db.Column(db.Text)
-    publication_poet_id = db.Column(db.Integer, db.ForeignKey("Poet.poet_id"))
-    publication_external_login=db.Column(db.Text)
+    publication_poet_id = db.Column(db.Integer, db.ForeignKey("Poet.poet_id"), index=True)
+    publication_external_login=db.Column(db.Text, index=True, unique=True)
+    #Date de publication normalisée (voir dates.py).
+    publication_year = db.Column(db.Integer)
+    publication_month = db.Column(db.Integer)
+    publication_day = db.Column(db.Integer)
+    publication_precision = db.Column(db.Text)
     #Jointures entre les tables Poet et Publication; ainsi qu'entre les tables Publication et Authorship_publication.
     poetpub = db.relationship("Poet", foreign_keys=[publication_poet_id])
     authorships_pub = db.relationship("Authorship_publication", back_populates="pub", cascade="all, delete")
@@ -310,10 +586,8 @@ class Publication(db.Model):
         if len(errors) > 0:
             return False, errors
 
-        publication_log = Publication.query.filter(
-            Publication.publication_external_login == login_wiki_pub).count()
-        #On vérifie que l'identifiant externe n'est pas déjà utilisé.
-        if publication_log > 0:
+        #On vérifie que l'identifiant externe n'est pas déjà utilisé, grâce à l'index d'unicité en mémoire.
+        if uniques.existe(PUBLICATION, login_wiki_pub):
             errors.append("Cet identifiant est déjà utilisé")
 
         if len(errors) > 0:
@@ -324,25 +598,36 @@ class Publication(db.Model):
             publication_date=date,
             publication_genre_litteraire=genre_litteraire,
             publication_poet_id=poet_id,
-            publication_external_login=login_wiki_pub
-
+            publication_external_login=login_wiki_pub,
+            **colonnes_date("publication", date)
         )
 
         try:
-            # Création d'une nouvelle entrée dans la table Publication.
+            # Création d'une nouvelle entrée dans la table Publication (flush() attribue l'identifiant sans valider la transaction).
             db.session.add(created_publication)
-            db.session.commit()
+            db.session.flush()
 
             # Création d'un enregistrement dans Authorship_publication avec utilisation de la fonction authorship_pub_event.
-            creation = Publication.query.filter(
-                Publication.publication_external_login == login_wiki_pub).one()
-            authorship_publication = Authorship_publication.authorship_pub_event(
-                updated=creation
-            )
+            Authorship_publication.authorship_pub_event(updated=created_publication)
+            db.session.flush()
+            #Mise à jour de l'index plein-texte et de la chronologie du/de la poète(sse) auteur(e), puis validation de l'ensemble en une seule transaction.
+            indexer_poete(created_publication.publication_poet_id)
+            rafraichir_evenements([created_publication.publication_poet_id])
+            db.session.commit()
+            uniques.ajouter(PUBLICATION, login_wiki_pub)
+            apres_ecriture(created_publication.publication_poet_id, PAGES_PUBLICATION)
             # Renvoi des informations d'enregistrement vers le contributeur
             return True, created_publication
 
+        except IntegrityError as refus:
+            #Le refus peut venir d'une autre contrainte que l'identifiant externe : le doublon n'est signalé que s'il est confirmé par la base.
+            db.session.rollback()
+            if uniques.confirmer(PUBLICATION, login_wiki_pub):
+                return False, ["Cet identifiant est déjà utilisé"]
+            return False, [str(refus)]
+
         except Exception as error_creation:
+            db.session.rollback()
             return False, [str(error_creation)]
 
     @staticmethod
@@ -379,6 +664,7 @@ class Publication(db.Model):
 
         #Récupération d'une référence bibliographique dans la base.
         modif_pub = Publication.query.get(publication_id)
+        ancien_login = modif_pub.publication_external_login
         # On s'assure que l'utilisateur modifie au moins un champ. Sinon, retourne une erreur.
         if modif_pub.publication_titre == titre \
                 and modif_pub.publication_date == date \
@@ -397,6 +683,8 @@ class Publication(db.Model):
         # Vérifie que la taille des caractères insérés (login_wiki_pub) par l'utilisateur ne dépasse pas la limite de 10.
         if len(login_wiki_pub) > 10:
             errors.append("L'identifiant ne doit pas dépasser 10 caractères'")
+        if login_wiki_pub != modif_pub.publication_external_login and uniques.existe(PUBLICATION, login_wiki_pub):
+            errors.append("Cet identifiant est déjà utilisé")
         if len(errors) > 0:
             return False, errors
         #Mise à jour des données de la référence bibliographique modifiée.
@@ -405,29 +693,51 @@ class Publication(db.Model):
             modif_pub.publication_date = date
             modif_pub.publication_genre_litteraire = genre_litteraire
             modif_pub.publication_external_login = login_wiki_pub
+            for colonne, valeur in colonnes_date("publication", date).items():
+                setattr(modif_pub, colonne, valeur)
         #Ajout de la mise à jour dans la base de données.
         try:
             db.session.add(modif_pub)
+            #Ajout d'un enregistrement dans Authorship_publication grâce à la fonction authorship_pub_event, dans la même transaction.
+            Authorship_publication.authorship_pub_event(updated=modif_pub)
+            db.session.flush()
+            #Mise à jour de l'index plein-texte et de la chronologie du/de la poète(sse) auteur(e).
+            indexer_poete(modif_pub.publication_poet_id)
+            rafraichir_evenements([modif_pub.publication_poet_id])
             db.session.commit()
-        #Ajout d'un enregistrement dans Authorship_publication grâce à la fonction authorship_pub_event.
-            authorship_publication=Authorship_publication.authorship_pub_event(
-                updated=Publication.query.get(publication_id)
-            )
+            uniques.ajouter(PUBLICATION, login_wiki_pub)
+            apres_ecriture(modif_pub.publication_poet_id, PAGES_PUBLICATION)
 
             return True, modif_pub
 
+        except IntegrityError as refus:
+            #L'identifiant conservé par la référence ne peut pas être la cause du refus.
+            db.session.rollback()
+            if login_wiki_pub != ancien_login and uniques.confirmer(PUBLICATION, login_wiki_pub):
+                return False, ["Cet identifiant est déjà utilisé"]
+            return False, [str(refus)]
+
         except Exception as error_modif_pub:
+            db.session.rollback()
             return False, [str(error_modif_pub)]
 
 class Military_status(db.Model):
     __tablename__ = "Military_status"
+    #Index des filtres par grade, statut et lieu de recrutement de la recherche structurée, qui renvoient l'identifiant du poète.
+    __table_args__ = (
+        db.Index("ix_military_status_grade_poete", "military_status_grade", "military_status_poet_id"),
+        db.Index("ix_military_status_statut_poete", "military_status_statut", "military_status_poet_id"),
+        db.Index("ix_military_status_lieu_poete", "military_status_lieu_recrutement", "military_status_poet_id"),
+    )
     military_status_id = db.Column(db.Integer, unique=True, nullable=False, primary_key=True, autoincrement=True)
     military_status_statut = db.Column(db.Text)
     military_status_lieu_recrutement = db.Column(db.Text)
     military_status_registre_matricule = db.Column(db.Text)
-    military_status_poet_id = db.Column(db.Integer, db.ForeignKey("Poet.poet_id"), nullable=False)
+    military_status_poet_id = db.Column(db.Integer, db.ForeignKey("Poet.poet_id"), nullable=False, index=True)
     military_status_grade = db.Column(db.Text)
-    military_status_external_login=db.Column(db.Text)
+    military_status_external_login=db.Column(db.Text, index=True, unique=True)
+    #Lieu de recrutement canonique (voir lieux.py), rattaché au texte saisi à chaque création ou modification.
+    military_status_lieu_recrutement_id = db.Column(db.Integer, db.ForeignKey("Place.place_id"), index=True)
     #Jointures entre les tables Military_status et Poet; ainsi qu'entre les tables Military_status et Authorship_military_status.
     poetstatus = db.relationship("Poet", foreign_keys=[military_status_poet_id])
     authorships_esm = db.relationship("Authorship_military_status", back_populates="status", cascade="all, delete")
@@ -470,9 +780,8 @@ class Military_status(db.Model):
         if len(errors) > 0:
             return False, errors
 
-        military_status_log = Military_status.query.filter(Military_status.military_status_external_login == login_wiki_esm).count()
-        #On vérifie que l'identifiant externe n'est pas déjà utilisé.
-        if military_status_log > 0:
+        #On vérifie que l'identifiant externe n'est pas déjà utilisé, grâce à l'index d'unicité en mémoire.
+        if uniques.existe(STATUT, login_wiki_esm):
             errors.append("Cet identifiant est déjà utilisé")
 
         if len(errors) > 0:
@@ -484,24 +793,36 @@ class Military_status(db.Model):
             military_status_registre_matricule=registre_matricule,
             military_status_poet_id=poet_id,
             military_status_grade=grade,
-            military_status_external_login=login_wiki_esm
-
+            military_status_external_login=login_wiki_esm,
+            **colonnes_lieu("military_status_lieu_recrutement_id", lieu_recrutement)
         )
 
         try:
-            # Création d'une nouvelle entrée dans la table Military_status
+            # Création d'une nouvelle entrée dans la table Military_status (flush() attribue l'identifiant sans valider la transaction).
             db.session.add(created_military_status)
-            db.session.commit()
+            db.session.flush()
 
             # Création d'un enregistrement dans Authorship_military_status avec utilisation de la fonction authorship_esm_event.
-            creation = Military_status.query.filter(Military_status.military_status_external_login==login_wiki_esm).one()
-            authorship_military_status=Authorship_military_status.authorship_esm_event(
-                updated=creation
-            )
+            Authorship_military_status.authorship_esm_event(updated=created_military_status)
+            db.session.flush()
+            #Mise à jour de l'index plein-texte et de la chronologie du/de la poète(sse) concerné(e), puis validation de l'ensemble en une seule transaction.
+            indexer_poete(created_military_status.military_status_poet_id)
+            rafraichir_evenements([created_military_status.military_status_poet_id])
+            db.session.commit()
+            uniques.ajouter(STATUT, login_wiki_esm)
+            apres_ecriture(created_military_status.military_status_poet_id, PAGES_STATUT)
             #Renvoi des informations d'enregistrement vers le contributeur
             return True, created_military_status
 
+        except IntegrityError as refus:
+            #Le refus peut venir d'une autre contrainte que l'identifiant externe : le doublon n'est signalé que s'il est confirmé par la base.
+            db.session.rollback()
+            if uniques.confirmer(STATUT, login_wiki_esm):
+                return False, ["Cet identifiant est déjà utilisé"]
+            return False, [str(refus)]
+
         except Exception as error_creation:
+            db.session.rollback()
             return False, [str(error_creation)]
 
     @staticmethod
@@ -531,6 +852,7 @@ class Military_status(db.Model):
             return False, errors
         #Récupération d'un ESM dans la base.
         modif_statut = Military_status.query.get(military_status_id)
+        ancien_login = modif_statut.military_status_external_login
         # On s'assure que l'utilisateur modifie au moins un champ. Sinon, retourne une erreur.
         if modif_statut.military_status_statut == statut \
                 and modif_statut.military_status_lieu_recrutement == lieu_recrutement \
@@ -545,30 +867,51 @@ class Military_status(db.Model):
         # Vérifie que la taille des caractères insérés (login_wiki_esm) par l'utilisateur ne dépasse pas la limite de 10.
         if len(login_wiki_esm) > 10:
             errors.append("L'identifiant ne doit pas dépasser 10 caractères'")
+        if login_wiki_esm != modif_statut.military_status_external_login and uniques.existe(STATUT, login_wiki_esm):
+            errors.append("Cet identifiant est déjà utilisé")
         if len(errors) > 0:
             return False, errors
         # Mise à jour des données de l'ESM modifié.
         else:
             modif_statut.military_status_statut = statut
             modif_statut.military_status_lieu_recrutement = lieu_recrutement
+            for colonne, valeur in colonnes_lieu("military_status_lieu_recrutement_id", lieu_recrutement).items():
+                setattr(modif_statut, colonne, valeur)
             modif_statut.military_status_registre_matricule = registre_matricule
             modif_statut.military_status_external_login = login_wiki_esm
         # Ajout de la mise à jour dans la base de données.
         try:
             db.session.add(modif_statut)
+            # Création d'un enregistrement dans Authorship_military_status, dans la même transaction.
+            Authorship_military_status.authorship_esm_event(updated=modif_statut)
+            db.session.flush()
+            #Mise à jour de l'index plein-texte et de la chronologie du/de la poète(sse) concerné(e).
+            indexer_poete(modif_statut.military_status_poet_id)
+            rafraichir_evenements([modif_statut.military_status_poet_id])
             db.session.commit()
-        # Création d'un enregistrement dans Authorship_military_status.
-            authorship_military_status=Authorship_military_status.authorship_esm_event(
-                updated=Military_status.query.get(military_status_id)
-            )
+            uniques.ajouter(STATUT, login_wiki_esm)
+            apres_ecriture(modif_statut.military_status_poet_id, PAGES_STATUT)
 
             return True, modif_statut
 
+        except IntegrityError as refus:
+            #L'identifiant conservé par l'ESM ne peut pas être la cause du refus.
+            db.session.rollback()
+            if login_wiki_esm != ancien_login and uniques.confirmer(STATUT, login_wiki_esm):
+                return False, ["Cet identifiant est déjà utilisé"]
+            return False, [str(refus)]
+
         except Exception as error_modif_statut:
+            db.session.rollback()
             return False, [str(error_modif_statut)]
 
 class Authorship_poet(db.Model):
     __tablename__ = "Authorship_poet"
+    #Index déjà présents dans la base d'origine, déclarés ici sous leur nom d'origine.
+    __table_args__ = (
+        db.Index("fk_authorship_poet_idx", "authorship_poet_poet_id"),
+        db.Index("fk_authorship_user_idx", "authorship_poet_user_id"),
+    )
     authorship_poet_id = db.Column(db.Integer, nullable=False, autoincrement=True, primary_key=True)
     authorship_poet_user_id = db.Column(db.Integer, db.ForeignKey("User.user_id"))
     authorship_poet_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
@@ -581,42 +924,40 @@ class Authorship_poet(db.Model):
     def authorship_event(updated):
         """
         Fonction permettant l'inscription d'un événement (création ou modification) concernant un objet de la table Poet.
-        :returns: True en cas de réussite, False en cas d'échec.
-        :rtype: booléen
+        L'enregistrement est ajouté à la transaction en cours, que la méthode de création ou de modification appelante valide (commit)
+        en même temps que l'objet modifié : l'historique ne peut donc pas exister sans la modification, ni l'inverse.
+        :param updated: objet créé ou modifié (son identifiant doit avoir été attribué, par exemple avec db.session.flush())
+        :returns: l'enregistrement ajouté
+        :rtype: Authorship_poet
         """
         entry = Authorship_poet(
             authorship_poet_user_id=current_user.get_id(),
             authorship_poet_poet_id=updated.poet_id
         )
-        #Ajout et enregistrement dans la base de données.
-        try:
-            db.session.add(entry)
-            db.session.commit()
-            return True
-
-        except Exception as why:
-            print(why)
-            return False
+        db.session.add(entry)
+        return entry
 
     @staticmethod
     def delete_logs(id_poet):
         """
-        Fonction qui supprime les enregistrements liés au poète récupéré par son id.
-        :param id_poet: identifiant numérique du/de la poète(sse) à supprimer
-        :type id_poet: integer
-        :returns: booléen
+        Fonction qui supprime, en une seule instruction, les enregistrements liés au(x) poète(s) récupéré(s) par leur id.
+        La suppression est ajoutée à la transaction en cours, que l'appelant valide.
+        :param id_poet: identifiant numérique du/de la poète(sse) à supprimer, ou liste d'identifiants
+        :type id_poet: integer or list
+        :returns: nombre d'enregistrements supprimés
+        :rtype: int
         """
-        logs = Authorship_poet.query.filter(Authorship_poet.authorship_poet_poet_id == id_poet).all()
-        for log in logs:
-            db.session.delete(log)
-            db.session.commit()
+        identifiants = id_poet if isinstance(id_poet, (list, tuple, set)) else [id_poet]
+        return Authorship_poet.query.filter(
+            Authorship_poet.authorship_poet_poet_id.in_(identifiants)
+        ).delete(synchronize_session=False)
 
 class Authorship_military_status(db.Model):
     __tablename__ = "Authorship_military_status"
     authorship_military_status_id = db.Column(db.Integer, nullable=False, autoincrement=True, primary_key=True)
     authorship_military_status_user_id = db.Column(db.Integer, db.ForeignKey("User.user_id"))
     authorship_military_status_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    authorship_military_status_military_status_id = db.Column(db.Integer, db.ForeignKey("Military_status.military_status_id"))
+    authorship_military_status_military_status_id = db.Column(db.Integer, db.ForeignKey("Military_status.military_status_id"), index=True)
     #Jointures entre les tables Authorship_military_status et Military_status; ainsi qu'entre les tables Authorship_military_status et User.
     status = db.relationship("Military_status", back_populates="authorships_esm")
     user_status = db.relationship("User", back_populates="authorship_military_status")
@@ -625,21 +966,17 @@ class Authorship_military_status(db.Model):
     def authorship_esm_event(updated):
         """
         Fonction permettant l'inscription d'un événement (création ou modification) concernant un objet de la table Military_status.
-        :returns: True en cas de réussite, False en cas d'échec.
-        :rtype: booléen
+        Comme pour Authorship_poet.authorship_event, l'enregistrement est ajouté à la transaction en cours sans la valider.
+        :param updated: objet créé ou modifié, dont l'identifiant a été attribué
+        :returns: l'enregistrement ajouté
+        :rtype: Authorship_military_status
         """
         entry = Authorship_military_status(
             authorship_military_status_user_id=current_user.get_id(),
             authorship_military_status_military_status_id=updated.military_status_id
         )
-        try:
-            db.session.add(entry)
-            db.session.commit()
-            return True
-
-        except Exception as why:
-            print(why)
-            return False
+        db.session.add(entry)
+        return entry
 
 
 
@@ -648,7 +985,7 @@ class Authorship_publication(db.Model):
     authorship_publication_id = db.Column(db.Integer, nullable=False, autoincrement=True, primary_key=True)
     authorship_publication_user_id = db.Column(db.Integer, db.ForeignKey("User.user_id"))
     authorship_publication_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    authorship_publication_publication_id = db.Column(db.Integer, db.ForeignKey("Publication.publication_id"))
+    authorship_publication_publication_id = db.Column(db.Integer, db.ForeignKey("Publication.publication_id"), index=True)
     #Jointures entre les tables Authorship_publication et Publication; ainsi qu'entre les tables Authorship_publication et User.
     pub = db.relationship("Publication", back_populates="authorships_pub")
     user_pub = db.relationship("User", back_populates="authorship_pub")
@@ -657,18 +994,14 @@ class Authorship_publication(db.Model):
     def authorship_pub_event(updated):
         """
         Fonction permettant l'inscription d'un événement (création ou modification) concernant un objet de la table Publication.
-        :returns: True en cas de réussite, False en cas d'échec.
-        :rtype: booléen
+        Comme pour Authorship_poet.authorship_event, l'enregistrement est ajouté à la transaction en cours sans la valider.
+        :param updated: objet créé ou modifié, dont l'identifiant a été attribué
+        :returns: l'enregistrement ajouté
+        :rtype: Authorship_publication
         """
         entry = Authorship_publication(
             authorship_publication_user_id=current_user.get_id(),
             authorship_publication_publication_id=updated.publication_id
         )
-        try:
-            db.session.add(entry)
-            db.session.commit()
-            return True
-
-        except Exception as why:
-            print(why)
-            return False
+        db.session.add(entry)
+        return entry
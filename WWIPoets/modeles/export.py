@@ -0,0 +1,90 @@
+import csv
+#Importation du module csv pour l'écriture des lignes au format CSV.
+import io
+#Importation du module io pour écrire chaque ligne CSV dans un tampon en mémoire.
+import json
+#Importation du module json pour l'écriture des lignes au format NDJSON (un document Json par ligne).
+from .donnees import Poet
+#Importation de la classe Poet, déclarée dans le fichier donnees.py
+
+EXPORT_LOT = 200
+#Nombre de poètes lus par lot dans la base : la mémoire utilisée par l'export dépend de cette taille, et non de celle de la base.
+
+FORMATS = ("ndjson", "csv")
+
+COLONNES_CSV = ["id", "name", "firstname", "birthdate", "birthdeath", "country", "birthplace", "deathplace", "description",
+                "json", "publication", "statut_militaire"]
+#Colonnes du fichier CSV : attributs de poete_to_json(), lien vers la notice Json, puis les publications et ESM encodés en Json.
+
+
+def documents_poetes(lot=EXPORT_LOT):
+    """
+    Générateur qui parcourt tous les poètes par ordre d'identifiant, avec leurs publications et leur ESM,
+    et renvoie pour chacun le dictionnaire produit par poete_to_json().
+    Les poètes sont lus par lots de 'lot' lignes (yield_per) et leurs relations chargées par lot (selectinload) :
+    un lot de poètes coûte trois requêtes, et les objets déjà écrits peuvent être libérés.
+    :param lot: nombre de poètes lus par lot
+    :type lot: int
+    :returns: générateur de dictionnaires
+    """
+    requete = Poet.query.options(*Poet.chargement_complet()).order_by(Poet.poet_id).yield_per(lot)
+    for poete in requete:
+        yield poete.poete_to_json()
+
+
+def lignes_ndjson(documents):
+    """
+    Générateur qui transforme des dictionnaires en lignes NDJSON.
+    :param documents: itérable de dictionnaires
+    :returns: générateur de chaînes terminées par un saut de ligne
+    """
+    for document in documents:
+        yield json.dumps(document, ensure_ascii=False) + "\n"
+
+
+def lignes_csv(documents):
+    """
+    Générateur qui transforme les dictionnaires de poete_to_json() en lignes CSV (en-tête compris).
+    Les publications et l'ESM, qui sont des listes, sont encodés en Json dans leur cellule.
+    :param documents: itérable de dictionnaires produits par poete_to_json()
+    :returns: générateur de chaînes
+    """
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon)
+
+    def vider():
+        ligne = tampon.getvalue()
+        tampon.seek(0)
+        tampon.truncate(0)
+        return ligne
+
+    ecrivain.writerow(COLONNES_CSV)
+    yield vider()
+    for document in documents:
+        attributs = document["attributes"]
+        ecrivain.writerow(
+            [document["id"]]
+            + [attributs.get(colonne) for colonne in COLONNES_CSV[1:9]]
+            + [document["links"]["json"],
+               json.dumps(document["publication"], ensure_ascii=False),
+               json.dumps(document["statut_militaire"], ensure_ascii=False)]
+        )
+        yield vider()
+
+
+def export(format_export="ndjson", lot=EXPORT_LOT):
+    """
+    Générateur de l'export complet de la base (poètes, publications et ESM) au format demandé.
+    Doit être parcouru dans un contexte de requête (url_for est utilisé pour le lien Json de chaque notice).
+    :param format_export: 'ndjson' ou 'csv'
+    :type format_export: str
+    :param lot: nombre de poètes lus par lot
+    :type lot: int
+    :returns: générateur de chaînes
+    :raises ValueError: si le format n'est pas reconnu
+    """
+    if format_export == "ndjson":
+        return lignes_ndjson(documents_poetes(lot))
+    if format_export == "csv":
+        return lignes_csv(documents_poetes(lot))
+    raise ValueError("Format d'export inconnu : {}".format(format_export))
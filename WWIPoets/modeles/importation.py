@@ -0,0 +1,429 @@
+import csv
+#Importation du module csv pour la lecture des fichiers CSV.
+import datetime
+#Importation du module datetime pour dater les enregistrements des tables d'historique.
+import json
+#Importation du module json pour la lecture des fichiers JSON et NDJSON (un document Json par ligne).
+from sqlalchemy import func
+#Importation de func pour lire le plus grand identifiant des tables Publication et Military_status.
+from ..app import db
+#Importation de la base de données
+from .donnees import Poet, Publication, Military_status, Authorship_poet, Authorship_publication, Authorship_military_status, \
+    apres_ecriture, PAGES_IMPORT
+#Importation des classes et de la fonction d'invalidation des caches, déclarées dans le fichier donnees.py
+from .recherche import indexer_poetes
+#Importation de la mise à jour groupée de l'index plein-texte, déclarée dans le fichier recherche.py
+from .chronologie import rafraichir_evenements
+#Importation de la mise à jour groupée de la chronologie, déclarée dans le fichier chronologie.py
+from .unicite import uniques, ESPACES, POETE, NOM, PUBLICATION, STATUT
+#Importation de l'index d'unicité en mémoire, déclaré dans le fichier unicite.py
+from .dates import colonnes_date
+#Importation de la normalisation des dates, déclarée dans le fichier dates.py
+from .lieux import colonnes_lieu
+#Importation du rattachement des lieux au gazetteer, déclaré dans le fichier lieux.py
+
+IMPORT_LOT = 500
+#Nombre d'enregistrements validés et insérés par transaction : un lot en échec est annulé sans toucher aux lots précédents.
+
+FORMATS_IMPORT = ("csv", "json", "ndjson")
+
+# Champs d'un enregistrement importé : ce sont les paramètres de Poet.create_poet, auxquels s'ajoutent deux listes facultatives
+# 'publications' (titre, date, genre_litteraire, login_wiki_pub) et 'statuts' (statut, lieu_recrutement, registre_matricule, grade, login_wiki_esm).
+# Dans un fichier CSV, ces deux listes sont des cellules encodées en Json.
+CHAMPS_POETE = ["nom", "prenom", "nationalite", "date_naissance", "date_deces", "lieu_naissance", "lieu_deces", "description", "login_wiki"]
+CHAMPS_PUBLICATION = ["titre", "date", "genre_litteraire", "login_wiki_pub"]
+CHAMPS_STATUT = ["statut", "lieu_recrutement", "registre_matricule", "grade", "login_wiki_esm"]
+
+
+# LECTURE DES FICHIERS #
+# Chaque lecteur est un générateur de tuples (numéro de l'enregistrement à partir de 1, dictionnaire ou None, erreur ou None) :
+# un enregistrement illisible est signalé sans interrompre la lecture des suivants. Pour un fichier NDJSON, le numéro est celui
+# de la ligne dans le fichier (lignes vides comprises).
+
+def lire_csv(flux):
+    """
+    Générateur qui lit un fichier CSV (avec en-tête) ligne à ligne.
+    :param flux: fichier texte ouvert
+    :returns: générateur de tuples (numéro, enregistrement, erreur)
+    """
+    lecteur = csv.DictReader(flux)
+    numero = 0
+    while True:
+        numero += 1
+        try:
+            ligne = next(lecteur)
+        except StopIteration:
+            return
+        except csv.Error as erreur:
+            #Ligne mal formée (caractère nul, champ trop long...) : le lecteur CSV l'a consommée et peut lire la suivante.
+            yield numero, None, "Ligne CSV illisible : {}".format(erreur)
+            continue
+        try:
+            for liste in ("publications", "statuts"):
+                ligne[liste] = json.loads(ligne[liste]) if ligne.get(liste) else []
+        except ValueError:
+            yield numero, None, "Les colonnes 'publications' et 'statuts' doivent contenir une liste Json"
+            continue
+        yield numero, ligne, None
+
+
+def lire_ndjson(flux):
+    """
+    Générateur qui lit un fichier NDJSON (un document Json par ligne), sans le charger entièrement en mémoire.
+    :param flux: fichier texte ouvert
+    :returns: générateur de tuples (numéro, enregistrement, erreur)
+    """
+    for numero, ligne in enumerate(flux, start=1):
+        if not ligne.strip():
+            continue
+        try:
+            yield numero, json.loads(ligne), None
+        except ValueError:
+            yield numero, None, "Ligne Json illisible"
+
+
+def lire_json(flux):
+    """
+    Générateur qui lit un fichier JSON contenant une liste d'enregistrements.
+    :param flux: fichier texte ouvert
+    :returns: générateur de tuples (numéro, enregistrement, erreur)
+    :raises ValueError: si le fichier n'est pas une liste Json
+    """
+    enregistrements = json.load(flux)
+    if not isinstance(enregistrements, list):
+        raise ValueError("Le fichier Json doit contenir une liste d'enregistrements")
+    for numero, enregistrement in enumerate(enregistrements, start=1):
+        yield numero, enregistrement, None
+
+
+def lire(flux, format_import):
+    """
+    Fonction qui renvoie le lecteur correspondant au format du fichier.
+    :param flux: fichier texte ouvert
+    :param format_import: 'csv', 'json' ou 'ndjson'
+    :type format_import: str
+    :returns: générateur de tuples (numéro, enregistrement, erreur)
+    :raises ValueError: si le format n'est pas reconnu
+    """
+    lecteurs = {"csv": lire_csv, "json": lire_json, "ndjson": lire_ndjson}
+    if format_import not in lecteurs:
+        raise ValueError("Format d'import inconnu : {}".format(format_import))
+    return lecteurs[format_import](flux)
+
+
+# VALIDATION #
+
+def texte(valeur):
+    """
+    Fonction qui normalise la valeur d'un champ : les nombres sont convertis en texte et les champs vides valent None.
+    """
+    if valeur is None:
+        return None
+    valeur = str(valeur).strip()
+    return valeur or None
+
+
+def valider_publication(publication):
+    """
+    Fonction qui vérifie une publication importée avec les règles de Publication.create_publication et Publication.modif_pub.
+    :param publication: dictionnaire des champs de CHAMPS_PUBLICATION
+    :type publication: dict
+    :returns: liste des erreurs
+    :rtype: list
+    """
+    errors = []
+    if not publication["titre"]:
+        errors.append("La mention du titre est obligatoire")
+    if not publication["date"]:
+        errors.append("La mention de la date est obligatoire")
+    elif len(publication["date"]) > 12:
+        errors.append("La date ne doit pas dépasser 12 caractères")
+    if publication["login_wiki_pub"] and len(publication["login_wiki_pub"]) > 10:
+        errors.append("L'identifiant ne doit pas dépasser 10 caractères")
+    return errors
+
+
+def valider_statut(statut):
+    """
+    Fonction qui vérifie un ESM importé avec les règles de Military_status.create_military_status et Military_status.modif_statut.
+    :param statut: dictionnaire des champs de CHAMPS_STATUT
+    :type statut: dict
+    :returns: liste des erreurs
+    :rtype: list
+    """
+    errors = []
+    if not statut["statut"]:
+        errors.append("La mention du statut militaire est obligatoire")
+    if statut["login_wiki_esm"] and len(statut["login_wiki_esm"]) > 10:
+        errors.append("L'identifiant ne doit pas dépasser 10 caractères")
+    return errors
+
+
+class Importation:
+    """
+    Import en masse de notices de poètes, avec leurs publications et leur ESM.
+    L'unicité des identifiants externes et des couples (nom, prénom) est vérifiée dans l'index d'unicité en mémoire (unicite.py),
+    complété par les clés des enregistrements du fichier en attente d'insertion : un doublon à l'intérieur du fichier est ainsi refusé.
+    Les enregistrements valides sont insérés par lots (executemany), avec leur historique et leur index plein-texte, une transaction par lot.
+    """
+
+    def __init__(self, user_id, lot=IMPORT_LOT):
+        """
+        :param user_id: identifiant de l'utilisateur auquel les créations sont attribuées dans les tables d'historique
+        :type user_id: int
+        :param lot: nombre d'enregistrements par transaction
+        :type lot: int
+        """
+        self.user_id = user_id
+        self.lot = lot
+        self.reserves = {espace: set() for espace in ESPACES}
+        self.importes = 0
+        self.publications = 0
+        self.statuts = 0
+        self.erreurs = []
+        self.poet_ids = []
+        self.lieux = {}
+        #Lieux déjà résolus pendant l'import (clé normalisée -> identifiant) : un lieu répété dans le fichier n'est cherché qu'une fois.
+
+    def preparer(self, enregistrement):
+        """
+        Fonction qui normalise et valide un enregistrement (mêmes règles que Poet.create_poet, y compris l'unicité).
+        :param enregistrement: dictionnaire lu dans le fichier
+        :type enregistrement: dict
+        :returns: tuple (dictionnaire normalisé ou None, liste des erreurs)
+        :rtype: tuple
+        """
+        if not isinstance(enregistrement, dict):
+            return None, ["L'enregistrement doit être un objet"]
+        poete = {champ: texte(enregistrement.get(champ)) for champ in CHAMPS_POETE}
+        publications = enregistrement.get("publications") or []
+        statuts = enregistrement.get("statuts") or []
+        if not isinstance(publications, list) or not isinstance(statuts, list) \
+                or not all(isinstance(element, dict) for element in publications + statuts):
+            return None, ["Les champs 'publications' et 'statuts' doivent être des listes d'objets"]
+        publications = [{champ: texte(publication.get(champ)) for champ in CHAMPS_PUBLICATION} for publication in publications]
+        statuts = [{champ: texte(statut.get(champ)) for champ in CHAMPS_STATUT} for statut in statuts]
+
+        errors = Poet.valider(*[poete[champ] for champ in CHAMPS_POETE])
+        if self.existe(NOM, (poete["nom"], poete["prenom"])):
+            errors.append("La personne est déjà inscrite dans la base de données")
+        if self.existe(POETE, poete["login_wiki"]):
+            errors.append("Cet identifiant est déjà utilisé")
+        logins = set()
+        for publication in publications:
+            errors += valider_publication(publication)
+            login = publication["login_wiki_pub"]
+            if login is not None and (login in logins or self.existe(PUBLICATION, login)):
+                errors.append("L'identifiant de publication {} est déjà utilisé".format(login))
+            logins.add(login)
+        logins = set()
+        for statut in statuts:
+            errors += valider_statut(statut)
+            login = statut["login_wiki_esm"]
+            if login is not None and (login in logins or self.existe(STATUT, login)):
+                errors.append("L'identifiant d'ESM {} est déjà utilisé".format(login))
+            logins.add(login)
+        if errors:
+            return None, errors
+        poete["publications"] = publications
+        poete["statuts"] = statuts
+        return poete, []
+
+    def existe(self, espace, cle):
+        """
+        Fonction qui indique si une clé est déjà utilisée dans la base ou par un enregistrement du fichier en attente d'insertion.
+        """
+        return cle in self.reserves[espace] or uniques.existe(espace, cle)
+
+    def cles(self, poete):
+        """
+        Générateur des clés d'unicité d'un enregistrement validé : tuples (espace, clé).
+        """
+        yield NOM, (poete["nom"], poete["prenom"])
+        yield POETE, poete["login_wiki"]
+        for publication in poete["publications"]:
+            if publication["login_wiki_pub"] is not None:
+                yield PUBLICATION, publication["login_wiki_pub"]
+        for statut in poete["statuts"]:
+            if statut["login_wiki_esm"] is not None:
+                yield STATUT, statut["login_wiki_esm"]
+
+    def inserer(self, poetes):
+        """
+        Fonction qui insère un lot d'enregistrements validés (notices, publications, ESM et historique) en une seule transaction.
+        Chaque table reçoit une seule instruction INSERT exécutée pour toutes les lignes du lot (executemany).
+        :param poetes: liste de dictionnaires renvoyés par preparer()
+        :type poetes: list
+        :returns: liste des identifiants des poètes créés
+        :rtype: list
+        """
+        date = datetime.datetime.utcnow()
+        db.session.execute(Poet.__table__.insert(), [{
+            "poet_name": poete["nom"],
+            "poet_firstname": poete["prenom"],
+            "poet_country": poete["nationalite"],
+            "poet_birthdate": poete["date_naissance"],
+            "poet_deathdate": poete["date_deces"],
+            "poet_birthplace": poete["lieu_naissance"],
+            "poet_deathplace": poete["lieu_deces"],
+            "poet_description": poete["description"],
+            "poet_external_login": poete["login_wiki"],
+            **colonnes_date("poet_birth", poete["date_naissance"]),
+            **colonnes_date("poet_death", poete["date_deces"]),
+            **colonnes_lieu("poet_birthplace_id", poete["lieu_naissance"], self.lieux),
+            **colonnes_lieu("poet_deathplace_id", poete["lieu_deces"], self.lieux)
+        } for poete in poetes])
+        #executemany ne renvoie pas les identifiants créés : ils sont relus par l'identifiant externe, unique dans la base et dans le fichier.
+        identifiants = dict(db.session.query(Poet.poet_external_login, Poet.poet_id).filter(
+            Poet.poet_external_login.in_([poete["login_wiki"] for poete in poetes])
+        ))
+        #L'insertion précédente a verrouillé la base en écriture jusqu'à la fin de la transaction :
+        #les identifiants suivants peuvent donc être attribués à partir des plus grands identifiants existants.
+        publication_id = db.session.query(func.max(Publication.publication_id)).scalar() or 0
+        military_status_id = db.session.query(func.max(Military_status.military_status_id)).scalar() or 0
+        publications, statuts = [], []
+        for poete in poetes:
+            poet_id = identifiants[poete["login_wiki"]]
+            for publication in poete["publications"]:
+                publication_id += 1
+                publications.append({
+                    "publication_id": publication_id,
+                    "publication_titre": publication["titre"],
+                    "publication_date": publication["date"],
+                    "publication_genre_litteraire": publication["genre_litteraire"],
+                    "publication_poet_id": poet_id,
+                    "publication_external_login": publication["login_wiki_pub"],
+                    **colonnes_date("publication", publication["date"])
+                })
+            for statut in poete["statuts"]:
+                military_status_id += 1
+                statuts.append({
+                    "military_status_id": military_status_id,
+                    "military_status_statut": statut["statut"],
+                    "military_status_lieu_recrutement": statut["lieu_recrutement"],
+                    "military_status_registre_matricule": statut["registre_matricule"],
+                    "military_status_grade": statut["grade"],
+                    "military_status_poet_id": poet_id,
+                    "military_status_external_login": statut["login_wiki_esm"],
+                    **colonnes_lieu("military_status_lieu_recrutement_id", statut["lieu_recrutement"], self.lieux)
+                })
+        poet_ids = list(identifiants.values())
+        db.session.execute(Authorship_poet.__table__.insert(), [
+            {"authorship_poet_user_id": self.user_id, "authorship_poet_poet_id": poet_id, "authorship_poet_date": date}
+            for poet_id in poet_ids
+        ])
+        if publications:
+            db.session.execute(Publication.__table__.insert(), publications)
+            db.session.execute(Authorship_publication.__table__.insert(), [
+                {"authorship_publication_user_id": self.user_id, "authorship_publication_publication_id": publication["publication_id"],
+                 "authorship_publication_date": date}
+                for publication in publications
+            ])
+        if statuts:
+            db.session.execute(Military_status.__table__.insert(), statuts)
+            db.session.execute(Authorship_military_status.__table__.insert(), [
+                {"authorship_military_status_user_id": self.user_id,
+                 "authorship_military_status_military_status_id": statut["military_status_id"],
+                 "authorship_military_status_date": date}
+                for statut in statuts
+            ])
+        indexer_poetes(poet_ids)
+        rafraichir_evenements(poet_ids)
+        self.publications += len(publications)
+        self.statuts += len(statuts)
+        return poet_ids
+
+    def valider_lot(self, lot):
+        """
+        Fonction qui insère un lot et valide sa transaction. En cas d'échec, le lot est annulé,
+        chacun de ses enregistrements est signalé en erreur et l'import continue avec le lot suivant.
+        :param lot: liste de tuples (numéro, dictionnaire renvoyé par preparer())
+        :type lot: list
+        :returns: None
+        """
+        if not lot:
+            return
+        try:
+            poet_ids = self.inserer([poete for numero, poete in lot])
+            db.session.commit()
+            echec = None
+        except Exception as erreur_lot:
+            db.session.rollback()
+            #Les lieux créés par le lot annulé n'existent plus.
+            self.lieux = {}
+            echec = str(erreur_lot)
+        #Les clés du lot quittent les clés en attente : elles rejoignent l'index d'unicité si le lot a été enregistré.
+        for numero, poete in lot:
+            for espace, cle in self.cles(poete):
+                self.reserves[espace].discard(cle)
+                if echec is None:
+                    uniques.ajouter(espace, cle)
+            if echec is not None:
+                self.erreurs.append({"ligne": numero, "erreurs": [echec]})
+        if echec is not None:
+            return
+        self.importes += len(poet_ids)
+        self.poet_ids += poet_ids
+
+    def importer(self, enregistrements):
+        """
+        Fonction qui importe des enregistrements lus par lire() : les enregistrements invalides sont écartés et signalés,
+        les autres sont insérés par lots de self.lot.
+        Si la lecture échoue en cours de route (par exemple UnicodeDecodeError), l'exception est transmise à l'appelant,
+        mais les données dérivées (compteurs, cache de réponses, modèle de lecture) sont mises à jour pour les lots déjà enregistrés.
+        :param enregistrements: itérable de tuples (numéro, enregistrement, erreur)
+        :returns: rapport d'import (nombre de notices, de publications et d'ESM créés, erreurs par enregistrement)
+        :rtype: dict
+        """
+        lot = []
+        try:
+            for numero, enregistrement, erreur in enregistrements:
+                if erreur is not None:
+                    self.erreurs.append({"ligne": numero, "erreurs": [erreur]})
+                    continue
+                poete, errors = self.preparer(enregistrement)
+                if errors:
+                    self.erreurs.append({"ligne": numero, "erreurs": errors})
+                    continue
+                for espace, cle in self.cles(poete):
+                    self.reserves[espace].add(cle)
+                lot.append((numero, poete))
+                if len(lot) >= self.lot:
+                    self.valider_lot(lot)
+                    lot = []
+            self.valider_lot(lot)
+        finally:
+            if self.poet_ids:
+                #Les objets éventuellement chargés dans la session, les compteurs et les pages en cache ne correspondent plus à la base.
+                db.session.expire_all()
+                apres_ecriture(self.poet_ids, PAGES_IMPORT)
+        return self.rapport()
+
+    def rapport(self):
+        """
+        :returns: rapport d'import
+        :rtype: dict
+        """
+        return {
+            "importes": self.importes,
+            "publications": self.publications,
+            "statuts": self.statuts,
+            "erreurs": sorted(self.erreurs, key=lambda erreur: erreur["ligne"])
+        }
+
+
+def importer(flux, format_import, user_id, lot=IMPORT_LOT):
+    """
+    Fonction qui importe un fichier CSV, JSON ou NDJSON de notices de poètes.
+    :param flux: fichier texte ouvert
+    :param format_import: 'csv', 'json' ou 'ndjson'
+    :type format_import: str
+    :param user_id: identifiant de l'utilisateur auquel les créations sont attribuées
+    :type user_id: int
+    :param lot: nombre d'enregistrements par transaction
+    :type lot: int
+    :returns: rapport d'import
+    :rtype: dict
+    :raises ValueError: si le format n'est pas reconnu ou si le fichier Json n'est pas une liste
+    """
+    return Importation(user_id, lot).importer(lire(flux, format_import))
@@ -0,0 +1,445 @@
+import heapq
+#Importation du module heapq pour lire les derniers poètes enregistrés sans trier toute la collection.
+import sys
+#Importation du module sys pour partager (sys.intern) les textes qui se répètent d'une notice à l'autre.
+import threading
+#Importation du module threading : le modèle de lecture est partagé par les fils d'exécution (threads) du serveur.
+import time
+#Importation du module time pour espacer les vérifications de fraîcheur.
+from bisect import bisect_left, insort
+#Importation de bisect pour tenir à jour les listes triées des index sans les retrier.
+from collections import namedtuple
+#Importation de namedtuple, pour des instantanés compacts et immuables.
+from flask import request
+#Importation de request pour lire l'adresse du site, qui figure dans les liens des documents Json.
+from flask_login import current_user
+#Importation de current_user : les utilisateurs connectés lisent toujours la base, pour voir immédiatement leurs propres écritures.
+from flask_sqlalchemy import Pagination
+#Importation de la classe Pagination afin de conserver la même interface que .paginate() dans les templates.
+from sqlalchemy import text
+#Importation de text pour les requêtes SQL de vérification de fraîcheur.
+from ..app import db
+#Importation de la base de données
+from . import donnees
+#Importation du module donnees.py (et non de ses classes) : donnees.py importe lui-même ce fichier pour tenir le modèle à jour.
+from ..constantes import LECTURE_VERIFICATION
+#Importation de l'intervalle de vérification de fraîcheur du modèle de lecture
+from ..encodage import encoder
+#Importation de l'encodeur Json de l'application, déclaré dans le fichier encodage.py
+
+# MODÈLE DE LECTURE EN MÉMOIRE #
+# Les pages consultées par les visiteurs anonymes (accueil, index, notices, recherche, Json d'une notice) lisent des instantanés
+# des notices chargés une fois au lancement, au lieu de construire des objets de l'ORM (session, identity map, chargement des relations)
+# à chaque requête. Un instantané est un namedtuple : immuable, sans dictionnaire d'attributs par objet, avec les mêmes noms
+# d'attributs et les mêmes méthodes Json que les modèles de donnees.py, si bien que les templates et les routes Json l'utilisent tel quel.
+# Le modèle est tenu à jour par apres_ecriture (donnees.py) : les instantanés des poètes concernés sont relus dans la base.
+# Les écritures faites par un autre processus du serveur sont repérées dans les tables d'historique, au plus toutes les
+# LECTURE_VERIFICATION secondes : les poètes concernés sont relus. Une suppression retire des lignes d'historique ; Poet.delete_poets
+# laisse donc une trace dans la table Suppression (identifiant croissant, identifiant du poète supprimé), lue de la même façon.
+# Le modèle n'est jamais rechargé entièrement pendant une requête : chaque vérification ne lit que les lignes ajoutées depuis la précédente.
+# Une page dont la version lue dans la base (ETag, voir Poet.version et version_base dans donnees.py) est plus récente que le modèle
+# le fait rattraper aussitôt (exiger()) : le corps servi n'est jamais plus ancien que l'ETag qui l'accompagne.
+# Les utilisateurs connectés continuent de lire la base : ils voient leurs propres écritures quel que soit le processus qui les sert.
+# Le document Json de chaque notice (poete_to_json) est encodé en octets à sa première lecture et conservé à côté de l'instantané :
+# il n'est encodé de nouveau que lorsque l'instantané est remplacé, c'est-à-dire lorsque le poète, une de ses publications ou un de ses ESM change.
+
+LOT = 500
+#Nombre d'identifiants par requête 'WHERE ... IN (...)' lors de la relecture de plusieurs poètes (SQLite limite le nombre de paramètres).
+
+COLONNES_PARTAGEES = {
+    "poet_country", "poet_birthplace", "poet_deathplace", "poet_birth_precision", "poet_death_precision",
+    "publication_genre_litteraire", "publication_precision",
+    "military_status_statut", "military_status_grade", "military_status_lieu_recrutement",
+}
+#Colonnes dont les valeurs se répètent (pays, lieux, genres, grades...) : une seule copie de chaque texte est conservée en mémoire.
+
+CREATION_SUPPRESSION = [
+    """
+    CREATE TABLE IF NOT EXISTS Suppression (
+        suppression_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        poet_id INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_suppression_poete ON Suppression (poet_id, suppression_id)",
+]
+#Trace des suppressions de poètes (une ligne de deux entiers par poète supprimé, jamais effacée) : AUTOINCREMENT garantit
+#que l'identifiant croît toujours, comme celui des tables d'historique.
+
+# Signature du modèle : plus grand identifiant des tables d'historique et de la table Suppression (lecture de la fin de chaque clé primaire).
+# Les identifiants de ces tables (AUTOINCREMENT) ne sont jamais réutilisés : toute écriture validée depuis la signature
+# précédente a un identifiant plus grand.
+SIGNATURE_LECTURE = text("""
+SELECT coalesce((SELECT max(authorship_poet_id) FROM Authorship_poet), 0),
+       coalesce((SELECT max(authorship_publication_id) FROM Authorship_publication), 0),
+       coalesce((SELECT max(authorship_military_status_id) FROM Authorship_military_status), 0),
+       coalesce((SELECT max(suppression_id) FROM Suppression), 0)
+""")
+
+# Poètes concernés par les lignes d'historique et les suppressions ajoutées depuis la dernière signature.
+MODIFICATIONS_LECTURE = text("""
+SELECT 'poete', authorship_poet_poet_id FROM Authorship_poet WHERE authorship_poet_id > :poete
+UNION ALL
+SELECT 'publication', Publication.publication_poet_id FROM Authorship_publication
+  LEFT JOIN Publication ON Publication.publication_id = Authorship_publication.authorship_publication_publication_id
+ WHERE authorship_publication_id > :publication
+UNION ALL
+SELECT 'statut', Military_status.military_status_poet_id FROM Authorship_military_status
+  LEFT JOIN Military_status ON Military_status.military_status_id = Authorship_military_status.authorship_military_status_military_status_id
+ WHERE authorship_military_status_id > :statut
+UNION ALL
+SELECT 'suppression', poet_id FROM Suppression WHERE suppression_id > :suppression
+""")
+
+NOTE_SUPPRESSION = text("INSERT INTO Suppression (poet_id) VALUES (:poet_id)")
+
+
+def creer_suppressions(connexion):
+    """
+    Fonction qui crée la table Suppression, trace des poètes supprimés lue par les autres processus du serveur,
+    et son index par poète (version d'une notice, voir donnees.py).
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :returns: None
+    """
+    for instruction in CREATION_SUPPRESSION:
+        connexion.execute(instruction)
+
+
+def noter_suppressions(poet_ids):
+    """
+    Fonction qui inscrit la suppression de plusieurs poètes dans la table Suppression. L'inscription est ajoutée à la transaction
+    en cours, que l'appelant valide en même temps que la suppression.
+    :param poet_ids: identifiants numériques des poètes supprimés
+    :type poet_ids: list
+    :returns: None
+    """
+    if poet_ids:
+        db.session.execute(NOTE_SUPPRESSION, [{"poet_id": poet_id} for poet_id in poet_ids])
+
+
+def classe_instantane(modele, relations=(), methodes=None):
+    """
+    Fonction qui crée la classe des instantanés d'un modèle : un namedtuple dont les champs sont les colonnes de la table
+    (dans l'ordre de la table), suivis des relations, et auquel sont ajoutées les méthodes Json du modèle.
+    :param modele: classe du modèle (Poet, Publication ou Military_status)
+    :param relations: noms des champs qui contiennent les instantanés liés (par exemple 'link_publication')
+    :type relations: tuple
+    :param methodes: méthodes du modèle reprises par l'instantané {nom: fonction}
+    :type methodes: dict or None
+    :returns: classe
+    """
+    nom = modele.__name__ + "_lu"
+    base = namedtuple(nom, [colonne.name for colonne in modele.__table__.columns] + list(relations))
+    return type(nom, (base,), dict(methodes or {}, __slots__=()))
+
+
+def valeurs(table, ligne):
+    """
+    Fonction qui renvoie les valeurs d'une ligne lue dans une table, en partageant les textes des COLONNES_PARTAGEES.
+    """
+    return [sys.intern(valeur) if isinstance(valeur, str) and colonne.name in COLONNES_PARTAGEES else valeur
+            for colonne, valeur in zip(table.columns, ligne)]
+
+
+def cle_poete(poete):
+    """
+    Fonction qui renvoie la clé de tri de l'index des individus (nom, prénom, identifiant).
+    """
+    return poete.poet_name or "", poete.poet_firstname or "", poete.poet_id
+
+
+def cle_publication(publication):
+    """
+    Fonction qui renvoie la clé de tri de l'index des publications (titre, identifiant) ; les titres absents viennent en premier, comme en SQL.
+    """
+    return publication.publication_titre is not None, publication.publication_titre or "", publication.publication_id
+
+
+class ModeleLecture:
+    """
+    Instantanés des notices (poètes avec leurs publications et leurs ESM), indexés par identifiant,
+    et listes triées des clés des index des individus et des publications.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.intervalle = LECTURE_VERIFICATION
+        self.charge = False
+        self.verrou = threading.RLock()
+        self.verrou_verification = threading.Lock()
+        self.poetes = {}
+        self.publications = {}
+        self.ordre_poetes = []
+        self.ordre_publications = []
+        self.documents = {}
+        self.signature = None
+        self.verification = 0.0
+        self.types = None
+
+    def configurer(self, config):
+        """
+        Fonction qui lit la configuration de l'application : MODELE_LECTURE (True pour activer le modèle)
+        et MODELE_LECTURE_VERIFICATION (intervalle de vérification de fraîcheur, en secondes).
+        :param config: configuration de l'application (app.config)
+        :returns: None
+        """
+        self.active = bool(config.get("MODELE_LECTURE", False))
+        self.intervalle = config.get("MODELE_LECTURE_VERIFICATION", LECTURE_VERIFICATION)
+
+    def classes(self):
+        """
+        Fonction qui renvoie les classes des instantanés (poète, publication, ESM), créées au premier appel :
+        les modèles de donnees.py doivent être déclarés.
+        """
+        if self.types is None:
+            Poet, Publication, Military_status = donnees.Poet, donnees.Publication, donnees.Military_status
+            self.types = (
+                classe_instantane(Poet, ("link_publication", "link_military_status"), {"poete_to_json": Poet.poete_to_json}),
+                classe_instantane(Publication, methodes={"publication_to_json": Publication.publication_to_json}),
+                classe_instantane(Military_status, methodes={"status_to_json": Military_status.status_to_json}),
+            )
+        return self.types
+
+    def lire(self, poet_ids=None):
+        """
+        Fonction qui lit dans la base les instantanés de tous les poètes, ou de certains, en trois requêtes (par lot d'identifiants).
+        :param poet_ids: identifiants des poètes à lire, ou None pour tous
+        :type poet_ids: list or None
+        :returns: dictionnaire {poet_id: instantané}
+        :rtype: dict
+        """
+        PoeteLu, PublicationLue, StatutLu = self.classes()
+        tables = (donnees.Poet.__table__, donnees.Publication.__table__, donnees.Military_status.__table__)
+        colonnes_poete = (tables[0].c.poet_id, tables[1].c.publication_poet_id, tables[2].c.military_status_poet_id)
+        lots = [None] if poet_ids is None else [poet_ids[debut:debut + LOT] for debut in range(0, len(poet_ids), LOT)]
+        lignes = ([], [], [])
+        for lot in lots:
+            for table, colonne, resultat in zip(tables, colonnes_poete, lignes):
+                requete = table.select().order_by(table.primary_key.columns.values()[0])
+                if lot is not None:
+                    requete = requete.where(colonne.in_(lot))
+                resultat.extend(db.session.execute(requete).fetchall())
+        publications, statuts = {}, {}
+        for ligne in lignes[1]:
+            publication = PublicationLue._make(valeurs(tables[1], ligne))
+            publications.setdefault(publication.publication_poet_id, []).append(publication)
+        for ligne in lignes[2]:
+            statut = StatutLu._make(valeurs(tables[2], ligne))
+            statuts.setdefault(statut.military_status_poet_id, []).append(statut)
+        return {
+            ligne.poet_id: PoeteLu._make(valeurs(tables[0], ligne)
+                                         + [tuple(publications.get(ligne.poet_id, ())), tuple(statuts.get(ligne.poet_id, ()))])
+            for ligne in lignes[0]
+        }
+
+    def charger(self):
+        """
+        Fonction qui (re)charge tous les instantanés depuis la base, si le modèle est activé. Elle doit être appelée dans un contexte d'application.
+        :returns: None
+        """
+        if not self.active:
+            return
+        #La signature est lue avant les notices : une écriture faite pendant le chargement sera repérée à la vérification suivante.
+        signature = tuple(db.session.execute(SIGNATURE_LECTURE).fetchone())
+        poetes = self.lire()
+        publications = {publication.publication_id: publication for poete in poetes.values() for publication in poete.link_publication}
+        ordre_poetes = sorted(cle_poete(poete) for poete in poetes.values())
+        ordre_publications = sorted(cle_publication(publication) for publication in publications.values())
+        with self.verrou:
+            self.poetes, self.publications = poetes, publications
+            self.ordre_poetes, self.ordre_publications = ordre_poetes, ordre_publications
+            self.documents = {}
+            self.signature = signature
+            self.verification = time.monotonic()
+            self.charge = True
+
+    def retirer(self, poet_id):
+        """
+        Fonction qui retire l'instantané d'un poète et de ses publications (le verrou doit être détenu).
+        """
+        poete = self.poetes.pop(poet_id, None)
+        self.documents.pop(poet_id, None)
+        if poete is None:
+            return
+        del self.ordre_poetes[bisect_left(self.ordre_poetes, cle_poete(poete))]
+        for publication in poete.link_publication:
+            if self.publications.get(publication.publication_id) is publication:
+                del self.publications[publication.publication_id]
+                del self.ordre_publications[bisect_left(self.ordre_publications, cle_publication(publication))]
+
+    def ajouter(self, poete):
+        """
+        Fonction qui ajoute l'instantané d'un poète et de ses publications (le verrou doit être détenu).
+        """
+        self.poetes[poete.poet_id] = poete
+        insort(self.ordre_poetes, cle_poete(poete))
+        for publication in poete.link_publication:
+            self.publications[publication.publication_id] = publication
+            insort(self.ordre_publications, cle_publication(publication))
+
+    def relire(self, poet_ids):
+        """
+        Fonction qui relit dans la base les instantanés de plusieurs poètes. Un poète qui n'existe plus est retiré du modèle.
+        :param poet_ids: identifiants numériques des poètes concernés
+        :type poet_ids: list
+        :returns: None
+        """
+        poet_ids = sorted(set(int(poet_id) for poet_id in poet_ids if poet_id is not None))
+        if not poet_ids:
+            return
+        poetes = self.lire(poet_ids)
+        with self.verrou:
+            for poet_id in poet_ids:
+                self.retirer(poet_id)
+            for poete in poetes.values():
+                self.ajouter(poete)
+
+    def rattraper(self, poet_ids=()):
+        """
+        Fonction qui relit les poètes concernés par les lignes d'historique et les suppressions ajoutées depuis la signature du modèle,
+        quel que soit le processus qui les a écrites, puis avance la signature (le verrou de vérification doit être détenu).
+        :param poet_ids: identifiants numériques de poètes à relire en plus
+        :type poet_ids: list
+        :returns: None
+        """
+        self.verification = time.monotonic()
+        #La signature est lue avant les lignes : une écriture validée entre les deux lectures est relue maintenant et à la vérification suivante.
+        signature = tuple(db.session.execute(SIGNATURE_LECTURE).fetchone())
+        ancienne = self.signature
+        if signature != ancienne:
+            lignes = db.session.execute(MODIFICATIONS_LECTURE, dict(zip(("poete", "publication", "statut", "suppression"), ancienne)))
+            poet_ids = list(poet_ids) + [poet_id for table, poet_id in lignes]
+        self.relire(poet_ids)
+        self.signature = signature
+
+    def rafraichir(self, poet_ids):
+        """
+        Fonction qui met à jour le modèle après une écriture validée par ce processus (création, modification, suppression, import) :
+        les poètes concernés sont relus, ainsi que ceux des écritures d'autres processus validées depuis la dernière vérification,
+        et la signature avance au-delà de l'écriture.
+        :param poet_ids: identifiants numériques des poètes concernés
+        :type poet_ids: list
+        :returns: None
+        """
+        if not self.charge:
+            return
+        with self.verrou_verification:
+            self.rattraper(poet_ids)
+
+    def verifier(self):
+        """
+        Fonction qui repère, au plus toutes les 'intervalle' secondes, les écritures faites par un autre processus
+        et relit les poètes concernés (voir rattraper()).
+        :returns: None
+        """
+        if time.monotonic() - self.verification < self.intervalle or not self.verrou_verification.acquire(blocking=False):
+            return
+        try:
+            self.rattraper()
+        finally:
+            self.verrou_verification.release()
+
+    def exiger(self, maxima):
+        """
+        Fonction appelée avec la version d'une page lue dans la base (plus grands identifiants d'historique et de suppression
+        qui la concernent), avant que la page ne soit construite à partir des instantanés : si le modèle est plus ancien que
+        cette version (écriture d'un autre processus pas encore vérifiée), il est rattrapé tout de suite (voir rattraper()).
+        :param maxima: plus grands identifiants (Authorship_poet, Authorship_publication, Authorship_military_status, Suppression)
+        :type maxima: list
+        :returns: None
+        """
+        if not self.charge or not self.en_retard(maxima):
+            return
+        with self.verrou_verification:
+            if self.en_retard(maxima):
+                self.rattraper()
+
+    def en_retard(self, maxima):
+        """
+        Fonction qui indique si la signature du modèle est plus ancienne que les identifiants donnés.
+        """
+        return any((valeur or 0) > connue for valeur, connue in zip(maxima, self.signature))
+
+    def utilisable(self):
+        """
+        Fonction qui indique si la requête en cours peut être servie par le modèle de lecture : le modèle est chargé et le visiteur
+        n'est pas connecté. Elle vérifie au passage la fraîcheur du modèle (voir verifier()).
+        :returns: True si les routes de consultation doivent lire les instantanés
+        :rtype: booléen
+        """
+        if not self.charge or current_user.is_authenticated:
+            return False
+        self.verifier()
+        return True
+
+    def poete(self, poet_id):
+        """
+        Fonction qui renvoie l'instantané d'un poète (avec ses publications et ses ESM), ou None s'il n'existe pas.
+        """
+        return self.poetes.get(poet_id)
+
+    def document(self, poet_id):
+        """
+        Fonction qui renvoie le document Json encodé (poete_to_json) de la notice d'un poète, encodé à la première demande
+        puis conservé tant que l'instantané du poète et l'adresse du site ne changent pas.
+        :param poet_id: identifiant numérique de l'individu
+        :type poet_id: int
+        :returns: document encodé, ou None si le poète n'existe pas
+        :rtype: bytes or None
+        """
+        poete = self.poetes.get(poet_id)
+        if poete is None:
+            return None
+        racine = request.host_url
+        entree = self.documents.get(poet_id)
+        #L'instantané fait partie de l'entrée : un document encodé à partir d'un instantané déjà remplacé n'est jamais servi.
+        if entree is not None and entree[0] is poete and entree[1] == racine:
+            return entree[2]
+        octets = encoder(poete.poete_to_json())
+        with self.verrou:
+            if self.poetes.get(poet_id) is poete:
+                self.documents[poet_id] = (poete, racine, octets)
+        return octets
+
+    def documents_par_identifiants(self, identifiants):
+        """
+        Fonction qui renvoie les documents Json encodés de plusieurs poètes, dans l'ordre des identifiants (les identifiants inconnus sont ignorés).
+        """
+        documents = [self.document(identifiant) for identifiant in identifiants]
+        return [document for document in documents if document is not None]
+
+    def poetes_par_identifiants(self, identifiants):
+        """
+        Fonction qui renvoie les instantanés de plusieurs poètes, dans l'ordre des identifiants (les identifiants inconnus sont ignorés).
+        """
+        return [self.poetes[identifiant] for identifiant in identifiants if identifiant in self.poetes]
+
+    def derniers_poetes(self, nombre):
+        """
+        Fonction qui renvoie les instantanés des derniers poètes enregistrés (identifiants décroissants).
+        """
+        with self.verrou:
+            return [self.poetes[poet_id] for poet_id in heapq.nlargest(nombre, self.poetes)]
+
+    def page_poetes(self, page, par_page):
+        """
+        Fonction qui renvoie une page de l'index des individus (ordre alphabétique des noms), sans requête.
+        :returns: objet Pagination (items, total, page, iter_pages) identique à celui de .paginate()
+        :rtype: Pagination
+        """
+        with self.verrou:
+            cles = self.ordre_poetes[(page - 1) * par_page:page * par_page]
+            return Pagination(None, page, par_page, len(self.ordre_poetes), [self.poetes[cle[-1]] for cle in cles])
+
+    def page_publications(self, page, par_page):
+        """
+        Fonction qui renvoie une page de l'index des publications (ordre alphabétique des titres), sans requête.
+        :returns: objet Pagination (items, total, page, iter_pages) identique à celui de .paginate()
+        :rtype: Pagination
+        """
+        with self.verrou:
+            cles = self.ordre_publications[(page - 1) * par_page:page * par_page]
+            return Pagination(None, page, par_page, len(self.ordre_publications), [self.publications[cle[-1]] for cle in cles])
+
+
+#Modèle de lecture de l'application, configuré et chargé par config_app() au lancement.
+lecture = ModeleLecture()
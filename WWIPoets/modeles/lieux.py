@@ -0,0 +1,297 @@
+import csv
+#Importation du module csv pour la lecture du gazetteer fourni avec l'application (lieux.csv).
+import re
+#Importation du module re (expressions régulières) pour découper les noms de lieux en mots.
+import unicodedata
+#Importation du module unicodedata pour retirer les accents des noms de lieux.
+from sqlalchemy import text, bindparam
+#Importation de text et bindparam pour les requêtes SQL sur les tables Place, Place_variant et Facette.
+from ..app import db
+#Importation de la base de données
+from ..constantes import LIEUX_FICHIER
+#Importation du chemin du gazetteer fourni avec l'application
+from .statistiques import FACETTES_LIEUX
+#Importation des facettes des lieux (nombre de poètes par lieu), tenues à jour par les déclencheurs de statistiques.py
+
+# LIEUX (GAZETTEER) #
+# Les lieux de naissance, de décès et de recrutement sont saisis en texte libre ('Paris', 'Paris 6e b', 'St-Maur', 'Aix en Provence').
+# Chaque texte est rattaché à un lieu canonique (table Place) par sa clé normalisée (sans accents, sans ponctuation, 'st' -> 'saint'),
+# cherchée dans la table Place_variant. Le gazetteer lieux.csv, chargé sans accès au réseau, fournit les lieux connus, leurs variantes
+# d'écriture (bureaux de recrutement, abréviations, fautes de frappe) et leurs coordonnées approximatives (centre de la ville,
+# au centième de degré). Un texte inconnu du gazetteer crée un lieu canonique à son nom, sans coordonnées.
+# Les notices (Poet, Military_status) portent l'identifiant du lieu à côté du texte saisi ; le nombre de poètes par lieu est tenu à jour
+# dans la table Facette (voir statistiques.py), la page d'un lieu est une lecture des index de ces identifiants.
+
+
+class Place(db.Model):
+    __tablename__ = "Place"
+    place_id = db.Column(db.Integer, nullable=False, primary_key=True, autoincrement=True)
+    place_code = db.Column(db.Text, unique=True)
+    #Code du lieu dans le gazetteer (NULL pour un lieu créé à partir d'une saisie).
+    place_nom = db.Column(db.Text, nullable=False)
+    place_pays = db.Column(db.Text)
+    place_latitude = db.Column(db.Float)
+    place_longitude = db.Column(db.Float)
+
+
+class Place_variant(db.Model):
+    __tablename__ = "Place_variant"
+    place_variant_cle = db.Column(db.Text, nullable=False, primary_key=True)
+    place_variant_place_id = db.Column(db.Integer, db.ForeignKey("Place.place_id"), nullable=False, index=True)
+
+
+ABREVIATIONS = {"st": "saint", "ste": "sainte"}
+VALEURS_VIDES = {"none"}
+#Texte 'None' saisi dans certaines anciennes notices en l'absence de lieu.
+
+# Lieux des notices : (table, clé primaire, colonne du texte saisi, colonne de l'identifiant du lieu).
+LIEUX = [
+    ("Poet", "poet_id", "poet_birthplace", "poet_birthplace_id"),
+    ("Poet", "poet_id", "poet_deathplace", "poet_deathplace_id"),
+    ("Military_status", "military_status_id", "military_status_lieu_recrutement", "military_status_lieu_recrutement_id"),
+]
+
+
+def cle_lieu(texte):
+    """
+    Fonction qui renvoie la clé normalisée d'un nom de lieu : minuscules, sans accents ni ponctuation, abréviations développées.
+    :param texte: nom de lieu saisi, ou None
+    :type texte: str or None
+    :returns: clé ('saint maur des fosses' pour 'St Maur des Fossés'), ou None si le texte est vide
+    :rtype: str or None
+    """
+    texte = unicodedata.normalize("NFKD", texte or "").encode("ascii", "ignore").decode("ascii").lower()
+    cle = " ".join(ABREVIATIONS.get(mot, mot) for mot in re.findall(r"[a-z0-9]+", texte))
+    if not cle or cle in VALEURS_VIDES:
+        return None
+    return cle
+
+
+def identifiant_lieu(texte, executeur=None, cache=None):
+    """
+    Fonction qui renvoie l'identifiant du lieu canonique d'un texte saisi, en créant le lieu s'il est inconnu.
+    La création est ajoutée à la transaction en cours : c'est à l'appelant de la valider (commit).
+    :param texte: nom de lieu saisi, ou None
+    :type texte: str or None
+    :param executeur: connexion SQLAlchemy (migrations) ou None pour la session de l'application
+    :param cache: dictionnaire {clé: identifiant} des lieux déjà résolus (import en masse), facultatif
+    :type cache: dict or None
+    :returns: identifiant du lieu, ou None si le texte est vide
+    :rtype: int or None
+    """
+    executeur = executeur if executeur is not None else db.session
+    cle = cle_lieu(texte)
+    if cle is None:
+        return None
+    if cache is not None and cle in cache:
+        return cache[cle]
+    place_id = executeur.execute(
+        text("SELECT place_variant_place_id FROM Place_variant WHERE place_variant_cle = :cle"), {"cle": cle}
+    ).scalar()
+    if place_id is None:
+        place_id = executeur.execute(text("INSERT INTO Place (place_nom) VALUES (:nom)"), {"nom": texte.strip()}).lastrowid
+        executeur.execute(text("INSERT INTO Place_variant (place_variant_cle, place_variant_place_id) VALUES (:cle, :place_id)"),
+                          {"cle": cle, "place_id": place_id})
+    if cache is not None:
+        cache[cle] = place_id
+    return place_id
+
+
+def colonnes_lieu(colonne, texte, cache=None):
+    """
+    Fonction qui renvoie la valeur de la colonne de l'identifiant du lieu, à enregistrer à côté du texte saisi.
+    :param colonne: colonne de l'identifiant ('poet_birthplace_id', 'poet_deathplace_id' ou 'military_status_lieu_recrutement_id')
+    :type colonne: str
+    :param texte: nom de lieu saisi, ou None
+    :type texte: str or None
+    :param cache: dictionnaire des lieux déjà résolus (voir identifiant_lieu), facultatif
+    :returns: dictionnaire {colonne: identifiant}
+    :rtype: dict
+    """
+    return {colonne: identifiant_lieu(texte, cache=cache)}
+
+
+def charger_gazetteer(connexion, fichier=LIEUX_FICHIER):
+    """
+    Fonction qui charge (ou recharge) le gazetteer : les lieux sont créés ou mis à jour par leur code, et leurs variantes
+    (nom, variantes d'écriture) leur sont rattachées, y compris celles déjà rattachées à un lieu créé à partir d'une saisie.
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :param fichier: chemin du fichier CSV (colonnes code, nom, pays, latitude, longitude, variantes séparées par '|')
+    :type fichier: str
+    :returns: nombre de lieux du gazetteer
+    :rtype: int
+    """
+    nombre = 0
+    with open(fichier, encoding="utf-8", newline="") as flux:
+        for ligne in csv.DictReader(flux):
+            valeurs = {
+                "code": ligne["code"], "nom": ligne["nom"], "pays": ligne["pays"] or None,
+                "latitude": float(ligne["latitude"]) if ligne["latitude"] else None,
+                "longitude": float(ligne["longitude"]) if ligne["longitude"] else None,
+            }
+            place_id = connexion.execute(text("SELECT place_id FROM Place WHERE place_code = :code"), valeurs).scalar()
+            if place_id is None:
+                place_id = connexion.execute(text(
+                    "INSERT INTO Place (place_code, place_nom, place_pays, place_latitude, place_longitude) "
+                    "VALUES (:code, :nom, :pays, :latitude, :longitude)"
+                ), valeurs).lastrowid
+            else:
+                connexion.execute(text(
+                    "UPDATE Place SET place_nom = :nom, place_pays = :pays, place_latitude = :latitude, place_longitude = :longitude "
+                    "WHERE place_id = :place_id"
+                ), dict(valeurs, place_id=place_id))
+            cles = set(cle_lieu(variante) for variante in [ligne["nom"]] + ligne["variantes"].split("|")) - {None}
+            connexion.execute(
+                text("INSERT OR REPLACE INTO Place_variant (place_variant_cle, place_variant_place_id) VALUES (:cle, :place_id)"),
+                [{"cle": cle, "place_id": place_id} for cle in cles]
+            )
+            nombre += 1
+    return nombre
+
+
+def lier_lieux(connexion, lot=500):
+    """
+    Fonction qui (re)calcule l'identifiant du lieu de toutes les notices (étape de migrations.py, commande 'flask lieux'),
+    puis supprime les lieux créés à partir d'une saisie qui ne sont plus utilisés (variantes rattachées depuis au gazetteer).
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :param lot: nombre de lignes par instruction UPDATE exécutée pour plusieurs lignes (executemany)
+    :type lot: int
+    :returns: nombre de textes distincts rattachés à un lieu
+    :rtype: int
+    """
+    cache = {}
+    nombre = 0
+    for table, identifiant, colonne, colonne_lieu in LIEUX:
+        textes = [ligne[0] for ligne in connexion.execute("SELECT DISTINCT {} FROM {}".format(colonne, table))]
+        valeurs = [{"place_id": identifiant_lieu(texte, connexion, cache), "texte": texte} for texte in textes]
+        instruction = text("UPDATE {0} SET {1} = :place_id WHERE {2} IS :texte".format(table, colonne_lieu, colonne))
+        for debut in range(0, len(valeurs), lot):
+            connexion.execute(instruction, valeurs[debut:debut + lot])
+        nombre += len([valeur for valeur in valeurs if valeur["place_id"] is not None])
+    utilises = " UNION ".join("SELECT {0} FROM {1} WHERE {0} IS NOT NULL".format(colonne_lieu, table)
+                              for table, identifiant, colonne, colonne_lieu in LIEUX)
+    inutiles = "SELECT place_id FROM Place WHERE place_code IS NULL AND place_id NOT IN ({})".format(utilises)
+    connexion.execute("DELETE FROM Place_variant WHERE place_variant_place_id IN ({})".format(inutiles))
+    connexion.execute("DELETE FROM Place WHERE place_id IN ({})".format(inutiles))
+    return nombre
+
+
+LISTES_LIEU = ("naissances", "deces", "recrutements")
+#Listes de notices rattachées à un lieu (poètes nés, poètes décédés, ESM recrutés en ce lieu).
+
+# Notices de chaque liste rattachées à un lieu, par identifiant croissant : la pagination par curseur ('AND identifiant > :apres')
+# lit l'index de l'identifiant de lieu, qui contient aussi l'identifiant de la ligne.
+NOM_POETE = "trim(coalesce(Poet.poet_firstname, '') || ' ' || Poet.poet_name)"
+REQUETES_LIEU = {
+    "naissances": ("SELECT Poet.poet_id, {} FROM Poet WHERE Poet.poet_birthplace_id = :place_id".format(NOM_POETE), "Poet.poet_id"),
+    "deces": ("SELECT Poet.poet_id, {} FROM Poet WHERE Poet.poet_deathplace_id = :place_id".format(NOM_POETE), "Poet.poet_id"),
+    "recrutements": (
+        "SELECT Military_status.military_status_id, Poet.poet_id, {} "
+        "FROM Military_status JOIN Poet ON Poet.poet_id = Military_status.military_status_poet_id "
+        "WHERE Military_status.military_status_lieu_recrutement_id = :place_id".format(NOM_POETE),
+        "Military_status.military_status_id"
+    ),
+}
+
+
+def requete_lieux(geolocalises=False, apres=None, limite=None):
+    """
+    Fonction qui renvoie la requête d'une page de lieux rattachés à au moins une notice (voir lieux()), lue sur la clé primaire de Place.
+    :returns: requête SQL avec ses paramètres
+    """
+    facettes = ", ".join("'{}'".format(nom) for nom, table, colonne, expression in FACETTES_LIEUX)
+    conditions = ["EXISTS (SELECT 1 FROM Facette WHERE Facette.facette IN ({}) AND Facette.valeur = CAST(Place.place_id AS TEXT))".format(facettes)]
+    parametres = {}
+    if geolocalises:
+        conditions.append("Place.place_latitude IS NOT NULL")
+    if apres is not None:
+        conditions.append("Place.place_id > :apres")
+        parametres["apres"] = apres
+    requete = ("SELECT Place.place_id, Place.place_nom, Place.place_pays, Place.place_latitude, Place.place_longitude FROM Place "
+               "WHERE " + " AND ".join(conditions) + " ORDER BY Place.place_id")
+    if limite is not None:
+        requete += " LIMIT :limite"
+        parametres["limite"] = limite
+    return text(requete).bindparams(**parametres)
+
+
+def requete_liste_lieu(liste, place_id, apres=None, limite=None):
+    """
+    Fonction qui renvoie la requête d'une page d'une des listes de notices d'un lieu (voir lieu()), lue sur l'index de l'identifiant de lieu.
+    :param liste: 'naissances', 'deces' ou 'recrutements'
+    :type liste: str
+    :returns: requête SQL avec ses paramètres
+    """
+    requete, identifiant = REQUETES_LIEU[liste]
+    parametres = {"place_id": place_id}
+    if apres is not None:
+        requete += " AND {} > :apres".format(identifiant)
+        parametres["apres"] = apres
+    requete += " ORDER BY {}".format(identifiant)
+    if limite is not None:
+        requete += " LIMIT :limite"
+        parametres["limite"] = limite
+    return text(requete).bindparams(**parametres)
+
+
+def lieux(geolocalises=False, apres=None, limite=None):
+    """
+    Fonction qui renvoie les lieux rattachés à au moins une notice, avec le nombre de poètes nés, décédés et recrutés en chaque lieu,
+    par identifiant croissant (pagination par curseur sur l'identifiant). Les lieux sont lus par la clé primaire de Place, et les nombres
+    dans la table Facette (précalculés) pour les seuls lieux de la page, sans parcourir les tables Poet et Military_status.
+    :param geolocalises: si True, seuls les lieux dont les coordonnées sont connues sont renvoyés (affichage sur une carte)
+    :type geolocalises: booléen
+    :param apres: identifiant du dernier lieu de la page précédente, ou None
+    :type apres: int or None
+    :param limite: nombre maximal de lieux, ou None pour tous
+    :type limite: int or None
+    :returns: liste de dictionnaires (place_id, nom, pays, latitude, longitude, nombres)
+    :rtype: list
+    """
+    noms = [nom for nom, table, colonne, expression in FACETTES_LIEUX]
+    facettes = ", ".join("'{}'".format(nom) for nom in noms)
+    resultat = {}
+    for place_id, nom, pays, latitude, longitude in db.session.execute(requete_lieux(geolocalises, apres, limite)):
+        resultat[place_id] = {
+            "place_id": place_id, "nom": nom, "pays": pays, "latitude": latitude, "longitude": longitude,
+            "nombres": {facette: 0 for facette in noms}
+        }
+    if resultat:
+        lignes = db.session.execute(text(
+            "SELECT facette, valeur, nombre FROM Facette WHERE facette IN ({}) AND valeur IN :valeurs".format(facettes)
+        ).bindparams(bindparam("valeurs", expanding=True)), {"valeurs": [str(place_id) for place_id in resultat]})
+        for facette, valeur, nombre in lignes:
+            resultat[int(valeur)]["nombres"][facette] = nombre
+    return list(resultat.values())
+
+
+def lieu(place_id, limite=None, listes=LISTES_LIEU, apres=None):
+    """
+    Fonction qui renvoie un lieu, ses variantes d'écriture et les notices qui y sont rattachées
+    (poètes nés ou décédés en ce lieu, ESM recrutés en ce lieu), lues sur les index des identifiants de lieu, par identifiant croissant.
+    :param place_id: identifiant du lieu
+    :type place_id: int
+    :param limite: nombre maximal de notices par liste, ou None pour toutes
+    :type limite: int or None
+    :param listes: listes à lire (voir LISTES_LIEU)
+    :type listes: tuple
+    :param apres: identifiant (poet_id, ou military_status_id pour les recrutements) de la dernière notice de la page précédente, ou None
+    :type apres: int or None
+    :returns: dictionnaire, ou None si le lieu n'existe pas
+    :rtype: dict or None
+    """
+    ligne = db.session.execute(text(
+        "SELECT place_id, place_nom, place_pays, place_latitude, place_longitude FROM Place WHERE place_id = :place_id"
+    ), {"place_id": place_id}).fetchone()
+    if ligne is None:
+        return None
+    parametres = {"place_id": place_id}
+    resultat = {
+        "place_id": ligne[0], "nom": ligne[1], "pays": ligne[2], "latitude": ligne[3], "longitude": ligne[4],
+        "variantes": [cle for (cle,) in db.session.execute(text(
+            "SELECT place_variant_cle FROM Place_variant WHERE place_variant_place_id = :place_id ORDER BY place_variant_cle"
+        ), parametres)],
+    }
+    for liste in listes:
+        resultat[liste] = db.session.execute(requete_liste_lieu(liste, place_id, apres, limite)).fetchall()
+    return resultat
@@ -0,0 +1,446 @@
+import re
+#Importation du module re pour découper les mots-clés de la recherche.
+from sqlalchemy import or_, and_, text, bindparam, select, union_all, literal, literal_column, func, distinct
+#Importation de l'opérateur 'or' (recherche de repli), de text (requêtes SQL brutes sur la table virtuelle FTS5)
+#et des éléments de SQLAlchemy Core utilisés pour construire la requête des facettes de la recherche structurée.
+from sqlalchemy.exc import OperationalError
+#Importation de l'erreur levée par SQLite lorsque le module FTS5 n'est pas disponible.
+from flask_sqlalchemy import Pagination
+#Importation de la classe Pagination afin de conserver la même interface que .paginate() dans les templates.
+from ..app import db
+#Importation de la base de données
+from . import donnees
+#Importation du module donnees.py (et non de ses classes) : donnees.py importe lui-même ce fichier pour tenir l'index à jour.
+from .compteurs import compter, paginer, compteurs
+#Importation du cache des compteurs et de la pagination, déclarés dans le fichier compteurs.py
+from .statistiques import FACETTES, TABLES
+#Importation de la description des facettes, déclarée dans le fichier statistiques.py
+from .lecture import lecture
+#Importation du modèle de lecture en mémoire, déclaré dans le fichier lecture.py
+
+
+# Table virtuelle FTS5 : une ligne par poète (rowid = poet_id) regroupant le texte de sa notice, de ses publications et de son ESM.
+# Le tokeniseur unicode61 avec remove_diacritics rend la recherche insensible aux accents ("Beziers" trouve "Béziers"),
+# et les index de préfixes accélèrent la recherche par début de mot ("apol" trouve "Apollinaire").
+TABLE_FTS = "Poet_fts"
+
+CREATION_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS Poet_fts USING fts5(
+    nom, prenom, pays, lieux, dates, publications, statuts,
+    tokenize = "unicode61 remove_diacritics {diacritiques}",
+    prefix = '2 3'
+)
+"""
+
+# Requête qui agrège, pour chaque poète, les textes indexés depuis les tables Poet, Publication et Military_status.
+SELECTION_FTS = """
+SELECT Poet.poet_id,
+       Poet.poet_name,
+       Poet.poet_firstname,
+       Poet.poet_country,
+       coalesce(Poet.poet_birthplace, '') || ' ' || coalesce(Poet.poet_deathplace, ''),
+       coalesce(Poet.poet_birthdate, '') || ' ' || coalesce(Poet.poet_deathdate, ''),
+       (SELECT group_concat(coalesce(publication_titre, '') || ' ' || coalesce(publication_genre_litteraire, ''), ' ')
+          FROM Publication WHERE publication_poet_id = Poet.poet_id),
+       (SELECT group_concat(coalesce(military_status_statut, '') || ' ' || coalesce(military_status_grade, '') || ' '
+                            || coalesce(military_status_lieu_recrutement, '') || ' ' || coalesce(military_status_registre_matricule, ''), ' ')
+          FROM Military_status WHERE military_status_poet_id = Poet.poet_id)
+  FROM Poet
+"""
+
+INSERTION_FTS = "INSERT INTO Poet_fts(rowid, nom, prenom, pays, lieux, dates, publications, statuts) " + SELECTION_FTS
+
+# Pondération bm25 des colonnes : une correspondance sur le nom compte davantage qu'une correspondance sur un lieu ou un statut.
+CLASSEMENT_FTS = "bm25(Poet_fts, 10.0, 5.0, 2.0, 2.0, 2.0, 3.0, 1.0)"
+
+#Indique si la table virtuelle a pu être créée (SQLite compilé avec FTS5). Dans le cas contraire, la recherche se replie sur les LIKE.
+FTS_DISPONIBLE = False
+
+
+def creer_index():
+    """
+    Fonction qui crée la table virtuelle FTS5 si elle n'existe pas encore et la remplit à partir des tables existantes.
+    Elle doit être appelée dans un contexte d'application.
+    :returns: True si l'index plein-texte est disponible, sinon False.
+    :rtype: booléen
+    """
+    global FTS_DISPONIBLE
+    existe = db.session.execute(
+        text("SELECT count(*) FROM sqlite_master WHERE name = :nom"), {"nom": TABLE_FTS}
+    ).scalar()
+    if existe:
+        FTS_DISPONIBLE = True
+        return True
+    #Les versions de SQLite antérieures à 3.27 ne connaissent que remove_diacritics 1.
+    for diacritiques in (2, 1):
+        try:
+            db.session.execute(text(CREATION_FTS.format(diacritiques=diacritiques)))
+            db.session.execute(text(INSERTION_FTS))
+            db.session.commit()
+            FTS_DISPONIBLE = True
+            return True
+        except OperationalError:
+            db.session.rollback()
+    FTS_DISPONIBLE = False
+    return False
+
+
+def reconstruire_index():
+    """
+    Fonction qui vide puis reconstruit entièrement l'index plein-texte.
+    :returns: None
+    """
+    if not FTS_DISPONIBLE:
+        return
+    db.session.execute(text("DELETE FROM Poet_fts"))
+    db.session.execute(text(INSERTION_FTS))
+    db.session.commit()
+
+
+def indexer_poete(poet_id):
+    """
+    Fonction qui met à jour la ligne d'un(e) poète(sse) dans l'index plein-texte, à partir de sa notice, de ses publications et de son ESM.
+    La mise à jour est ajoutée à la transaction en cours : c'est à l'appelant de la valider (commit).
+    :param poet_id: identifiant numérique de l'individu
+    :type poet_id: int
+    :returns: None
+    """
+    if not FTS_DISPONIBLE or poet_id is None:
+        return
+    db.session.execute(text("DELETE FROM Poet_fts WHERE rowid = :poet_id"), {"poet_id": poet_id})
+    db.session.execute(text(INSERTION_FTS + " WHERE Poet.poet_id = :poet_id"), {"poet_id": poet_id})
+
+
+def indexer_poetes(poet_ids):
+    """
+    Fonction qui ajoute ou met à jour plusieurs poètes dans l'index plein-texte en deux instructions, sans valider la transaction.
+    Elle est utilisée par l'import en masse (importation.py).
+    :param poet_ids: identifiants numériques des individus
+    :type poet_ids: list
+    :returns: None
+    """
+    if not FTS_DISPONIBLE or not poet_ids:
+        return
+    desindexer_poetes(poet_ids)
+    db.session.execute(
+        text(INSERTION_FTS + " WHERE Poet.poet_id IN :poet_ids").bindparams(bindparam("poet_ids", expanding=True)),
+        {"poet_ids": list(poet_ids)}
+    )
+
+
+def desindexer_poete(poet_id):
+    """
+    Fonction qui retire un(e) poète(sse) de l'index plein-texte. Comme indexer_poete, elle ne valide pas la transaction.
+    :param poet_id: identifiant numérique de l'individu
+    :type poet_id: int
+    :returns: None
+    """
+    if not FTS_DISPONIBLE:
+        return
+    db.session.execute(text("DELETE FROM Poet_fts WHERE rowid = :poet_id"), {"poet_id": poet_id})
+
+
+def desindexer_poetes(poet_ids):
+    """
+    Fonction qui retire plusieurs poètes de l'index plein-texte en une seule instruction, sans valider la transaction.
+    :param poet_ids: identifiants numériques des individus
+    :type poet_ids: list
+    :returns: None
+    """
+    if not FTS_DISPONIBLE or not poet_ids:
+        return
+    db.session.execute(
+        text("DELETE FROM Poet_fts WHERE rowid IN :poet_ids").bindparams(bindparam("poet_ids", expanding=True)),
+        {"poet_ids": list(poet_ids)}
+    )
+
+
+def expression_fts(motclef):
+    """
+    Fonction qui transforme la saisie de l'utilisateur en expression MATCH pour FTS5 : chaque mot est mis entre guillemets
+    (pour neutraliser la syntaxe FTS5) et suivi de * pour la recherche par préfixe. Les mots sont combinés par un ET implicite.
+    :param motclef: mot(s)-clé(s) saisi(s) dans la barre de recherche
+    :type motclef: str
+    :returns: expression MATCH, ou None si la saisie ne contient aucun mot
+    :rtype: str or None
+    """
+    mots = re.findall(r"\w+", motclef)
+    if not mots:
+        return None
+    return " ".join('"{}"*'.format(mot) for mot in mots)
+
+
+def recherche_simple(motclef):
+    """
+    Fonction de repli qui construit la requête par LIKE sur les tables Poet, Publication et Military_status,
+    utilisée lorsque SQLite ne dispose pas du module FTS5.
+    :param motclef: mot-clé saisi dans la barre de recherche
+    :type motclef: str
+    :returns: requête SQLAlchemy sur la table Poet
+    """
+    Poet, Publication, Military_status = donnees.Poet, donnees.Publication, donnees.Military_status
+    return Poet.query.filter(
+        or_(Poet.poet_name.like("%{}%".format(motclef)),
+        Poet.poet_firstname.like("%{}%".format(motclef)),
+        Poet.poet_country.like("%{}%".format(motclef)),
+        Poet.poet_birthplace.like("%{}%".format(motclef)),
+        Poet.poet_deathplace.like("%{}%".format(motclef)),
+        Poet.poet_birthdate.like("%{}%".format(motclef)),
+        Poet.poet_deathdate.like("%{}%".format(motclef)),
+        Poet.link_publication.any((Publication.publication_titre).like("%{}%".format(motclef))),
+        Poet.link_publication.any((Publication.publication_genre_litteraire).like("%{}%".format(motclef))),
+        Poet.link_military_status.any((Military_status.military_status_statut).like("%{}%".format(motclef))),
+        Poet.link_military_status.any((Military_status.military_status_grade).like("%{}%".format(motclef))),
+        Poet.link_military_status.any((Military_status.military_status_lieu_recrutement).like("%{}%".format(motclef))),
+        Poet.link_military_status.any((Military_status.military_status_registre_matricule).like("%{}%".format(motclef)))
+        )
+    )
+
+
+def rechercher(motclef, page, par_page):
+    """
+    Fonction de recherche plein-texte : renvoie les poètes correspondant aux mots-clés, classés par pertinence (bm25).
+    :param motclef: mot(s)-clé(s) saisi(s) dans la barre de recherche
+    :type motclef: str
+    :param page: numéro de la page demandée
+    :type page: int
+    :param par_page: nombre de résultats par page
+    :type par_page: int
+    :returns: objet Pagination (items, total, page, iter_pages) identique à celui de .paginate()
+    :rtype: Pagination
+    """
+    if not FTS_DISPONIBLE:
+        return paginer(recherche_simple(motclef), page, par_page, ("recherche", motclef))
+
+    expression = expression_fts(motclef)
+    if expression is None:
+        return Pagination(None, page, par_page, 0, [])
+
+    #Le nombre total de résultats est mis en cache : seule la page demandée est relue lorsque l'on passe d'une page à l'autre.
+    total = compter(("recherche", expression), lambda: db.session.execute(
+        text("SELECT count(*) FROM Poet_fts WHERE Poet_fts MATCH :expression"), {"expression": expression}
+    ).scalar())
+    identifiants = [ligne[0] for ligne in db.session.execute(
+        text("SELECT rowid FROM Poet_fts WHERE Poet_fts MATCH :expression ORDER BY " + CLASSEMENT_FTS
+             + " LIMIT :limite OFFSET :decalage"),
+        {"expression": expression, "limite": par_page, "decalage": (page - 1) * par_page}
+    )]
+    #Les poètes de la page sont lus dans le modèle de lecture (visiteur anonyme) ou chargés en une seule requête,
+    #puis remis dans l'ordre de pertinence.
+    if lecture.utilisable():
+        return Pagination(None, page, par_page, total, lecture.poetes_par_identifiants(identifiants))
+    Poet = donnees.Poet
+    poetes = {poete.poet_id: poete for poete in Poet.query.filter(Poet.poet_id.in_(identifiants))} if identifiants else {}
+    resultats = [poetes[identifiant] for identifiant in identifiants if identifiant in poetes]
+    return Pagination(None, page, par_page, total, resultats)
+
+
+# RECHERCHE STRUCTURÉE #
+# Les filtres (nationalité, intervalles d'années de naissance et de décès, grade, statut, lieu de recrutement, genre littéraire)
+# se combinent par un ET, éventuellement avec des mots-clés. Chaque filtre s'appuie sur un index : ix_poet_pays, les index
+# des dates normalisées (ix_poet_naissance, ix_poet_deces, voir dates.py), et les index (valeur, identifiant du poète) des tables
+# Military_status et Publication. Le nombre de résultats et les facettes des résultats sont calculés par une seule requête.
+
+# Filtres textuels : paramètre de l'URL -> (table, colonne comparée).
+FILTRES_TEXTE = {
+    "country": ("Poet", "poet_country"),
+    "grade": ("Military_status", "military_status_grade"),
+    "statut": ("Military_status", "military_status_statut"),
+    "lieu_recrutement": ("Military_status", "military_status_lieu_recrutement"),
+    "genre": ("Publication", "publication_genre_litteraire"),
+}
+
+# Filtres par année : paramètre de l'URL -> (colonne de l'année normalisée du poète, borne inférieure ou supérieure).
+FILTRES_ANNEES = {
+    "born_after": ("poet_birth_year", ">="),
+    "born_before": ("poet_birth_year", "<="),
+    "died_after": ("poet_death_year", ">="),
+    "died_before": ("poet_death_year", "<="),
+}
+
+# Paramètres de filtre correspondant à chaque facette, pour transformer une valeur de facette en lien de recherche.
+FILTRES_FACETTES = {
+    "country": "country",
+    "birth_decade": ("born_after", "born_before"),
+    "death_decade": ("died_after", "died_before"),
+    "grade": "grade",
+    "statut": "statut",
+    "genre": "genre",
+}
+
+
+def lire_filtres(arguments):
+    """
+    Fonction qui lit les filtres de la recherche structurée dans les paramètres d'une requête.
+    :param arguments: paramètres de la requête (request.args)
+    :returns: dictionnaire des filtres renseignés
+    :rtype: dict
+    :raises ValueError: si une borne d'année n'est pas un entier
+    """
+    filtres = {}
+    for nom in FILTRES_TEXTE:
+        valeur = arguments.get(nom, "").strip()
+        if valeur:
+            filtres[nom] = valeur
+    for nom in FILTRES_ANNEES:
+        valeur = arguments.get(nom, "").strip()
+        if valeur:
+            if not valeur.isdigit():
+                raise ValueError("Le paramètre '{}' doit être une année".format(nom))
+            filtres[nom] = int(valeur)
+    return filtres
+
+
+def conditions_recherche(filtres, motclef=None):
+    """
+    Fonction qui traduit les filtres et les mots-clés en conditions sur la table Poet, combinées par un ET.
+    :param filtres: dictionnaire renvoyé par lire_filtres()
+    :type filtres: dict
+    :param motclef: mot(s)-clé(s), facultatif(s)
+    :type motclef: str or None
+    :returns: liste de conditions SQLAlchemy
+    :rtype: list
+    """
+    Poet = donnees.Poet
+    tables = db.Model.metadata.tables
+    conditions = []
+    for nom, valeur in filtres.items():
+        if nom in FILTRES_TEXTE:
+            table, colonne = FILTRES_TEXTE[nom]
+            if table == "Poet":
+                conditions.append(Poet.__table__.c[colonne] == valeur)
+            else:
+                #Le poète a au moins une ligne ayant cette valeur : lecture de l'index (valeur, identifiant du poète) de la table.
+                identifiant, poete = TABLES[table]
+                conditions.append(Poet.poet_id.in_(
+                    select([tables[table].c[poete]]).where(tables[table].c[colonne] == valeur)
+                ))
+        else:
+            colonne, operateur = FILTRES_ANNEES[nom]
+            expression = Poet.__table__.c[colonne]
+            conditions.append(expression >= valeur if operateur == ">=" else expression <= valeur)
+    if motclef:
+        if FTS_DISPONIBLE:
+            expression = expression_fts(motclef)
+            if expression is None:
+                conditions.append(literal(False))
+            else:
+                conditions.append(Poet.poet_id.in_(
+                    select([literal_column("rowid")]).select_from(text("Poet_fts"))
+                    .where(text("Poet_fts MATCH :expression").bindparams(expression=expression))
+                ))
+        else:
+            conditions.append(recherche_simple(motclef).whereclause)
+    return conditions
+
+
+def facettes_resultats(conditions):
+    """
+    Fonction qui calcule, en une seule requête, le nombre de résultats et les facettes des résultats (nombre de poètes par valeur).
+    Les poètes retenus forment une expression de table commune (WITH resultats AS ...), lue par chaque facette.
+    :param conditions: liste de conditions renvoyée par conditions_recherche()
+    :type conditions: list
+    :returns: tuple (nombre de résultats, dictionnaire {facette: [(valeur, nombre), ...]} par nombre décroissant)
+    :rtype: tuple
+    """
+    Poet = donnees.Poet
+    tables = db.Model.metadata.tables
+    resultats = select([Poet.poet_id, Poet.poet_country, Poet.poet_birth_year, Poet.poet_death_year]) \
+        .where(and_(*conditions)).cte("resultats")
+    selections = [select([literal(""), literal_column("NULL"), func.count()]).select_from(resultats)]
+    for nom, table, colonne, expression in FACETTES:
+        if table == "Poet":
+            valeur = literal_column(expression("resultats." + colonne))
+            selections.append(
+                select([literal(nom), valeur, func.count()]).select_from(resultats).where(valeur.isnot(None)).group_by(valeur)
+            )
+        else:
+            identifiant, poete = TABLES[table]
+            valeur = literal_column(expression(table + "." + colonne))
+            selections.append(
+                select([literal(nom), valeur, func.count(distinct(tables[table].c[poete]))])
+                .where(and_(tables[table].c[poete].in_(select([resultats.c.poet_id])), valeur.isnot(None)))
+                .group_by(valeur)
+            )
+    total = 0
+    facettes = {nom: [] for nom, table, colonne, expression in FACETTES}
+    for nom, valeur, nombre in db.session.execute(union_all(*selections)):
+        if nom == "":
+            total = nombre
+        else:
+            facettes[nom].append((valeur, nombre))
+    for valeurs in facettes.values():
+        valeurs.sort(key=lambda element: (-element[1], element[0]))
+    return total, facettes
+
+
+def facettes_recherche(filtres, motclef=None):
+    """
+    Fonction qui renvoie le nombre de résultats et les facettes d'une recherche, mis en cache avec les compteurs
+    (le cache est vidé à chaque écriture dans la base).
+    :param filtres: dictionnaire renvoyé par lire_filtres()
+    :type filtres: dict
+    :param motclef: mot(s)-clé(s), facultatif(s)
+    :type motclef: str or None
+    :returns: tuple (nombre de résultats, facettes)
+    :rtype: tuple
+    """
+    cle = ("facettes", tuple(sorted(filtres.items())), motclef)
+    return compteurs.calculer(cle, lambda: facettes_resultats(conditions_recherche(filtres, motclef)))
+
+
+def recherche_structuree(filtres, motclef=None, page=1, par_page=20, options=()):
+    """
+    Fonction de recherche structurée : renvoie les poètes qui satisfont tous les filtres (et les mots-clés), par ordre alphabétique,
+    ainsi que les facettes des résultats. Passer d'une page à l'autre ne coûte qu'une lecture de la page demandée,
+    le nombre de résultats et les facettes étant en cache.
+    :param filtres: dictionnaire renvoyé par lire_filtres()
+    :type filtres: dict
+    :param motclef: mot(s)-clé(s), facultatif(s)
+    :type motclef: str or None
+    :param page: numéro de la page demandée
+    :type page: int
+    :param par_page: nombre de résultats par page
+    :type par_page: int
+    :param options: options de chargement des relations (par exemple Poet.chargement_complet() pour l'API)
+    :type options: tuple
+    :returns: tuple (objet Pagination, facettes)
+    :rtype: tuple
+    """
+    Poet = donnees.Poet
+    total, facettes = facettes_recherche(filtres, motclef)
+    elements = []
+    if total and lecture.utilisable():
+        #Seuls les identifiants de la page sont lus dans la base ; les notices viennent du modèle de lecture.
+        identifiants = [ligne[0] for ligne in db.session.query(Poet.poet_id).filter(*conditions_recherche(filtres, motclef))
+                        .order_by(Poet.poet_name, Poet.poet_firstname).limit(par_page).offset((page - 1) * par_page)]
+        elements = lecture.poetes_par_identifiants(identifiants)
+    elif total:
+        elements = Poet.query.options(*options).filter(*conditions_recherche(filtres, motclef)).order_by(Poet.poet_name, Poet.poet_firstname) \
+            .limit(par_page).offset((page - 1) * par_page).all()
+    return Pagination(None, page, par_page, total, elements), facettes
+
+
+def liens_facettes(facettes, arguments):
+    """
+    Fonction qui associe à chaque valeur de facette les paramètres de la recherche restreinte à cette valeur
+    (filtres courants, plus le filtre de la facette ; une décennie devient un intervalle d'années).
+    :param facettes: dictionnaire {facette: [(valeur, nombre), ...]}
+    :type facettes: dict
+    :param arguments: paramètres de la recherche courante (sans le numéro de page)
+    :type arguments: dict
+    :returns: dictionnaire {facette: [(valeur, nombre, paramètres), ...]}
+    :rtype: dict
+    """
+    liens = {}
+    for facette, valeurs in facettes.items():
+        filtre = FILTRES_FACETTES[facette]
+        liens[facette] = []
+        for valeur, nombre in valeurs:
+            parametres = dict(arguments)
+            if isinstance(filtre, tuple):
+                parametres[filtre[0]], parametres[filtre[1]] = int(valeur), int(valeur) + 9
+            else:
+                parametres[filtre] = valeur
+            liens[facette].append((valeur, nombre, parametres))
+    return liens
@@ -0,0 +1,188 @@
+from sqlalchemy import text
+#Importation de text pour les requêtes SQL brutes sur la table Facette.
+from ..app import db
+#Importation de la base de données
+
+# STATISTIQUES (FACETTES) #
+# La table Facette contient, pour chaque facette (pays, décennie de naissance, grade...) et chaque valeur, le nombre de poètes concernés.
+# Elle est tenue à jour par des déclencheurs (triggers) SQLite sur les tables Poet, Publication et Military_status :
+# chaque écriture, qu'elle vienne des formulaires, de l'import en masse ou d'une suppression groupée, ajuste les compteurs
+# dans la même transaction. Les statistiques sont donc lues telles quelles, sans GROUP BY sur toute la base à chaque requête.
+# Une même valeur n'est comptée qu'une fois par poète : deux ESM de grade 'Lieutenant' pour un même poète comptent pour un.
+
+CREATION_FACETTE = """
+CREATE TABLE IF NOT EXISTS Facette (
+    facette TEXT NOT NULL,
+    valeur TEXT NOT NULL,
+    nombre INTEGER NOT NULL,
+    PRIMARY KEY (facette, valeur)
+) WITHOUT ROWID
+"""
+
+
+def decennie(colonne):
+    """
+    Fonction qui renvoie l'expression SQL de la décennie (texte, par exemple '1880') d'une année normalisée (voir dates.py).
+    Les dates dont l'année n'a pas pu être lue (NULL) donnent NULL.
+    :param colonne: expression SQL de l'année
+    :type colonne: str
+    :rtype: str
+    """
+    return "CAST({} / 10 * 10 AS TEXT)".format(colonne)
+
+
+def valeur_texte(colonne):
+    """
+    Fonction qui renvoie l'expression SQL d'une valeur textuelle, NULL si elle est vide.
+    :param colonne: expression SQL de la colonne
+    :type colonne: str
+    :rtype: str
+    """
+    return "nullif(trim({}), '')".format(colonne)
+
+
+# Tables observées : (table, clé primaire, colonne de l'identifiant du poète).
+TABLES = {
+    "Poet": ("poet_id", "poet_id"),
+    "Publication": ("publication_id", "publication_poet_id"),
+    "Military_status": ("military_status_id", "military_status_poet_id"),
+}
+
+# Facettes : nom (également utilisé par l'API), table, colonne lue et fonction qui construit l'expression de la valeur.
+FACETTES = [
+    ("country", "Poet", "poet_country", valeur_texte),
+    ("birth_decade", "Poet", "poet_birth_year", decennie),
+    ("death_decade", "Poet", "poet_death_year", decennie),
+    ("grade", "Military_status", "military_status_grade", valeur_texte),
+    ("statut", "Military_status", "military_status_statut", valeur_texte),
+    ("genre", "Publication", "publication_genre_litteraire", valeur_texte),
+]
+
+NOMS_FACETTES = [nom for nom, table, colonne, expression in FACETTES]
+
+
+def valeur_identifiant(colonne):
+    """
+    Fonction qui renvoie l'expression SQL d'un identifiant (par exemple celui d'un lieu) sous forme de texte, NULL s'il est absent.
+    :param colonne: expression SQL de la colonne
+    :type colonne: str
+    :rtype: str
+    """
+    return "CAST({} AS TEXT)".format(colonne)
+
+
+# Facettes des lieux (voir lieux.py) : nombre de poètes par lieu de naissance, de décès et de recrutement.
+# Elles sont tenues à jour par les mêmes déclencheurs, mais ne font partie ni des statistiques ni des facettes de la recherche.
+FACETTES_LIEUX = [
+    ("birthplace", "Poet", "poet_birthplace_id", valeur_identifiant),
+    ("deathplace", "Poet", "poet_deathplace_id", valeur_identifiant),
+    ("recruitment_place", "Military_status", "military_status_lieu_recrutement_id", valeur_identifiant),
+]
+
+
+def instructions_ajout(facette, table, colonne, expression):
+    """
+    Fonction qui renvoie les instructions d'un déclencheur qui comptent la nouvelle ligne (NEW), si son poète n'a pas déjà cette valeur.
+    :rtype: str
+    """
+    identifiant, poete = TABLES[table]
+    return """
+    INSERT OR IGNORE INTO Facette (facette, valeur, nombre) SELECT '{f}', {nouvelle}, 0 WHERE {nouvelle} IS NOT NULL;
+    UPDATE Facette SET nombre = nombre + 1 WHERE facette = '{f}' AND valeur = {nouvelle}
+       AND NOT EXISTS (SELECT 1 FROM {t} AS autre WHERE autre.{p} = NEW.{p} AND autre.{i} != NEW.{i} AND {autre} = {nouvelle});""".format(
+        f=facette, t=table, i=identifiant, p=poete,
+        nouvelle=expression("NEW." + colonne), autre=expression("autre." + colonne)
+    )
+
+
+def instructions_retrait(facette, table, colonne, expression):
+    """
+    Fonction qui renvoie les instructions d'un déclencheur qui décomptent l'ancienne ligne (OLD), si son poète n'a plus cette valeur.
+    :rtype: str
+    """
+    identifiant, poete = TABLES[table]
+    return """
+    UPDATE Facette SET nombre = nombre - 1 WHERE facette = '{f}' AND valeur = {ancienne}
+       AND NOT EXISTS (SELECT 1 FROM {t} AS autre WHERE autre.{p} = OLD.{p} AND autre.{i} != OLD.{i} AND {autre} = {ancienne});
+    DELETE FROM Facette WHERE facette = '{f}' AND valeur = {ancienne} AND nombre <= 0;""".format(
+        f=facette, t=table, i=identifiant, p=poete,
+        ancienne=expression("OLD." + colonne), autre=expression("autre." + colonne)
+    )
+
+
+def declencheurs():
+    """
+    Fonction qui renvoie les instructions CREATE TRIGGER des trois tables observées (insertion, modification, suppression).
+    :returns: liste d'instructions SQL
+    :rtype: list
+    """
+    instructions = []
+    for table, (identifiant, poete) in TABLES.items():
+        facettes = [facette for facette in FACETTES + FACETTES_LIEUX if facette[1] == table]
+        colonnes = sorted(set([colonne for nom, t, colonne, expression in facettes] + [poete]))
+        ajout = "".join(instructions_ajout(*facette) for facette in facettes)
+        retrait = "".join(instructions_retrait(*facette) for facette in facettes)
+        instructions.append("CREATE TRIGGER IF NOT EXISTS facette_{0}_insertion AFTER INSERT ON {0} BEGIN{1}\nEND".format(table, ajout))
+        instructions.append("CREATE TRIGGER IF NOT EXISTS facette_{0}_suppression AFTER DELETE ON {0} BEGIN{1}\nEND".format(table, retrait))
+        instructions.append("CREATE TRIGGER IF NOT EXISTS facette_{0}_modification AFTER UPDATE OF {1} ON {0} BEGIN{2}{3}\nEND".format(
+            table, ", ".join(colonnes), retrait, ajout))
+    return instructions
+
+
+def remplissage():
+    """
+    Fonction qui renvoie l'instruction qui recalcule toutes les facettes à partir des tables (un GROUP BY par facette).
+    :rtype: str
+    """
+    selections = []
+    for facette, table, colonne, expression in FACETTES + FACETTES_LIEUX:
+        identifiant, poete = TABLES[table]
+        valeur = expression(colonne)
+        selections.append("SELECT '{f}', {v}, count(DISTINCT {p}) FROM {t} WHERE {v} IS NOT NULL GROUP BY {v}".format(
+            f=facette, v=valeur, p=poete, t=table))
+    return "INSERT INTO Facette (facette, valeur, nombre) " + " UNION ALL ".join(selections)
+
+
+def creer_statistiques(connexion):
+    """
+    Fonction qui crée la table Facette et ses déclencheurs, puis la remplit à partir des tables existantes (étape de migrations.py).
+    Les déclencheurs existants sont remplacés, pour qu'une modification de FACETTES soit prise en compte en rejouant cette fonction.
+    :param connexion: connexion SQLAlchemy ouverte sur la base
+    :returns: None
+    """
+    connexion.execute(CREATION_FACETTE)
+    anciens = [ligne[0] for ligne in connexion.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'facette%'")]
+    for nom in anciens:
+        connexion.execute('DROP TRIGGER "{}"'.format(nom))
+    for instruction in declencheurs():
+        connexion.execute(instruction)
+    connexion.execute("DELETE FROM Facette")
+    connexion.execute(remplissage())
+
+
+def reconstruire_statistiques():
+    """
+    Fonction qui recalcule entièrement la table Facette (par exemple après une modification de la base faite hors de l'application,
+    avec les déclencheurs désactivés).
+    :returns: None
+    """
+    db.session.execute(text("DELETE FROM Facette"))
+    db.session.execute(text(remplissage()))
+    db.session.commit()
+
+
+def statistiques(facettes=None):
+    """
+    Fonction qui lit les statistiques précalculées : pour chaque facette, les valeurs et leur nombre de poètes, par ordre décroissant.
+    :param facettes: noms des facettes demandées (toutes par défaut)
+    :type facettes: list or None
+    :returns: dictionnaire {facette: [(valeur, nombre), ...]}
+    :rtype: dict
+    """
+    facettes = [facette for facette in NOMS_FACETTES if facettes is None or facette in facettes]
+    resultat = {facette: [] for facette in facettes}
+    lignes = db.session.execute(text("SELECT facette, valeur, nombre FROM Facette ORDER BY facette, nombre DESC, valeur"))
+    for facette, valeur, nombre in lignes:
+        if facette in resultat:
+            resultat[facette].append((valeur, nombre))
+    return resultat
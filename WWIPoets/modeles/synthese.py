@@ -0,0 +1,312 @@
+import csv
+#Importation du module csv pour lire les noms de lieux du gazetteer.
+import random
+#Importation du module random : toutes les valeurs sont tirées d'un générateur initialisé par une graine, pour des bases reproductibles.
+from itertools import accumulate
+#Importation d'accumulate pour calculer une fois pour toutes les poids cumulés des tirages les plus fréquents.
+from .importation import Importation, IMPORT_LOT
+#Importation de l'import en masse, déclaré dans le fichier importation.py : les notices générées suivent le chemin d'écriture de l'application.
+from .unicite import uniques, NOM
+#Importation de l'index d'unicité en mémoire, pour ne pas générer un couple (nom, prénom) déjà enregistré.
+from ..constantes import LIEUX_FICHIER
+#Importation du chemin du gazetteer fourni avec l'application
+
+# PROSOPOGRAPHIE SYNTHÉTIQUE #
+# Génère des notices de poètes (avec publications et ESM) pour mesurer les performances de l'application sur des bases
+# de 1 000, 100 000 ou 1 000 000 de notices (voir banc.py et la commande 'flask generer').
+# Les distributions reprennent celles de la base d'origine : nationalité française très majoritaire, naissances autour de 1885,
+# un quart des poètes morts pendant la guerre, une ESM pour trois poètes sur quatre (mobilisés, civils, dispensés...),
+# deux publications en moyenne (surtout de la poésie) et des lieux dont quelques-uns concentrent la plupart des notices.
+# Les dates sont saisies dans les formats rencontrés dans la base (JJ/MM/AAAA, AAAA, 'vers AAAA'...) et les lieux
+# sous leurs variantes : la normalisation des dates et le rattachement au gazetteer travaillent donc comme en production.
+# Les enregistrements ont le format de l'import (importation.py) et sont insérés par lots avec Importation.
+
+GRAINE = 1914
+#Graine par défaut du générateur.
+
+NATIONALITES = [
+    ("française", 820), ("belge", 50), ("française par naturalisation", 20), ("britannique", 20), ("suisse", 20),
+    ("italienne", 15), ("américaine", 10), ("allemande", 10), ("canadienne", 5), ("autre", 30),
+]
+PRENOMS = [
+    "Jean", "Louis", "Pierre", "Henri", "Marcel", "André", "Georges", "Paul", "René", "Charles", "Joseph", "Émile",
+    "Lucien", "Maurice", "Albert", "Raymond", "Gabriel", "Guillaume", "Jules", "Léon", "Fernand", "Roger", "Robert",
+    "Edmond", "Victor", "Eugène", "Auguste", "Gaston", "Francis", "Max", "Marie", "Jeanne", "Marguerite", "Lucie",
+    "Louise", "Anne", "Cécile", "Gabrielle",
+]
+SYLLABES = [
+    "bar", "bel", "ber", "bou", "cha", "cor", "dan", "del", "du", "fa", "fer", "gal", "gar", "gi", "lan", "la", "le",
+    "lor", "mar", "mau", "mon", "mor", "nau", "pel", "per", "pi", "ra", "ren", "ri", "ro", "sau", "ser", "tal", "ter",
+    "tho", "val", "ver", "vi", "bon", "cla",
+]
+FINALES = ["", "t", "d", "n", "l", "ard", "on", "et", "ier", "eau", "ot", "in", "and", "ais", "ac"]
+ANNEES_GUERRE = [(1914, 20), (1915, 30), (1916, 20), (1917, 15), (1918, 15)]
+STATUTS = [
+    ("mobilisé", 35), ("civil", 14), ("dispensé en raison de son âge", 12), ("engagé volontaire", 10),
+    ("réformé ou exempté", 9), ("réserviste reprenant du service", 6), ("militaire de carrière", 3),
+]
+STATUTS_MILITAIRES = {"mobilisé", "engagé volontaire", "réserviste reprenant du service", "militaire de carrière"}
+GRADES = [
+    ("soldat 2e classe", 21), ("soldat", 13), ("sous-lieutenant", 15), ("sergent", 8), ("lieutenant", 5), ("caporal", 5),
+    ("caporal, sergent", 5), ("capitaine", 3), ("officier", 3), ("médecin aide-major", 3), ("brancardier", 2),
+]
+GENRES = [
+    ("poésie", 80), ("prose", 8), ("journalisme et critique", 4), ("correspondance", 3), ("théâtre", 2), (None, 3),
+]
+MOTS_TITRES = [
+    "Chants", "Poèmes", "Vers", "Élégies", "Stances", "Carnets", "Lettres", "Souvenirs", "Odes", "Ballades", "Sonnets",
+    "Heures", "Cris", "Images", "Feux",
+]
+COMPLEMENTS_TITRES = [
+    "de la tranchée", "du front", "de guerre", "d'un soldat", "de l'Argonne", "de Verdun", "de la Somme", "du poilu",
+    "de l'exil", "de la paix", "du matin", "des morts", "de l'arrière", "d'hier", "du bivouac", "de la Marne",
+]
+FRONTS = ["en Argonne", "en Champagne", "à Verdun", "sur la Somme", "en Artois", "dans les Vosges", "aux Dardanelles", "en Flandre"]
+PHRASES = [
+    "{prenom} {nom} publie ses premiers vers dans de petites revues avant la guerre.",
+    "La mobilisation générale l'arrache à ses études de lettres.",
+    "Au front, {prenom} {nom} tient un carnet où alternent poèmes et notes sur la vie des tranchées.",
+    "Blessé {front}, il est évacué vers un hôpital de l'arrière où il écrit une partie de son œuvre.",
+    "Ses poèmes de guerre paraissent en recueil, salués par la critique pour leur sobriété.",
+    "Proche des milieux symbolistes, il fréquente les cafés littéraires de la capitale.",
+    "Son expérience du combat {front} nourrit une poésie de témoignage.",
+    "Après l'armistice, il se consacre au journalisme et à la critique littéraire.",
+    "Sa correspondance avec sa famille constitue un témoignage précieux sur la vie quotidienne des soldats.",
+    "Il collabore à plusieurs journaux de tranchées.",
+    "Son œuvre, longtemps oubliée, a été redécouverte lors du centenaire de la Grande Guerre.",
+    "Il s'engage volontairement dès août 1914.",
+]
+
+
+def lieux_gazetteer(fichier=LIEUX_FICHIER):
+    """
+    Fonction qui lit les noms des lieux du gazetteer, avec leurs variantes d'écriture.
+    :param fichier: chemin du gazetteer CSV
+    :type fichier: str
+    :returns: liste de listes (nom canonique puis variantes), dans l'ordre du fichier
+    :rtype: list
+    """
+    with open(fichier, encoding="utf-8", newline="") as flux:
+        return [[ligne["nom"]] + [variante for variante in (ligne["variantes"] or "").split("|") if variante]
+                for ligne in csv.DictReader(flux)]
+
+
+def base36(nombre):
+    """
+    Fonction qui écrit un entier positif en base 36 (chiffres et lettres minuscules), pour des identifiants externes courts.
+    :param nombre: entier positif ou nul
+    :type nombre: int
+    :rtype: str
+    """
+    chiffres = "0123456789abcdefghijklmnopqrstuvwxyz"
+    texte = ""
+    while True:
+        nombre, reste = divmod(nombre, 36)
+        texte = chiffres[reste] + texte
+        if nombre == 0:
+            return texte
+
+
+class Synthese:
+    """
+    Générateur de notices synthétiques. Deux générateurs créés avec la même graine et le même début produisent
+    les mêmes notices, dans le même ordre.
+    """
+
+    def __init__(self, graine=GRAINE, debut=0, existe=None):
+        """
+        :param graine: graine du générateur aléatoire
+        :type graine: int
+        :param debut: numéro de la première notice : les identifiants externes sont dérivés du numéro de la notice,
+            un début différent donne des identifiants différents (par exemple pour compléter une base déjà générée)
+        :type debut: int
+        :param existe: fonction (nom, prénom) -> booléen qui signale un couple déjà enregistré, à ne pas générer de nouveau
+        """
+        self.alea = random.Random(graine)
+        self.numero = debut
+        self.existe = existe or (lambda nom, prenom: False)
+        self.noms = set()
+        self.lieux = lieux_gazetteer()
+        #Loi de Zipf : le lieu de rang r est tiré avec un poids 1/r (Paris, en tête du gazetteer, est le plus fréquent).
+        self.poids_lieux = list(accumulate(1 / rang for rang in range(1, len(self.lieux) + 1)))
+        self.poids_prenoms = list(accumulate(1 / rang for rang in range(1, len(PRENOMS) + 1)))
+
+    def choix(self, valeurs_poids):
+        """
+        Fonction qui tire une valeur dans une liste de tuples (valeur, poids).
+        """
+        valeurs, poids = zip(*valeurs_poids)
+        return self.alea.choices(valeurs, weights=poids)[0]
+
+    def nom(self):
+        """
+        Fonction qui compose un nom de famille de deux ou trois syllabes.
+        :rtype: str
+        """
+        syllabes = self.alea.choices(SYLLABES, k=3 if self.alea.random() < 0.4 else 2)
+        return ("".join(syllabes) + self.alea.choice(FINALES)).capitalize()
+
+    def identite(self):
+        """
+        Fonction qui tire un couple (nom, prénom) qui n'a encore été ni généré ni enregistré dans la base.
+        :rtype: tuple
+        """
+        while True:
+            nom, prenom = self.nom(), self.alea.choices(PRENOMS, cum_weights=self.poids_prenoms)[0]
+            if (nom, prenom) not in self.noms and not self.existe(nom, prenom):
+                self.noms.add((nom, prenom))
+                return nom, prenom
+
+    def lieu(self, inconnu=0.15):
+        """
+        Fonction qui tire un lieu : un lieu du gazetteer (parfois sous une de ses variantes), ou un village inconnu du gazetteer.
+        :param inconnu: probabilité de tirer un lieu absent du gazetteer
+        :type inconnu: float
+        :rtype: str
+        """
+        if self.alea.random() < inconnu:
+            return self.nom()
+        formes = self.alea.choices(self.lieux, cum_weights=self.poids_lieux)[0]
+        return self.alea.choice(formes) if self.alea.random() < 0.2 else formes[0]
+
+    def date(self, annee):
+        """
+        Fonction qui écrit une date de l'année donnée dans l'un des formats saisis dans la base.
+        :param annee: année de la date
+        :type annee: int
+        :rtype: str
+        """
+        tirage = self.alea.random()
+        jour, mois = self.alea.randint(1, 28), self.alea.randint(1, 12)
+        if tirage < 0.70:
+            return "{:02d}/{:02d}/{}".format(jour, mois, annee)
+        if tirage < 0.85:
+            return str(annee)
+        if tirage < 0.90:
+            return "vers {}".format(annee)
+        if tirage < 0.95:
+            return "{:02d}/{}".format(mois, annee)
+        return "{:02d}.{:02d}.{}".format(jour, mois, annee)
+
+    def publications(self, login, naissance, deces):
+        """
+        Fonction qui génère les publications d'un(e) poète(sse) : aucune pour un tiers des poètes, sinon une loi géométrique
+        de moyenne 3 (deux publications par poète en moyenne), datées entre ses 16 ans et sa mort, surtout pendant et après la guerre.
+        :rtype: list
+        """
+        if self.alea.random() < 1 / 3:
+            return []
+        nombre = 1
+        while nombre < 20 and self.alea.random() < 2 / 3:
+            nombre += 1
+        debut, fin = naissance + 16, min(deces or 1960, 1960)
+        publications = []
+        for numero in range(nombre):
+            annee = int(self.alea.triangular(debut, max(debut, fin), min(max(debut, 1918), fin))) if fin > debut else debut
+            publications.append({
+                "titre": "{} {}".format(self.alea.choice(MOTS_TITRES), self.alea.choice(COMPLEMENTS_TITRES)),
+                "date": str(annee) if self.alea.random() < 0.8 else self.date(annee),
+                "genre_litteraire": self.choix(GENRES),
+                "login_wiki_pub": login + "p" + base36(numero) if self.alea.random() < 0.5 else None,
+            })
+        return publications
+
+    def statuts(self, login):
+        """
+        Fonction qui génère l'ESM d'un(e) poète(sse) (trois poètes sur quatre en ont une).
+        :rtype: list
+        """
+        if self.alea.random() >= 0.75:
+            return []
+        statut = self.choix(STATUTS)
+        militaire = statut in STATUTS_MILITAIRES
+        return [{
+            "statut": statut,
+            "lieu_recrutement": self.lieu() if militaire or self.alea.random() < 0.3 else None,
+            "registre_matricule": str(self.alea.randint(1, 5000)) if self.alea.random() < 0.7 else None,
+            "grade": self.choix(GRADES) if militaire and self.alea.random() < 0.8 else None,
+            "login_wiki_esm": login + "e" if self.alea.random() < 0.5 else None,
+        }]
+
+    def poete(self):
+        """
+        Fonction qui génère la notice suivante, au format d'un enregistrement de l'import (importation.py).
+        :rtype: dict
+        """
+        self.numero += 1
+        login = "s" + base36(self.numero)
+        nom, prenom = self.identite()
+        naissance = max(1850, min(1905, int(round(self.alea.gauss(1886, 9)))))
+        if naissance <= 1900 and self.alea.random() < 0.28:
+            deces = max(naissance + 9, self.choix(ANNEES_GUERRE))
+        else:
+            deces = min(naissance + max(25, int(self.alea.gauss(68, 14))), 1995)
+        lieu_naissance, lieu_deces = self.lieu(), self.lieu()
+        tirage = self.alea.random()
+        if tirage < 0.05:
+            lieu_naissance = None
+        elif tirage < 0.15:
+            lieu_deces = None
+        front = self.alea.choice(FRONTS)
+        phrases = self.alea.sample(PHRASES, self.alea.randint(2, 6))
+        return {
+            "nom": nom,
+            "prenom": prenom,
+            "nationalite": self.choix(NATIONALITES),
+            "date_naissance": self.date(naissance),
+            "date_deces": self.date(deces) if self.alea.random() < 0.95 else None,
+            "lieu_naissance": lieu_naissance,
+            "lieu_deces": lieu_deces,
+            "description": " ".join(phrase.format(prenom=prenom, nom=nom, front=front) for phrase in phrases),
+            "login_wiki": login,
+            "publications": self.publications(login, naissance, deces),
+            "statuts": self.statuts(login),
+        }
+
+
+def enregistrements(nombre, graine=GRAINE, debut=0, existe=None):
+    """
+    Générateur de 'nombre' notices synthétiques (voir Synthese).
+    :param nombre: nombre de notices
+    :type nombre: int
+    :param graine: graine du générateur aléatoire
+    :type graine: int
+    :param debut: numéro de la première notice
+    :type debut: int
+    :param existe: fonction (nom, prénom) -> booléen qui signale un couple déjà enregistré
+    :returns: générateur de dictionnaires au format de l'import
+    """
+    synthese = Synthese(graine, debut, existe)
+    for numero in range(nombre):
+        yield synthese.poete()
+
+
+def deja_enregistre(nom, prenom):
+    """
+    Fonction qui indique si un couple (nom, prénom) est déjà enregistré dans la base (index d'unicité en mémoire).
+    :rtype: booléen
+    """
+    return uniques.existe(NOM, (nom, prenom))
+
+
+def generer(nombre, user_id, graine=GRAINE, debut=0, lot=IMPORT_LOT):
+    """
+    Fonction qui génère et insère dans la base 'nombre' notices synthétiques, par lots, avec l'import en masse :
+    historique, dates normalisées, lieux, index plein-texte, chronologie et statistiques sont tenus à jour comme pour un import.
+    :param nombre: nombre de notices
+    :type nombre: int
+    :param user_id: identifiant de l'utilisateur auquel les créations sont attribuées
+    :type user_id: int
+    :param graine: graine du générateur aléatoire
+    :type graine: int
+    :param debut: numéro de la première notice (voir Synthese)
+    :type debut: int
+    :param lot: nombre de notices insérées par transaction
+    :type lot: int
+    :returns: rapport d'import
+    :rtype: dict
+    """
+    notices = enregistrements(nombre, graine, debut, deja_enregistre)
+    return Importation(user_id, lot).importer(
+        (numero, enregistrement, None) for numero, enregistrement in enumerate(notices, 1)
+    )
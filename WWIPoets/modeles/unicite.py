@@ -0,0 +1,152 @@
+import threading
+#Importation du module threading : l'index est partagé par les fils d'exécution (threads) du serveur.
+from ..app import db
+#Importation de la base de données
+from . import donnees
+#Importation du module donnees.py (et non de ses classes) : donnees.py importe lui-même ce fichier pour tenir l'index à jour.
+
+# INDEX D'UNICITÉ EN MÉMOIRE #
+# Les identifiants externes des poètes, des publications et des ESM, ainsi que les couples (nom, prénom) des poètes, sont chargés
+# une fois au lancement de l'application dans des ensembles, puis tenus à jour par les méthodes d'écriture de donnees.py.
+# Vérifier qu'une saisie est nouvelle revient alors à une recherche dans un ensemble, au lieu d'une requête COUNT(*) par champ.
+# Les index UNIQUE de la base (migrations.py) restent la garantie : une insertion concurrente d'un autre processus, absente de
+# l'ensemble, est refusée par la base. Inversement, une clé trouvée dans l'ensemble est confirmée par une lecture sur index avant
+# d'être signalée comme doublon, car elle a pu être supprimée par un autre processus depuis le chargement.
+
+POETE = "poete"
+NOM = "nom"
+PUBLICATION = "publication"
+STATUT = "statut"
+ESPACES = (POETE, NOM, PUBLICATION, STATUT)
+
+
+def requete_cles(espace):
+    """
+    Fonction qui renvoie la requête lisant toutes les clés existantes d'un espace.
+    :param espace: POETE, NOM, PUBLICATION ou STATUT
+    :type espace: str
+    :returns: requête SQLAlchemy dont chaque ligne est une clé (tuple d'une ou deux valeurs)
+    """
+    Poet, Publication, Military_status = donnees.Poet, donnees.Publication, donnees.Military_status
+    colonnes = {
+        POETE: [Poet.poet_external_login],
+        NOM: [Poet.poet_name, Poet.poet_firstname],
+        PUBLICATION: [Publication.publication_external_login],
+        STATUT: [Military_status.military_status_external_login],
+    }[espace]
+    return db.session.query(*colonnes).filter(colonnes[0].isnot(None))
+
+
+def requete_confirmation(espace, cle):
+    """
+    Fonction qui renvoie la requête (sur index) vérifiant qu'une clé existe toujours dans la base.
+    :param espace: POETE, NOM, PUBLICATION ou STATUT
+    :type espace: str
+    :param cle: identifiant externe, ou couple (nom, prénom) pour NOM
+    :returns: requête SQLAlchemy
+    """
+    Poet, Publication, Military_status = donnees.Poet, donnees.Publication, donnees.Military_status
+    if espace == NOM:
+        nom, prenom = cle
+        return db.session.query(Poet.poet_id).filter(Poet.poet_name == nom, Poet.poet_firstname == prenom)
+    colonne = {
+        POETE: Poet.poet_external_login,
+        PUBLICATION: Publication.publication_external_login,
+        STATUT: Military_status.military_status_external_login,
+    }[espace]
+    return db.session.query(colonne).filter(colonne == cle)
+
+
+class IndexUnicite:
+    """
+    Ensembles des clés uniques existantes (identifiants externes et couples nom/prénom), un par espace.
+    """
+
+    def __init__(self):
+        self.cles = {espace: set() for espace in ESPACES}
+        self.verrou = threading.Lock()
+        self.charge = False
+
+    def charger(self):
+        """
+        Fonction qui (re)charge toutes les clés depuis la base. Elle doit être appelée dans un contexte d'application.
+        :returns: None
+        """
+        cles = {espace: set(tuple(ligne) if len(ligne) > 1 else ligne[0] for ligne in requete_cles(espace)) for espace in ESPACES}
+        with self.verrou:
+            self.cles = cles
+            self.charge = True
+
+    def existe(self, espace, cle):
+        """
+        Fonction qui indique si une clé est déjà utilisée. Les clés absentes (None) ne sont jamais en conflit.
+        :param espace: POETE, NOM, PUBLICATION ou STATUT
+        :type espace: str
+        :param cle: identifiant externe, ou couple (nom, prénom) pour NOM
+        :returns: True si la clé existe dans la base
+        :rtype: booléen
+        """
+        if cle is None or cle == (None, None):
+            return False
+        if not self.charge:
+            self.charger()
+        with self.verrou:
+            if cle not in self.cles[espace]:
+                return False
+        if requete_confirmation(espace, cle).first() is not None:
+            return True
+        self.retirer(espace, cle)
+        return False
+
+    def confirmer(self, espace, cle):
+        """
+        Fonction appelée après le refus d'une écriture par une contrainte UNIQUE de la base, dont la cause n'est pas connue :
+        elle vérifie (lecture sur index) que la clé est réellement utilisée dans la base, et ne l'ajoute à l'index que dans ce cas.
+        :param espace: POETE, NOM, PUBLICATION ou STATUT
+        :type espace: str
+        :param cle: identifiant externe, ou couple (nom, prénom) pour NOM
+        :returns: True si la clé existe dans la base (le refus vient d'un doublon de cette clé)
+        :rtype: booléen
+        """
+        if cle is None or requete_confirmation(espace, cle).first() is None:
+            return False
+        self.ajouter(espace, cle)
+        return True
+
+    def ajouter(self, espace, cle):
+        """
+        Fonction qui ajoute une clé après une création ou une modification validée dans la base.
+        :returns: None
+        """
+        if cle is not None:
+            with self.verrou:
+                self.cles[espace].add(cle)
+
+    def retirer(self, espace, cle):
+        """
+        Fonction qui retire une clé après une modification ou une suppression validée dans la base.
+        :returns: None
+        """
+        with self.verrou:
+            self.cles[espace].discard(cle)
+
+
+#Index d'unicité de l'application, chargé par config_app() au lancement.
+uniques = IndexUnicite()
+
+
+def conflits_poete(nom, prenom, login_wiki):
+    """
+    Fonction qui renvoie les erreurs d'unicité d'une notice de poète : même couple (nom, prénom) ou même identifiant externe.
+    :param nom: nom de l'individu, ou None si le nom n'est pas modifié
+    :param prenom: prénom de l'individu
+    :param login_wiki: identifiant externe, ou None s'il n'est pas modifié
+    :returns: liste des erreurs
+    :rtype: list
+    """
+    errors = []
+    if nom is not None and uniques.existe(NOM, (nom, prenom)):
+        errors.append("La personne est déjà inscrite dans la base de données")
+    if uniques.existe(POETE, login_wiki):
+        errors.append("Cet identifiant est déjà utilisé")
+    return errors
@@ -1,6 +1,22 @@
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+#Importation des événements et de make_transient_to_detached de SQLAlchemy, pour tenir à jour le cache des utilisateur.rice.s connecté.e.s.
 from ..app import db, login
+from ..cache import CacheTTL
+#Importation du cache en mémoire, déclaré dans le fichier cache.py
+from ..metriques import registre
+#Importation des métriques, qui publient les succès et échecs du cache, déclarées dans le fichier metriques.py
+from ..constantes import UTILISATEURS_TTL, UTILISATEURS_CACHE
+from ..hachage import hachage
+#Importation du hachage des mots de passe (politique configurable, calcul dans une réserve bornée), déclaré dans le fichier hachage.py
+
+
+connectes = CacheTTL(taille=UTILISATEURS_CACHE, ttl=UTILISATEURS_TTL)
+#Cache des utilisateur.rice.s connecté.e.s (id -> valeurs des colonnes), lu à chaque requête par load_user au lieu de la base.
+#Une entrée est retirée dès que la ligne correspondante est modifiée ou supprimée ; la durée de vie borne le délai pendant
+#lequel un autre processus (worker) peut servir une ligne modifiée ailleurs.
+registre.suivre("utilisateurs", connectes)
 
 
 class User(UserMixin, db.Model):
@@ -9,7 +25,7 @@ class User(UserMixin, db.Model):
     user_nom = db.Column(db.Text, nullable=False)
     user_login = db.Column(db.String(45), nullable=False, unique=True)
     user_email = db.Column(db.Text, nullable=False)
-    user_password = db.Column(db.String(100), nullable=False)
+    user_password = db.Column(db.String(128), nullable=False)
     #Jointures entre les tables User et Authorship_poet; entre les tables User et Authorship_military_status; ainsi qu'entre les tables User et Authorship_publication.
     authorship_poet = db.relationship("Authorship_poet", back_populates="user_poet")
     authorship_military_status = db.relationship("Authorship_military_status", back_populates="user_status")
@@ -25,20 +41,61 @@ class User(UserMixin, db.Model):
 
     @login.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        """
+        Fonction qui renvoie l'utilisateur.rice de la session à chaque requête. Les valeurs de ses colonnes sont lues dans le cache
+        des utilisateur.rice.s connecté.e.s, puis rattachées à la session de la requête sans interroger la base (merge sans chargement) :
+        les relations (authorship_poet...) restent chargées à la demande.
+        :param user_id: identifiant enregistré dans la session
+        :type user_id: str
+        :returns: utilisateur.rice, ou None si l'identifiant n'existe pas
+        :rtype: User or None
+        """
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        colonnes = connectes.calculer(user_id, lambda: User.colonnes(user_id))
+        if colonnes is None:
+            return None
+        utilisateur = User(**colonnes)
+        make_transient_to_detached(utilisateur)
+        return db.session.merge(utilisateur, load=False)
+
+    @staticmethod
+    def colonnes(user_id):
+        """
+        Fonction qui lit dans la base les valeurs des colonnes d'un.e utilisateur.rice, telles que conservées par le cache.
+        :param user_id: identifiant de l'utilisateur.rice
+        :type user_id: int
+        :returns: dictionnaire attribut -> valeur, ou None si l'identifiant n'existe pas
+        :rtype: dict or None
+        """
+        utilisateur = User.query.get(user_id)
+        if utilisateur is None:
+            return None
+        return {colonne.key: getattr(utilisateur, colonne.key) for colonne in User.__mapper__.column_attrs}
 
     #Reprise du modèle du Gazetteer.
     @staticmethod
     def identification(login, motdepasse):
         """
         Fonction qui permet d'identifier un utilisateur. Si cela fonctionne, renvoie les données de l'utilisateur.
+        Une empreinte calculée avec une ancienne politique de hachage est recalculée avec la politique configurée.
         :param login: Login de l'utilisateur
         :param motdepasse: Mot de passe envoyé par l'utilisateur
         :returns: Si réussite, données de l'utilisateur. Sinon None
         :rtype: User or None
+        :raises Surcharge: si trop de connexions sont en cours (voir hachage.py)
         """
         utilisateur = User.query.filter(User.user_login == login).first()
-        if utilisateur and check_password_hash(utilisateur.user_password, motdepasse):
+        if utilisateur and motdepasse and hachage.verifier(utilisateur.user_password, motdepasse):
+            if hachage.obsolete(utilisateur.user_password):
+                try:
+                    utilisateur.user_password = hachage.hacher(motdepasse)
+                    db.session.commit()
+                except Exception:
+                    #L'ancienne empreinte reste valable : la connexion n'échoue pas pour autant.
+                    db.session.rollback()
             return utilisateur
         return None
 
@@ -53,6 +110,7 @@ class User(UserMixin, db.Model):
         :returns: Si il y a une erreur, la fonction renvoie False suivi d'une liste d'erreur
         Sinon, elle renvoie True suivi de la donnée enregistrée.
         :rtype: Retourne un tuple (booléen, User ou liste).
+        :raises Surcharge: si trop de connexions sont en cours (voir hachage.py)
         """
         erreurs = []
         if not login:
@@ -80,7 +138,7 @@ class User(UserMixin, db.Model):
             user_nom=nom,
             user_login=login,
             user_email=email,
-            user_password=generate_password_hash(motdepasse)
+            user_password=hachage.hacher(motdepasse)
         )
 
         try:
@@ -96,6 +154,13 @@ class User(UserMixin, db.Model):
             return False, [str(erreur)]
 
 
-
-
-
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def oublier_utilisateur(mapper, connexion, utilisateur):
+    """
+    Fonction appelée par SQLAlchemy lorsqu'une ligne de la table User est écrite : l'entrée du cache correspondante est retirée
+    (y compris un identifiant inconnu mis en cache avant une création).
+    :returns: None
+    """
+    connectes.supprimer(utilisateur.user_id)
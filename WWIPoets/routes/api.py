@@ -1,8 +1,21 @@
-from flask import render_template, request, url_for, jsonify
+from flask import render_template, request, url_for, jsonify, Response, stream_with_context
 from urllib.parse import urlencode
 from ..app import app
-from ..constantes import POETES_PAR_PAGE, API_ROUTE
+from ..constantes import POETES_PAR_PAGE, API_ROUTE, API_LIMITE_MAX
 from ..modeles.donnees import Poet, Publication, Military_status
+from ..modeles.export import export, FORMATS
+from ..modeles.importation import importer, FORMATS_IMPORT
+from ..modeles.statistiques import statistiques, NOMS_FACETTES
+from ..modeles.recherche import lire_filtres, recherche_structuree
+from ..modeles.chronologie import lire_fenetre, fenetre
+from ..modeles.lieux import lieux, lieu
+from ..modeles.lecture import lecture
+from ..modeles.donnees import version_base
+from ..modeles.compteurs import compter
+from flask_login import current_user
+import io
+from ..cache import mise_en_cache, conditionnel
+from ..encodage import encoder, reponse_json, assembler
 
 
 def Json_404():
@@ -10,12 +23,478 @@ def Json_404():
     response.status_code = 404
     return response
 
+def Json_400(message):
+    response = jsonify({"erreur": message})
+    response.status_code = 400
+    return response
+
+def Json_401():
+    response = jsonify({"erreur": "Authentication required"})
+    response.status_code = 401
+    return response
+
+def identifiant_poete(poet_id):
+    """
+    Fonction qui lit l'identifiant numérique d'un poète dans le chemin d'une route ('012' et '12' désignent le même poète).
+    :param poet_id: identifiant tel qu'il figure dans l'URL
+    :type poet_id: str
+    :returns: identifiant numérique, ou None si le texte n'est pas un nombre
+    :rtype: int or None
+    """
+    return int(poet_id) if poet_id.isdecimal() else None
+
+
 @app.route(API_ROUTE+"/poets/<poet_id>")
+@conditionnel(lambda poet_id: Poet.version(identifiant_poete(poet_id)) if identifiant_poete(poet_id) is not None else None)
+#L'étiquette de la réponse en cache porte l'identifiant normalisé : une écriture sur le poète 12 invalide aussi /api/poets/012.
+@mise_en_cache(lambda poet_id: ["poete:{}".format(identifiant_poete(poet_id))])
 def api_poets_single(poet_id):
+    identifiant = identifiant_poete(poet_id)
+    if identifiant is None:
+        return Json_404()
+    #Pour un visiteur anonyme, le document Json déjà encodé est lu dans le modèle de lecture et écrit tel quel dans la réponse.
+    if lecture.utilisable():
+        octets = lecture.document(identifiant)
+        return reponse_json(octets) if octets is not None else Json_404()
     try:
-        query = Poet.query.get(poet_id)
-        return jsonify(query.poete_to_json())
+        query = Poet.notice_complete(identifiant)
+        return reponse_json(encoder(query.poete_to_json()))
     except:
         return Json_404()
 
 
+# ROUTES DE COLLECTION #
+# La pagination se fait par curseur sur la clé primaire (paramètre 'after') : chaque page est une lecture
+# 'WHERE id > :after ORDER BY id LIMIT :limit' sur l'index de la clé primaire, dont le coût ne dépend pas de la profondeur de la page,
+# contrairement à .paginate() qui parcourt et ignore toutes les lignes précédentes (OFFSET) et recompte la table à chaque page.
+
+def entier_parametre(nom):
+    """
+    Fonction qui lit un paramètre entier optionnel de la requête.
+    :param nom: nom du paramètre dans l'URL
+    :type nom: str
+    :returns: la valeur entière, ou None si le paramètre est absent
+    :rtype: int or None
+    :raises ValueError: si le paramètre n'est pas un entier
+    """
+    valeur = request.args.get(nom, None)
+    if valeur is None or valeur == "":
+        return None
+    return int(valeur)
+
+def limite_parametre():
+    """
+    Fonction qui lit le paramètre 'limit' (taille d'une page), borné à API_LIMITE_MAX ; POETES_PAR_PAGE par défaut.
+    :rtype: int
+    :raises ValueError: si le paramètre n'est pas un entier
+    """
+    limite = entier_parametre("limit")
+    if limite is None:
+        limite = POETES_PAR_PAGE
+    return max(1, min(limite, API_LIMITE_MAX))
+
+def filtre_annees(requete, colonne, debut, fin):
+    """
+    Fonction qui restreint une requête à un intervalle d'années (bornes incluses) sur une colonne d'année normalisée (voir dates.py).
+    :returns: requête filtrée
+    """
+    if debut is not None:
+        requete = requete.filter(colonne >= debut)
+    if fin is not None:
+        requete = requete.filter(colonne <= fin)
+    return requete
+
+def selection_champs(document, champs):
+    """
+    Fonction qui ne conserve dans un document Json que les champs demandés par le paramètre 'fields'.
+    Les champs désignent des clés de 'attributes' ou des clés de premier niveau (par exemple 'publication').
+    L'identifiant est toujours conservé.
+    :param document: dictionnaire produit par un des sérialiseurs *_to_json()
+    :type document: dict
+    :param champs: ensemble des champs demandés, ou None pour tout conserver
+    :type champs: set or None
+    :returns: dictionnaire filtré
+    :rtype: dict
+    """
+    if champs is None:
+        return document
+    resultat = {"id": document["id"]}
+    if "attributes" in document:
+        resultat["attributes"] = {cle: valeur for cle, valeur in document["attributes"].items() if cle in champs}
+    for cle, valeur in document.items():
+        if cle not in ("id", "attributes") and cle in champs:
+            resultat[cle] = valeur
+    return resultat
+
+def page_collection(requete, colonne_id, serialiseur, documents=None):
+    """
+    Fonction qui construit une page de collection paginée par curseur sur la clé primaire.
+    Paramètres d'URL communs : 'after' (dernier identifiant de la page précédente), 'limit' (taille de la page) et 'fields' (champs à conserver, séparés par des virgules).
+    :param requete: requête SQLAlchemy déjà filtrée
+    :param colonne_id: colonne de la clé primaire
+    :param serialiseur: fonction qui transforme un objet en dictionnaire (un des *_to_json())
+    :param documents: fonction qui renvoie les documents Json déjà encodés d'une liste d'identifiants (voir lecture.py), facultative,
+    à ne pas utiliser avec une sélection de champs : seuls les identifiants de la page sont alors lus dans la base
+    :returns: réponse Json contenant 'data', 'links' et 'meta'
+    """
+    try:
+        apres = entier_parametre("after")
+        limite = limite_parametre()
+    except ValueError:
+        return Json_400("Les paramètres 'after' et 'limit' doivent être des entiers")
+
+    champs = request.args.get("fields", None)
+    if champs:
+        champs = set(champ.strip() for champ in champs.split(",") if champ.strip())
+    else:
+        champs = None
+
+    if apres is not None:
+        requete = requete.filter(colonne_id > apres)
+    if documents is not None:
+        requete = requete.with_entities(colonne_id)
+    # On demande un élément de plus que la limite pour savoir s'il existe une page suivante sans requête COUNT.
+    objets = requete.order_by(colonne_id).limit(limite + 1).all()
+    suivant = len(objets) > limite
+    objets = objets[:limite]
+
+    arguments = request.args.to_dict()
+    liens = {"self": request.base_url + "?" + urlencode(arguments) if arguments else request.base_url, "next": None}
+    if suivant:
+        arguments["after"] = getattr(objets[-1], colonne_id.key)
+        liens["next"] = request.base_url + "?" + urlencode(arguments)
+
+    if documents is not None:
+        #Les documents encodés sont assemblés tels quels : aucune notice n'est chargée ni encodée de nouveau.
+        return reponse_json(assembler([
+            ("data", b"[" + b",".join(documents([ligne[0] for ligne in objets])) + b"]"),
+            ("links", liens),
+            ("meta", {"limit": limite, "count": len(objets)})
+        ]))
+    return jsonify({
+        "data": [selection_champs(serialiseur(objet), champs) for objet in objets],
+        "links": liens,
+        "meta": {"limit": limite, "count": len(objets)}
+    })
+
+@app.route(API_ROUTE+"/poets")
+def api_poets():
+    """
+    Route de collection des poètes. Filtres : country, genre, born_after, born_before, died_after, died_before (années).
+    """
+    #Pour un visiteur anonyme, sans sélection de champs, les documents Json encodés sont lus dans le modèle de lecture ;
+    #sinon les notices sont chargées avec leurs relations.
+    documents = None
+    if lecture.utilisable() and not request.args.get("fields", None):
+        documents = lecture.documents_par_identifiants
+    requete = Poet.query if documents is not None else Poet.query.options(*Poet.chargement_complet())
+    try:
+        requete = filtre_annees(requete, Poet.poet_birth_year, entier_parametre("born_after"), entier_parametre("born_before"))
+        requete = filtre_annees(requete, Poet.poet_death_year, entier_parametre("died_after"), entier_parametre("died_before"))
+    except ValueError:
+        return Json_400("Les bornes de dates doivent être des années")
+    pays = request.args.get("country", None)
+    if pays:
+        requete = requete.filter(Poet.poet_country == pays)
+    genre = request.args.get("genre", None)
+    if genre:
+        requete = requete.filter(Poet.link_publication.any(Publication.publication_genre_litteraire == genre))
+    return page_collection(requete, Poet.poet_id, Poet.poete_to_json, documents)
+
+@app.route(API_ROUTE+"/publications")
+def api_publications():
+    """
+    Route de collection des publications. Filtres : genre, poet_id, date_after, date_before (années).
+    """
+    requete = Publication.query
+    try:
+        requete = filtre_annees(requete, Publication.publication_year, entier_parametre("date_after"), entier_parametre("date_before"))
+        poet_id = entier_parametre("poet_id")
+    except ValueError:
+        return Json_400("Les paramètres 'poet_id', 'date_after' et 'date_before' doivent être des entiers")
+    if poet_id is not None:
+        requete = requete.filter(Publication.publication_poet_id == poet_id)
+    genre = request.args.get("genre", None)
+    if genre:
+        requete = requete.filter(Publication.publication_genre_litteraire == genre)
+    return page_collection(requete, Publication.publication_id, Publication.publication_to_json)
+
+@app.route(API_ROUTE+"/military_status")
+def api_military_status():
+    """
+    Route de collection des états de situation militaire (ESM). Filtres : statut, grade, poet_id, country (nationalité du poète).
+    """
+    requete = Military_status.query
+    try:
+        poet_id = entier_parametre("poet_id")
+    except ValueError:
+        return Json_400("Le paramètre 'poet_id' doit être un entier")
+    if poet_id is not None:
+        requete = requete.filter(Military_status.military_status_poet_id == poet_id)
+    for parametre, colonne in (("statut", Military_status.military_status_statut), ("grade", Military_status.military_status_grade)):
+        valeur = request.args.get(parametre, None)
+        if valeur:
+            requete = requete.filter(colonne == valeur)
+    pays = request.args.get("country", None)
+    if pays:
+        requete = requete.filter(Military_status.poetstatus.has(Poet.poet_country == pays))
+    return page_collection(requete, Military_status.military_status_id, Military_status.status_to_json)
+
+
+# STATISTIQUES #
+
+@app.route(API_ROUTE+"/stats")
+@conditionnel(version_base)
+@mise_en_cache(lambda: ["statistiques"])
+def api_stats():
+    """
+    Route qui renvoie les statistiques précalculées de la base : nombre de poètes par pays, par décennie de naissance et de décès,
+    par grade et statut militaires, et par genre littéraire. Le paramètre 'facets' (noms séparés par des virgules) restreint les facettes renvoyées.
+    """
+    facettes = request.args.get("facets", None)
+    if facettes:
+        facettes = [facette.strip() for facette in facettes.split(",") if facette.strip()]
+        inconnues = [facette for facette in facettes if facette not in NOMS_FACETTES]
+        if inconnues:
+            return Json_400("Facette(s) inconnue(s) : {}. Facettes disponibles : {}".format(", ".join(inconnues), ", ".join(NOMS_FACETTES)))
+    else:
+        facettes = None
+    return jsonify({
+        "data": {
+            facette: [{"value": valeur, "count": nombre} for valeur, nombre in valeurs]
+            for facette, valeurs in statistiques(facettes).items()
+        },
+        "meta": {"poets": compter(("index", "Poet"), lambda: Poet.query.count())}
+    })
+
+
+# RECHERCHE STRUCTURÉE #
+
+@app.route(API_ROUTE+"/search")
+def api_search():
+    """
+    Route de recherche structurée : filtres country, grade, statut, lieu_recrutement, genre, born_after, born_before, died_after,
+    died_before et mots-clés (keyword), combinés par un ET. Pagination par 'page' et 'limit'.
+    Renvoie les poètes par ordre alphabétique et, dans 'facets', les facettes calculées sur l'ensemble des résultats.
+    """
+    try:
+        filtres = lire_filtres(request.args)
+    except ValueError as erreur:
+        return Json_400(str(erreur))
+    try:
+        page = entier_parametre("page") or 1
+        limite = entier_parametre("limit")
+    except ValueError:
+        return Json_400("Les paramètres 'page' et 'limit' doivent être des entiers")
+    motclef = request.args.get("keyword", None) or None
+    if not filtres and not motclef:
+        return Json_400("Au moins un filtre ou le paramètre 'keyword' est requis")
+    if limite is None:
+        limite = POETES_PAR_PAGE
+    limite = max(1, min(limite, API_LIMITE_MAX))
+    page = max(1, page)
+    resultats, facettes = recherche_structuree(filtres, motclef, page=page, par_page=limite, options=Poet.chargement_complet())
+
+    arguments = request.args.to_dict()
+    liens = {"self": request.base_url + "?" + urlencode(arguments), "next": None, "prev": None}
+    if resultats.has_next:
+        liens["next"] = request.base_url + "?" + urlencode(dict(arguments, page=page + 1))
+    if resultats.has_prev:
+        liens["prev"] = request.base_url + "?" + urlencode(dict(arguments, page=page - 1))
+    return jsonify({
+        "data": [poete.poete_to_json() for poete in resultats.items],
+        "facets": {
+            facette: [{"value": valeur, "count": nombre} for valeur, nombre in valeurs]
+            for facette, valeurs in facettes.items()
+        },
+        "links": liens,
+        "meta": {"total": resultats.total, "page": page, "limit": limite}
+    })
+
+
+# CHRONOLOGIE #
+
+@app.route(API_ROUTE+"/timeline")
+@conditionnel(version_base)
+@mise_en_cache(lambda: ["chronologie"])
+def api_timeline():
+    """
+    Route qui renvoie une page de la chronologie (naissances, décès, publications, recrutements) par ordre chronologique.
+    Paramètres : 'start' (première année, par défaut celle du premier événement), 'years' (nombre d'années de la page),
+    'types' (types d'événements séparés par des virgules), 'limit' (nombre d'événements de la page) et 'after' (curseur 'next_cursor'
+    de la page précédente). Le lien 'next' mène à la suite de l'intervalle d'années s'il reste des événements, sinon à l'intervalle
+    suivant ; 'prev' mène à l'intervalle précédent. Les liens sautent les années sans événement.
+    """
+    try:
+        debut, annees, types, apres, limite = lire_fenetre(request.args)
+    except ValueError as erreur:
+        return Json_400(str(erreur))
+    page = fenetre(debut, annees, types, apres, limite)
+    arguments = request.args.to_dict()
+    liens = {"self": request.base_url + "?" + urlencode(arguments) if arguments else request.base_url, "next": None, "prev": None}
+    #Les liens vers d'autres intervalles repartent du début de l'intervalle (sans curseur).
+    arguments.pop("after", None)
+    if page["curseur"] is not None:
+        liens["next"] = request.base_url + "?" + urlencode(dict(arguments, start=page["debut"], after=page["curseur"]))
+    elif page["suivante"] is not None:
+        liens["next"] = request.base_url + "?" + urlencode(dict(arguments, start=page["suivante"]))
+    if page["precedente"] is not None:
+        liens["prev"] = request.base_url + "?" + urlencode(dict(arguments, start=page["precedente"]))
+    return jsonify({
+        "data": [{
+            "type": evenement["type"],
+            "id": evenement["objet_id"],
+            "date": {"year": evenement["annee"], "month": evenement["mois"], "day": evenement["jour"], "precision": evenement["precision"]},
+            "poet": {"id": evenement["poet_id"], "name": evenement["nom"], "url": url_for("api_poets_single", poet_id=evenement["poet_id"], _external=True)},
+            "detail": evenement["detail"]
+        } for evenement in page["evenements"]],
+        "links": liens,
+        "meta": {"start": page["debut"], "end": page["fin"], "count": len(page["evenements"]), "limit": limite,
+                 "next_cursor": page["curseur"]}
+    })
+
+
+# LIEUX #
+
+LISTES_API_LIEU = {"births": "naissances", "deaths": "deces", "recruitments": "recrutements"}
+#Listes de notices d'un lieu : nom dans l'API -> clé renvoyée par lieu() (lieux.py).
+
+def coordonnees(lieu_canonique):
+    """
+    Fonction qui renvoie les coordonnées d'un lieu en Json, ou None si elles ne sont pas connues.
+    """
+    if lieu_canonique["latitude"] is None:
+        return None
+    return {"lat": lieu_canonique["latitude"], "lon": lieu_canonique["longitude"]}
+
+
+@app.route(API_ROUTE+"/places")
+@conditionnel(version_base)
+@mise_en_cache(lambda: ["statistiques"])
+def api_places():
+    """
+    Route qui renvoie les lieux canoniques rattachés à au moins une notice, avec leurs coordonnées et le nombre de poètes
+    nés, décédés et recrutés en chaque lieu (précalculés), par identifiant croissant. Avec 'geo=1', seuls les lieux dont les coordonnées
+    sont connues sont renvoyés, pour l'affichage sur une carte. Pagination par curseur, comme les routes de collection ('after', 'limit').
+    """
+    geolocalises = request.args.get("geo", "") in ("1", "true")
+    try:
+        apres, limite = entier_parametre("after"), limite_parametre()
+    except ValueError:
+        return Json_400("Les paramètres 'after' et 'limit' doivent être des entiers")
+    # On demande un lieu de plus que la limite pour savoir s'il existe une page suivante sans requête COUNT.
+    donnees_lieux = lieux(geolocalises, apres, limite + 1)
+    suivant = len(donnees_lieux) > limite
+    donnees_lieux = donnees_lieux[:limite]
+    arguments = request.args.to_dict()
+    liens = {"self": request.base_url + "?" + urlencode(arguments) if arguments else request.base_url, "next": None}
+    if suivant:
+        liens["next"] = request.base_url + "?" + urlencode(dict(arguments, after=donnees_lieux[-1]["place_id"]))
+    return jsonify({
+        "data": [{
+            "id": lieu_canonique["place_id"],
+            "name": lieu_canonique["nom"],
+            "country": lieu_canonique["pays"],
+            "coordinates": coordonnees(lieu_canonique),
+            "counts": {
+                "births": lieu_canonique["nombres"]["birthplace"],
+                "deaths": lieu_canonique["nombres"]["deathplace"],
+                "recruitments": lieu_canonique["nombres"]["recruitment_place"]
+            },
+            "url": url_for("api_place", place_id=lieu_canonique["place_id"], _external=True)
+        } for lieu_canonique in donnees_lieux],
+        "links": liens,
+        "meta": {"limit": limite, "count": len(donnees_lieux)}
+    })
+
+
+@app.route(API_ROUTE+"/places/<int:place_id>")
+@conditionnel(lambda place_id: version_base())
+@mise_en_cache(lambda place_id: ["statistiques"])
+def api_place(place_id):
+    """
+    Route qui renvoie un lieu canonique, ses variantes d'écriture et les poètes qui y sont nés, décédés ou recrutés, par identifiant
+    croissant. Chaque liste compte au plus 'limit' notices ; sa suite se lit en suivant son lien ('links.births', 'links.deaths',
+    'links.recruitments'), c'est-à-dire avec 'list' (births, deaths ou recruitments : seule cette liste est renvoyée) et 'after'
+    (identifiant du dernier poète, ou du dernier ESM pour les recrutements, de la page précédente).
+    """
+    liste = request.args.get("list", None)
+    if liste is not None and liste not in LISTES_API_LIEU:
+        return Json_400("Le paramètre 'list' doit valoir {}".format(", ".join(LISTES_API_LIEU)))
+    try:
+        apres, limite = entier_parametre("after"), limite_parametre()
+    except ValueError:
+        return Json_400("Les paramètres 'after' et 'limit' doivent être des entiers")
+    if apres is not None and liste is None:
+        return Json_400("Le paramètre 'after' s'utilise avec le paramètre 'list'")
+    listes = [liste] if liste is not None else list(LISTES_API_LIEU)
+    # On demande une notice de plus que la limite pour savoir si chaque liste a une page suivante sans requête COUNT.
+    lieu_canonique = lieu(place_id, limite + 1, [LISTES_API_LIEU[nom] for nom in listes], apres)
+    if lieu_canonique is None:
+        return Json_404()
+
+    def poete(poet_id, nom):
+        return {"id": poet_id, "name": nom, "url": url_for("api_poets_single", poet_id=poet_id, _external=True)}
+
+    arguments = request.args.to_dict()
+    document = {
+        "id": lieu_canonique["place_id"],
+        "name": lieu_canonique["nom"],
+        "country": lieu_canonique["pays"],
+        "coordinates": coordonnees(lieu_canonique),
+        "variants": lieu_canonique["variantes"],
+    }
+    liens = {"self": request.base_url + "?" + urlencode(arguments) if arguments else request.base_url}
+    for nom in listes:
+        lignes = lieu_canonique[LISTES_API_LIEU[nom]]
+        if nom == "recruitments":
+            document[nom] = [dict(poete(poet_id, nom_poete), military_status_id=military_status_id)
+                             for military_status_id, poet_id, nom_poete in lignes[:limite]]
+        else:
+            document[nom] = [poete(poet_id, nom_poete) for poet_id, nom_poete in lignes[:limite]]
+        liens[nom] = None
+        if len(lignes) > limite:
+            liens[nom] = request.base_url + "?" + urlencode(dict(arguments, list=nom, after=lignes[limite - 1][0]))
+    return jsonify({"data": document, "links": liens, "meta": {"limit": limite}})
+
+
+# EXPORT COMPLET #
+
+@app.route(API_ROUTE+"/export")
+def api_export():
+    """
+    Route qui exporte toute la base (poètes, publications et ESM) en flux, au format NDJSON (par défaut) ou CSV (paramètre 'format').
+    Les lignes sont envoyées au client au fur et à mesure de leur production.
+    """
+    format_export = request.args.get("format", "ndjson")
+    if format_export not in FORMATS:
+        return Json_400("Le paramètre 'format' doit valoir 'ndjson' ou 'csv'")
+    types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+    response = Response(stream_with_context(export(format_export)), mimetype=types[format_export])
+    response.headers["Content-Disposition"] = "attachment; filename=WWIPoets.{}".format(format_export)
+    return response
+
+
+# IMPORT EN MASSE #
+
+TYPES_IMPORT = {"text/csv": "csv", "application/json": "json", "application/x-ndjson": "ndjson"}
+
+@app.route(API_ROUTE+"/import", methods=["POST"])
+def api_import():
+    """
+    Route réservée aux utilisateurs connectés, qui importe en masse des notices de poètes (avec publications et ESM).
+    Le corps de la requête est un fichier CSV, JSON ou NDJSON, dont le format est donné par son type (Content-Type) ou par le paramètre 'format'.
+    Renvoie le rapport d'import : nombres de notices, publications et ESM créés, et erreurs par enregistrement.
+    """
+    if not current_user.is_authenticated:
+        return Json_401()
+    format_import = request.args.get("format") or TYPES_IMPORT.get(request.mimetype)
+    if format_import not in FORMATS_IMPORT:
+        return Json_400("Le format doit être 'csv', 'json' ou 'ndjson' (paramètre 'format' ou en-tête Content-Type)")
+    #Le corps est lu au fur et à mesure (CSV et NDJSON), sans être chargé entièrement en mémoire.
+    flux = io.TextIOWrapper(request.stream, encoding="utf-8", newline="" if format_import == "csv" else None)
+    try:
+        rapport = importer(flux, format_import, current_user.get_id())
+    except ValueError as erreur:
+        return Json_400(str(erreur))
+    return jsonify(rapport)
@@ -1,22 +1,37 @@
-from flask import render_template, url_for, request, flash, redirect
+from flask import render_template, url_for, request, flash, redirect, abort, Response
 #Importation de render_template (afin de joindre les routes aux templates), url_for (afin de construire des url vers les fonctions et les pages html),
 #request (import de types d'objets via des requêtes HTTP), flash (permet l'envoi de messages automatiques) et redirect (renvoi vers l'url d'une autre route) depuis le module flask.
-from sqlalchemy import or_
-#Importation depuis SQLAlchemy de l'opérateur 'or' pour faire du requêtage multi-tables.
 from ..app import app, db, login
 #Importation de app, db et login pour gérer les utilisateurs
-from ..modeles.donnees import Poet, Publication, Military_status
+from ..modeles.donnees import Poet, Publication, Military_status, version_base
 #Importation des classes Poet, Publication et Military_status, déclarées dans le fichier donnees.py
+from ..modeles.recherche import rechercher, lire_filtres, recherche_structuree, facettes_recherche, liens_facettes
+#Importation des fonctions de recherche plein-texte et de recherche structurée (filtres et facettes), déclarées dans le fichier recherche.py
+from ..modeles.compteurs import paginer
+#Importation de la pagination avec cache des compteurs, déclarée dans le fichier compteurs.py
+from ..modeles.statistiques import statistiques
+#Importation de la lecture des statistiques précalculées (facettes), déclarée dans le fichier statistiques.py
+from ..modeles.chronologie import lire_fenetre, fenetre, LIBELLES_EVENEMENTS
+#Importation de la lecture de la chronologie matérialisée, déclarée dans le fichier chronologie.py
+from ..modeles.lecture import lecture
+#Importation du modèle de lecture en mémoire (instantanés des notices servis aux visiteurs anonymes), déclaré dans le fichier lecture.py
 from ..modeles.utilisateurs import User
 #Importation de la classe User, déclarée dans le fichier utilisateurs.py
-from ..constantes import POETES_PAR_PAGE
-#Importation de la variable POETES_PAR_PAGE, utilisée dans la fonction de recherche
+from ..constantes import POETES_PAR_PAGE, CHRONOLOGIE_ANNEES, CHRONOLOGIE_EVENEMENTS
+#Importation des variables POETES_PAR_PAGE (fonction de recherche), CHRONOLOGIE_ANNEES et CHRONOLOGIE_EVENEMENTS (nombre d'années et d'événements par page de la chronologie)
+from ..cache import mise_en_cache, conditionnel
+#Importation du décorateur de mise en cache des pages consultées par les visiteurs anonymes, déclaré dans le fichier cache.py
+from ..metriques import registre, acces_autorise
+#Importation des métriques des requêtes et du contrôle d'accès à la route /metrics, déclarés dans le fichier metriques.py
+from ..hachage import Surcharge
+#Importation de l'exception levée lorsque trop de mots de passe sont en cours de vérification, déclarée dans le fichier hachage.py
 from flask_login import login_user, current_user, logout_user, login_required
 #Importation de current_user (utilisateur courant), login_user (connexion), logout_user (déconnexion) et login_required (identification obligatoire) pour gérer les sessions utilisateurs.
 
 # PAGES GENERALES #
 
 @app.route("/")
+@mise_en_cache(lambda: ["accueil"])
 def accueil():
     """ Route permettant l'affichage d'une page accueil
     :returns: template 'accueil.html'
@@ -24,7 +39,10 @@ def accueil():
     """
     # Permet l'affichage des vingt derniers poètes enregistrés dans la base.
     #render_template a comme premier argument le chemin du template souhaité puis des arguments nommés, réutilisés comme variables à l'intérieur des templates.
-    poets = Poet.query.order_by(Poet.poet_id.desc()).limit(20).all()
+    if lecture.utilisable():
+        poets = lecture.derniers_poetes(20)
+    else:
+        poets = Poet.query.order_by(Poet.poet_id.desc()).limit(20).all()
     return render_template("pages/accueil.html", nom="Poets of World War I", poetes=poets)
 
 @app.route("/presentation")
@@ -40,7 +58,7 @@ def presentation():
 
 @app.route("/recherche")
 def recherche():
-    """ Route permettant la recherche plein-texte.
+    """ Route permettant la recherche plein-texte et la recherche structurée (filtres combinés par un ET, voir recherche.py).
     :returns: template 'recherche.html'
     :rtype: template
     """
@@ -59,56 +77,61 @@ def recherche():
     resultats = []
 
     # On fait de même pour le titre de la page.
-    # Si un mot-clé est entré dans la barre de recherche, requête sur les tables Poet, Publication et Military_status de la base de données pour chercher des correspondances.
+    # Si un mot-clé est entré dans la barre de recherche, requête sur l'index plein-texte des tables Poet, Publication et Military_status de la base de données pour chercher des correspondances.
     #Le résultat est stocké dans la liste résultats = []
     titre = "Recherche"
-    if motclef:
-        resultats = Poet.query.filter(
-            or_(Poet.poet_name.like("%{}%".format(motclef)),
-            Poet.poet_firstname.like("%{}%".format(motclef)),
-            Poet.poet_country.like("%{}%".format(motclef)),
-            Poet.poet_birthplace.like("%{}%".format(motclef)),
-            Poet.poet_deathplace.like("%{}%".format(motclef)),
-            Poet.poet_birthdate.like("%{}%".format(motclef)),
-            Poet.poet_deathdate.like("%{}%".format(motclef)),
-            Poet.link_publication.any((Publication.publication_titre).like("%{}%".format(motclef))),
-            Poet.link_publication.any((Publication.publication_genre_litteraire).like("%{}%".format(motclef))),
-            Poet.link_military_status.any((Military_status.military_status_statut).like("%{}%".format(motclef))),
-            Poet.link_military_status.any((Military_status.military_status_grade).like("%{}%".format(motclef))),
-            Poet.link_military_status.any((Military_status.military_status_lieu_recrutement).like("%{}%".format(motclef))),
-            Poet.link_military_status.any((Military_status.military_status_registre_matricule).like("%{}%".format(motclef)))
-            )
-            #Requête à la fois sur les tables Poet, Military_status et Publication grâce à la commande any.
-          ).paginate(page=page, per_page=POETES_PAR_PAGE)
-        #Pagination réalisée avec la méthode .paginate
+    try:
+        filtres = lire_filtres(request.args)
+    except ValueError as erreur:
+        flash(str(erreur), "error")
+        filtres = {}
+    if filtres:
+        #Recherche structurée : les filtres (et les éventuels mots-clés) sont combinés par un ET, résultats par ordre alphabétique.
+        resultats, facettes = recherche_structuree(filtres, motclef, page=page, par_page=POETES_PAR_PAGE)
+        titre = "Résultats de la recherche"
+    elif motclef:
+        resultats = rechercher(motclef, page=page, par_page=POETES_PAR_PAGE)
+        #Recherche dans l'index plein-texte FTS5 (tables Poet, Publication et Military_status), résultats classés par pertinence.
         titre = "Résultat pour la recherche `" + motclef + " "
-        return render_template("pages/recherche.html", resultats=resultats, titre=titre, keyword=motclef)
+        total, facettes = facettes_recherche({}, motclef)
+    else:
+        #Sans recherche, les facettes sont celles de toute la base, lues dans la table Facette tenue à jour à chaque écriture.
+        facettes = statistiques()
+    #Chaque valeur de facette devient un lien vers la recherche courante restreinte à cette valeur.
+    arguments = {cle: valeur for cle, valeur in request.args.items() if cle != "page" and valeur}
+    return render_template("pages/recherche.html", resultats=resultats, titre=titre, keyword=motclef, filtres=filtres,
+                           arguments=arguments, facettes=liens_facettes(facettes, arguments))
 
 
 @app.route("/index_individus")
+@conditionnel(version_base)
+@mise_en_cache(lambda: ["index_individus"])
 def index_individus():
     """ Route qui affiche la liste ordonnée alphabétiquement (par le nom de famille) des individus de la base.
     :returns: template 'index_individus.html'
     :rtype: template
     """
     titre = "Index des individus"
-    # vérification que la base de données n'est pas vide :
-    personnes = Poet.query.all()
-
-    if len(personnes) == 0:
-        return render_template("pages/index_individus.html", personnes=personnes, titre=titre)
+    page = request.args.get("page", 1)
+    if isinstance(page, str) and page.isdigit():
+        page = int(page)
     else:
-        page = request.args.get("page", 1)
-        if isinstance(page, str) and page.isdigit():
-            page = int(page)
-        else:
-            page = 1
+        page = 1
 
-        # creation de la pagination avec la methode .paginate qui remplace le .all dans la requête sur la base
-        personnes = Poet.query.order_by(Poet.poet_name).paginate(page=page)
-        return render_template("pages/index_individus.html", personnes=personnes, titre=titre)
+    # Pour un visiteur anonyme, la page est lue dans le modèle de lecture, sans requête.
+    # Sinon, une seule requête lit la page demandée; le nombre total de poètes provient du cache des compteurs.
+    if lecture.utilisable():
+        personnes = lecture.page_poetes(page, POETES_PAR_PAGE)
+    else:
+        personnes = paginer(Poet.query.order_by(Poet.poet_name), page, POETES_PAR_PAGE, ("index", "Poet"))
+    # Si la première page est vide, la base de données est vide.
+    if not personnes.items and page == 1:
+        personnes = []
+    return render_template("pages/index_individus.html", personnes=personnes, titre=titre)
 
 @app.route("/index_publications")
+@conditionnel(version_base)
+@mise_en_cache(lambda: ["index_publications"])
 def index_publications():
     """
     Route qui affiche la liste ordonnée alphabétiquement (par le titre) des références bibliographiques contenues dans la base.
@@ -116,22 +139,47 @@ def index_publications():
     :rtype: template
     """
     titre="Oeuvres poétiques de guerre"
-    #Vérification que la base de données n'est pas vide.
-    oeuvres=Publication.query.all()
+    page = request.args.get("page", 1)
+    if isinstance(page, str) and page.isdigit():
+        page=int(page)
+    else:
+        page=1
 
-    if len(oeuvres) == 0:
-        return render_template("pages/index_publications.html", oeuvres=oeuvres, titre=titre)
+    #Pour un visiteur anonyme, la page est lue dans le modèle de lecture, sans requête.
+    #Sinon, une seule requête lit la page demandée; le nombre total de références provient du cache des compteurs.
+    if lecture.utilisable():
+        oeuvres = lecture.page_publications(page, POETES_PAR_PAGE)
     else:
-        page = request.args.get("page", 1)
-        if isinstance(page, str) and page.isdigit():
-            page=int(page)
-        else:
-            page=1
-        #Création de la pagination avec la méthode .paginate.
-        oeuvres=Publication.query.order_by(Publication.publication_titre).paginate(page=page)
-        return render_template("pages/index_publications.html", oeuvres=oeuvres, titre=titre)
+        oeuvres=paginer(Publication.query.order_by(Publication.publication_titre), page, POETES_PAR_PAGE, ("index", "Publication"))
+    #Si la première page est vide, la base de données est vide.
+    if not oeuvres.items and page == 1:
+        oeuvres = []
+    return render_template("pages/index_publications.html", oeuvres=oeuvres, titre=titre)
+
+@app.route("/timeline")
+@conditionnel(version_base)
+@mise_en_cache(lambda: ["chronologie"])
+def chronologie():
+    """ Route qui affiche la chronologie des naissances, décès, publications et recrutements, par pages de quelques années
+    et d'au plus CHRONOLOGIE_EVENEMENTS événements (la suite d'une période se lit par curseur, paramètre 'after').
+    Les événements sont lus dans la table Evenement, tenue à jour à chaque écriture (voir chronologie.py).
+    :returns: template 'chronologie.html'
+    :rtype: template
+    """
+    try:
+        debut, annees, types, apres, limite = lire_fenetre(request.args)
+    except ValueError as erreur:
+        flash(str(erreur), "error")
+        debut, annees, types, apres, limite = None, CHRONOLOGIE_ANNEES, None, None, CHRONOLOGIE_EVENEMENTS
+    page = fenetre(debut, annees, types, apres, limite)
+    #Les liens vers les pages précédente et suivante conservent le nombre d'années, les types d'événements et le nombre d'événements demandés.
+    arguments = {cle: valeur for cle, valeur in request.args.items() if cle in ("years", "types", "limit") and valeur}
+    return render_template("pages/chronologie.html", titre="Chronologie", page=page, arguments=arguments,
+                           types=LIBELLES_EVENEMENTS, types_demandes=types or [])
 
 @app.route("/poets/<int:poet_id>")
+@conditionnel(lambda poet_id: Poet.version(poet_id))
+@mise_en_cache(lambda poet_id: ["poete:{}".format(poet_id)])
 def notice(poet_id):
     """ Route permettant l'affichage d'une notice individuelle de poète (informations biographiques élémentaires + description en rapport avec la Première Guerre mondiale)
 
@@ -141,7 +189,12 @@ def notice(poet_id):
     :rtype: template
     """
 
-    unique_poete = Poet.query.get(poet_id)
+    if lecture.utilisable():
+        unique_poete = lecture.poete(poet_id)
+    else:
+        unique_poete = Poet.notice_complete(poet_id)
+    #Pour un visiteur anonyme, la notice est lue dans le modèle de lecture ; sinon, les publications et l'ESM sont chargés
+    #en même temps que le poète (trois requêtes au total).
     #Si la requête par l'identifiant numérique ne trouve pas de correspondance, message d'information renvoyé à l'utilisateur sur l'absence de l'individu dans la base.
     if not unique_poete:
         flash("L'individu recherché n'est pas enregistré dans la base")
@@ -235,8 +288,6 @@ def suppression_poet(poet_id):
     :type poet_id: int
     :returns: template 'index_individus.html' en cas de réussite, sinon redirection sur le template de la notice correspondante.
     """
-    poete=Poet.query.get(poet_id)
-
     status=Poet.delete_poet(poet_id=poet_id)
 
     if status is True:
@@ -245,7 +296,7 @@ def suppression_poet(poet_id):
 
     else:
         flash("Échec de la suppression", "danger")
-        return redirect("/poets/" + str(poete.poet_id))
+        return redirect("/poets/" + str(poet_id))
 
 @app.route("/creation_statut", methods=["GET", "POST"])
 @login_required
@@ -388,6 +439,9 @@ def modification_publication(publication_id):
 
 #PAGES RELATIVES À LA GESTION DES UTILISATEUR.RICE.S #
 
+SURCHARGE = "Le service de connexion est surchargé : réessayez dans quelques instants"
+#Message affiché lorsque la vérification d'un mot de passe est refusée faute de place dans la réserve de hachage.
+
 @app.route("/register", methods=["GET", "POST"])
 def inscription():
     """
@@ -397,12 +451,16 @@ def inscription():
     """
     # Si on est en POST, cela veut dire que le formulaire a été envoyé.
     if request.method == "POST":
-        statut, donnees = User.creer(
-            login=request.form.get("login", None),
-            email=request.form.get("email", None),
-            nom=request.form.get("nom", None),
-            motdepasse=request.form.get("motdepasse", None)
-        )
+        try:
+            statut, donnees = User.creer(
+                login=request.form.get("login", None),
+                email=request.form.get("email", None),
+                nom=request.form.get("nom", None),
+                motdepasse=request.form.get("motdepasse", None)
+            )
+        except Surcharge:
+            flash(SURCHARGE, "error")
+            return render_template("pages/inscription.html"), 503
         if statut is True:
             flash("Enregistrement effectué. Identifiez-vous maintenant", "success")
             return redirect("/")
@@ -425,10 +483,15 @@ def connexion():
         return redirect("/")
     # Si on est en POST, cela veut dire que le formulaire a été envoyé.
     if request.method == "POST":
-        utilisateur = User.identification(
-            login=request.form.get("login", None),
-            motdepasse=request.form.get("motdepasse", None)
-        )
+        try:
+            utilisateur = User.identification(
+                login=request.form.get("login", None),
+                motdepasse=request.form.get("motdepasse", None)
+            )
+        except Surcharge:
+            # Trop de mots de passe en cours de vérification : on refuse plutôt que d'allonger la file d'attente.
+            flash(SURCHARGE, "error")
+            return render_template("pages/connexion.html"), 503
         if utilisateur:
             flash("Connexion effectuée", "success")
             login_user(utilisateur)
@@ -450,4 +513,20 @@ def deconnexion():
     if current_user.is_authenticated is True:
         logout_user()
     flash("Vous êtes déconnecté-e", "info")
-    return redirect("/")
\ No newline at end of file
+    return redirect("/")
+
+
+# SUPERVISION #
+
+@app.route("/metrics")
+def metriques():
+    """
+    Route qui publie les métriques des requêtes (durées, requêtes SQL, lignes lues, rendu des gabarits) au format texte de Prometheus.
+    Elle n'existe que pour les clients autorisés (voir acces_autorise() dans metriques.py).
+    :returns: métriques du processus qui sert la requête
+    :rtype: Response
+    """
+    if not app.config.get("METRIQUES", False) or not acces_autorise(app.config):
+        abort(404)
+    return Response(registre.exposer(app.config.get("METRIQUES_ECHANTILLONNAGE", 0.1)),
+                    mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,7 @@
 from WWIPoets.app import config_app
 
+app = config_app("production")
+# L'application est créée au niveau du module afin que les commandes 'flask ...' (FLASK_APP=run.py, voir .flaskenv) la trouvent.
+
 if __name__ == "__main__":
-    app = config_app("production")
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,65 @@
+import os
+#Importation du module os pour désigner la base des tests (variable d'environnement WWIPOETS_BASE).
+import shutil
+import tempfile
+#Importation de shutil et tempfile pour travailler sur une copie de la base du dépôt, jamais sur la base elle-même.
+import pytest
+#Importation de pytest pour déclarer les fixtures partagées par les tests.
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOSSIER = tempfile.mkdtemp(prefix="wwipoets-tests-")
+BASE = os.path.join(DOSSIER, "WWIPoets.db")
+#Copie de la base du dépôt, faite avant l'importation de l'application (constantes.py lit WWIPOETS_BASE à l'importation).
+shutil.copy(os.path.join(RACINE, "WWIPoets", "WWIPoets.db"), BASE)
+os.environ["WWIPOETS_BASE"] = BASE
+
+from WWIPoets.app import config_app, db
+#Importation de l'application et de la base de données
+from WWIPoets.banc import CompteurRequetes
+#Importation du compteur de requêtes SQL, déclaré dans le fichier banc.py
+
+UTILISATEUR = 2
+#Compte utilisé par les clients connectés (PaulineChauvet dans la base du dépôt).
+
+
+@pytest.fixture(scope="session")
+def app():
+    """
+    Application configurée avec la configuration "test" (constantes.py) sur la copie de la base, migrée au lancement par config_app.
+    """
+    application = config_app("test")
+    yield application
+    shutil.rmtree(DOSSIER, ignore_errors=True)
+
+
+@pytest.fixture
+def anonyme(app):
+    """
+    Client d'un visiteur anonyme.
+    """
+    return app.test_client()
+
+
+@pytest.fixture
+def connecte(app):
+    """
+    Client d'un.e utilisateur.rice connecté.e (session Flask-Login déjà ouverte).
+    """
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(UTILISATEUR)
+        session["_fresh"] = True
+    return client
+
+
+@pytest.fixture
+def compter(app):
+    """
+    Fonction qui renvoie la réponse d'un appel et le nombre de requêtes SQL qu'il a envoyées à la base.
+    """
+    def compter(client, url):
+        with app.app_context():
+            with CompteurRequetes(db.engine) as compteur:
+                reponse = client.get(url)
+        return reponse, compteur.nombre
+    return compter
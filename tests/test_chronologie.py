@@ -0,0 +1,25 @@
+from WWIPoets.app import db
+#Importation de la base de données
+
+# PAGINATION DE LA CHRONOLOGIE #
+# Une page de /api/timeline compte au plus 'limit' événements ; la suite de l'intervalle d'années se lit en suivant le lien 'next'
+# (curseur 'after'), sans perdre ni répéter d'événement.
+
+
+def test_pages_par_curseur(app, anonyme):
+    with app.app_context():
+        attendus = db.session.execute("SELECT count(*) FROM Evenement WHERE annee BETWEEN 1880 AND 1929").scalar()
+    assert attendus > 20
+    url, vus = "/api/timeline?start=1880&years=50&limit=7", []
+    while url:
+        document = anonyme.get(url).get_json()
+        assert document["meta"]["count"] <= 7
+        vus += [(evenement["type"], evenement["id"]) for evenement in document["data"]]
+        if document["meta"]["next_cursor"] is None:
+            break
+        url = document["links"]["next"].replace("http://localhost", "")
+    assert len(vus) == len(set(vus)) == attendus
+
+
+def test_curseur_invalide(anonyme):
+    assert anonyme.get("/api/timeline?after=1916.deces").status_code == 400
@@ -0,0 +1,59 @@
+import io
+import json
+#Importation des modules io et json pour écrire les fichiers importés.
+import pytest
+#Importation de pytest pour vérifier les exceptions.
+from WWIPoets.app import db
+#Importation de la base de données
+from WWIPoets.modeles.donnees import Poet
+#Importation du modèle Poet, pour retrouver les notices importées
+from WWIPoets.modeles.importation import importer
+#Importation de l'import en masse, déclaré dans le fichier importation.py
+from WWIPoets.modeles.lecture import lecture
+#Importation du modèle de lecture en mémoire
+from conftest import UTILISATEUR
+#Importation du compte auquel les créations sont attribuées
+
+
+def poete(nom, description="Notice importée"):
+    return {"nom": nom, "prenom": "Test", "nationalite": "française", "date_naissance": "1890", "lieu_naissance": "Paris",
+            "description": description, "login_wiki": nom}
+
+
+def test_ligne_csv_illisible(app):
+    entete = ",".join(poete("x"))
+    lignes = [entete] + [",".join(poete(nom).values()) for nom in ("csv-a", "csv-b")]
+    #Un champ plus long que la limite du module csv (131 072 caractères) est une erreur de lecture, pas une erreur de validation.
+    lignes.insert(2, ",".join(poete("csv-l", "x" * 200000).values()))
+    with app.app_context():
+        rapport = importer(io.StringIO("\n".join(lignes) + "\n", newline=""), "csv", UTILISATEUR)
+    assert rapport["importes"] == 2
+    assert [erreur["ligne"] for erreur in rapport["erreurs"]] == [2]
+    assert "CSV" in rapport["erreurs"][0]["erreurs"][0]
+
+
+def test_numero_de_ligne_ndjson(app):
+    lignes = [json.dumps(poete("nd-a")), "", "   ", "{illisible", json.dumps(poete("nd-b"))]
+    with app.app_context():
+        rapport = importer(io.StringIO("\n".join(lignes) + "\n"), "ndjson", UTILISATEUR)
+    assert rapport["importes"] == 2
+    assert rapport["erreurs"] == [{"ligne": 4, "erreurs": ["Ligne Json illisible"]}]
+
+
+def test_lecture_interrompue_apres_un_lot(app):
+    #Plusieurs lots sont enregistrés avant que le décodage du fichier n'échoue (le décodeur lit le flux par blocs de 8 ko).
+    noms = ["coupe-{}".format(numero) for numero in range(4)]
+    corps = "".join(json.dumps(poete(nom, "y" * 5000)) + "\n" for nom in noms).encode("utf-8") + b"\xff\xfe\n"
+    with app.app_context():
+        with pytest.raises(UnicodeDecodeError):
+            importer(io.TextIOWrapper(io.BytesIO(corps), encoding="utf-8"), "ndjson", UTILISATEUR, lot=1)
+        importes = [poet_id for poet_id, in db.session.query(Poet.poet_id).filter(Poet.poet_name.in_(noms))]
+    assert importes
+    #Les notices enregistrées sont visibles sans attendre la vérification de fraîcheur du modèle de lecture.
+    assert all(lecture.poete(poet_id) is not None for poet_id in importes)
+
+
+def test_route_import_lecture_interrompue(connecte):
+    corps = (json.dumps(poete("route-a")) + "\n").encode("utf-8") + b"\xff\n"
+    reponse = connecte.post("/api/import?format=ndjson", data=corps)
+    assert reponse.status_code == 400
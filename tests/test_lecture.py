@@ -0,0 +1,115 @@
+import os
+#Importation du module os pour lire le chemin de la copie de la base utilisée par les tests (variable d'environnement WWIPOETS_BASE).
+import sqlite3
+#Importation de sqlite3 pour écrire dans la base par une autre connexion, comme le ferait un autre processus du serveur.
+import pytest
+#Importation de pytest pour déclarer les fixtures.
+from WWIPoets import cache
+#Importation du module du cache de réponses, remplacé le temps d'un test par un cache en mémoire.
+from WWIPoets.app import db
+#Importation de la base de données
+from WWIPoets.modeles.donnees import Poet
+#Importation du modèle Poet, dont la méthode delete_poets supprime des notices
+from WWIPoets.modeles.lecture import lecture, SIGNATURE_LECTURE
+#Importation du modèle de lecture en mémoire et de sa signature
+
+
+def ecrire_ailleurs(*instructions):
+    """
+    Fonction qui exécute des instructions SQL par une connexion distincte de celle de l'application et renvoie le dernier identifiant créé.
+    """
+    connexion = sqlite3.connect(os.environ["WWIPOETS_BASE"])
+    try:
+        with connexion:
+            for instruction, parametres in instructions:
+                curseur = connexion.execute(instruction, parametres)
+        return curseur.lastrowid
+    finally:
+        connexion.close()
+
+
+def creer_ailleurs(nom):
+    poet_id = ecrire_ailleurs(("INSERT INTO Poet (poet_name, poet_external_login) VALUES (?, ?)", (nom, nom)))
+    ecrire_ailleurs(("INSERT INTO Authorship_poet (authorship_poet_user_id, authorship_poet_poet_id) VALUES (2, ?)", (poet_id,)))
+    return poet_id
+
+
+@pytest.fixture
+def verifier(app, monkeypatch):
+    """
+    Fonction qui lance une vérification de fraîcheur immédiate ; le modèle ne doit jamais être rechargé entièrement.
+    """
+    def charger():
+        raise AssertionError("rechargement complet du modèle de lecture")
+    monkeypatch.setattr(lecture, "intervalle", 0)
+    monkeypatch.setattr(lecture, "charger", charger)
+    with app.app_context():
+        yield lecture.verifier
+
+
+def test_ecritures_d_un_autre_processus(verifier):
+    poet_id = creer_ailleurs("Lecture-ailleurs")
+    verifier()
+    assert lecture.poete(poet_id).poet_name == "Lecture-ailleurs"
+    ecrire_ailleurs(("DELETE FROM Authorship_poet WHERE authorship_poet_poet_id = ?", (poet_id,)),
+                    ("DELETE FROM Poet WHERE poet_id = ?", (poet_id,)),
+                    ("INSERT INTO Suppression (poet_id) VALUES (?)", (poet_id,)))
+    verifier()
+    assert lecture.poete(poet_id) is None
+    assert lecture.signature == tuple(db.session.execute(SIGNATURE_LECTURE).fetchone())
+
+
+def test_ecriture_du_processus(verifier):
+    supprime = creer_ailleurs("Lecture-supprime")
+    verifier()
+    #Une écriture d'un autre processus, validée après la dernière vérification, est relue avec la suppression faite par ce processus.
+    ailleurs = creer_ailleurs("Lecture-concurrent")
+    assert Poet.delete_poets([supprime]) == 1
+    assert lecture.poete(supprime) is None
+    assert lecture.poete(ailleurs).poet_name == "Lecture-concurrent"
+    assert lecture.signature == tuple(db.session.execute(SIGNATURE_LECTURE).fetchone())
+
+
+def modifier_ailleurs(poet_id, description):
+    """
+    Fonction qui modifie la description d'un poète par une autre connexion, avec sa ligne d'historique, comme le ferait un autre processus.
+    """
+    ecrire_ailleurs(("UPDATE Poet SET poet_description = ? WHERE poet_id = ?", (description, poet_id)),
+                    ("INSERT INTO Authorship_poet (authorship_poet_user_id, authorship_poet_poet_id) VALUES (2, ?)", (poet_id,)))
+
+
+@pytest.mark.parametrize("url", ["/poets/{}", "/api/poets/{}"])
+def test_etag_et_notice_concordent(anonyme, url):
+    url = url.format(21)
+    ancienne = anonyme.get(url)
+    description = "Modifiee ailleurs pour {}".format(url)
+    modifier_ailleurs(21, description)
+    #Le modèle de lecture n'a pas encore vérifié la base (MODELE_LECTURE_VERIFICATION) : la nouvelle version doit quand même être servie.
+    reponse = anonyme.get(url, headers={"If-None-Match": ancienne.headers["ETag"]})
+    assert reponse.status_code == 200
+    assert reponse.headers["ETag"] != ancienne.headers["ETag"]
+    assert description in reponse.get_data(as_text=True)
+    assert anonyme.get(url, headers={"If-None-Match": reponse.headers["ETag"]}).status_code == 304
+
+
+def test_reponse_en_cache_de_l_ancienne_version(anonyme, monkeypatch):
+    #Entre la validation d'une écriture par un autre processus et l'invalidation du cache partagé, la réponse en cache est périmée.
+    monkeypatch.setattr(cache, "reponses", cache.MemoireReponses())
+    url = "/api/poets/13"
+    ancienne = anonyme.get(url)
+    assert anonyme.get(url).get_data() == ancienne.get_data()
+    modifier_ailleurs(13, "Modifiee ailleurs, cache non invalide")
+    reponse = anonyme.get(url)
+    assert reponse.headers["ETag"] != ancienne.headers["ETag"]
+    assert "Modifiee ailleurs, cache non invalide" in reponse.get_data(as_text=True)
+
+
+
+def test_cache_d_un_identifiant_non_normalise(anonyme, monkeypatch):
+    monkeypatch.setattr(cache, "reponses", cache.MemoireReponses())
+    assert anonyme.get("/api/poets/024").status_code == 200
+    #La réponse de /api/poets/024 porte l'étiquette du poète 24 : une écriture sur ce poète la retire du cache.
+    assert "poete:24" in cache.reponses.etiquettes
+    cache.invalider_reponses(["poete:24"])
+    assert not cache.reponses.cache.entrees
+    assert anonyme.get("/api/poets/²").status_code == 404
@@ -0,0 +1,46 @@
+from WWIPoets.app import db
+#Importation de la base pour compter les lieux et les poètes rattachés.
+
+
+def parcourir(client, url, cle, liste="data"):
+    """
+    Fonction qui suit les liens de pagination d'une route de l'API et renvoie les éléments lus.
+    :param url: première page
+    :param cle: lien à suivre dans links
+    :param liste: fonction qui extrait les éléments d'une page
+    :rtype: list
+    """
+    elements = []
+    while url:
+        reponse = client.get(url)
+        assert reponse.status_code == 200
+        donnees = reponse.get_json()
+        elements += liste(donnees)
+        url = donnees["links"][cle]
+    return elements
+
+
+def test_liste_des_lieux_paginee(app, anonyme):
+    lieux = parcourir(anonyme, "/api/places?limit=7", "next", lambda donnees: [lieu["id"] for lieu in donnees["data"]])
+    with app.app_context():
+        attendus = db.session.execute("SELECT count(DISTINCT valeur) FROM Facette "
+                                      "WHERE facette IN ('birthplace', 'deathplace', 'recruitment_place')").scalar()
+    assert lieux == sorted(set(lieux))
+    assert len(lieux) == attendus
+
+
+def test_listes_d_un_lieu_paginees(app, anonyme):
+    with app.app_context():
+        place_id, naissances = db.session.execute("SELECT poet_birthplace_id, count(*) FROM Poet GROUP BY poet_birthplace_id "
+                                                  "ORDER BY count(*) DESC LIMIT 1").fetchone()
+    premiere = anonyme.get("/api/places/{}?limit=1".format(place_id)).get_json()
+    assert len(premiere["data"]["births"]) == 1
+    poetes = parcourir(anonyme, "/api/places/{}?limit=1&list=births".format(place_id), "births",
+                       lambda donnees: [poete["id"] for poete in donnees["data"]["births"]])
+    assert len(set(poetes)) == len(poetes) == naissances
+
+
+def test_parametres_invalides(anonyme):
+    assert anonyme.get("/api/places?after=a").status_code == 400
+    assert anonyme.get("/api/places/1?after=3").status_code == 400
+    assert anonyme.get("/api/places/1?list=inconnue").status_code == 400
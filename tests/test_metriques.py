@@ -0,0 +1,31 @@
+import pytest
+#Importation de pytest pour déclarer les fixtures.
+
+JETON = "jeton-des-tests"
+
+
+@pytest.fixture
+def metriques(app, monkeypatch):
+    """
+    Configuration qui publie les métriques (désactivées dans la configuration "test"), avec un jeton d'accès.
+    """
+    monkeypatch.setitem(app.config, "METRIQUES", True)
+    monkeypatch.setitem(app.config, "METRIQUES_JETON", JETON)
+    return app.test_client()
+
+
+def test_adresse_autorisee(metriques):
+    reponse = metriques.get("/metrics")
+    assert reponse.status_code == 200
+    assert b"wwipoets_metrics_sample_rate" in reponse.data
+
+
+@pytest.mark.parametrize("entetes", [{}, {"Authorization": "Bearer autre-jeton"}, {"Authorization": JETON}])
+def test_acces_refuse(metriques, entetes):
+    reponse = metriques.get("/metrics", headers=entetes, environ_base={"REMOTE_ADDR": "203.0.113.7"})
+    assert reponse.status_code == 404
+
+
+def test_acces_par_jeton(metriques):
+    reponse = metriques.get("/metrics", headers={"Authorization": "Bearer " + JETON}, environ_base={"REMOTE_ADDR": "203.0.113.7"})
+    assert reponse.status_code == 200
@@ -0,0 +1,32 @@
+import os
+#Importation du module os pour retrouver la base du dépôt.
+import sqlite3
+#Importation de sqlite3 pour lire la version du schéma de la base du dépôt, sans passer par l'application.
+from WWIPoets.app import db
+#Importation de la base de données
+from WWIPoets.migrations import MIGRATIONS, migrer, verifier_plans, version_schema
+#Importation des migrations et de la vérification des plans d'exécution, déclarées dans le fichier migrations.py
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# MIGRATIONS ET PLANS D'EXÉCUTION #
+# La copie de la base du dépôt est migrée par config_app au lancement des tests (fixture app) : ces tests vérifient que toutes les
+# étapes ont été appliquées, puis qu'aucune requête fréquente de l'application ne lit une table entière ni ne trie dans un B-arbre temporaire.
+
+
+def test_migrations_appliquees(app):
+    depot = sqlite3.connect(os.path.join(RACINE, "WWIPoets", "WWIPoets.db"))
+    version_depot = depot.execute("PRAGMA user_version").fetchone()[0]
+    depot.close()
+    with app.app_context():
+        assert migrer() == []
+        with db.engine.connect() as connexion:
+            version = version_schema(connexion)
+    assert version == MIGRATIONS[-1][0]
+    assert version >= version_depot
+
+
+def test_plans_sans_lecture_complete(app):
+    with app.app_context():
+        defauts = verifier_plans()
+    assert defauts == [], "\n".join("{} : {}".format(nom, " | ".join(details)) for nom, details in defauts)
@@ -0,0 +1,23 @@
+import pytest
+#Importation de pytest pour paramétrer les tests.
+
+# NOMBRE DE REQUÊTES SQL PAR VUE #
+# Une notice et son document Json se lisent en un nombre fixe de requêtes, quel que soit le nombre de publications et d'ESM du poète :
+# - visiteur anonyme : la version de la notice (requête conditionnelle, voir cache.py), la notice étant lue dans le modèle de lecture ;
+# - utilisateur.rice connecté.e : la version, puis le poète, ses publications et ses ESM (Poet.notice_complete), l'utilisateur.rice
+#   étant lu.e dans le cache des utilisateur.rice.s connecté.e.s.
+
+POETES = (21, 13, 24)
+#Poètes de la base du dépôt ayant respectivement 11, 3 et 4 publications.
+
+
+@pytest.mark.parametrize("url", ["/poets/{}", "/api/poets/{}"])
+@pytest.mark.parametrize("profil, attendu", [("anonyme", 1), ("connecte", 4)])
+def test_notice_nombre_fixe_de_requetes(request, compter, url, profil, attendu):
+    client = request.getfixturevalue(profil)
+    #Premier appel : remplit le cache des utilisateur.rice.s connecté.e.s.
+    compter(client, url.format(POETES[0]))
+    for poet_id in POETES:
+        reponse, nombre = compter(client, url.format(poet_id))
+        assert reponse.status_code == 200
+        assert nombre == attendu, "{} ({}) : {} requêtes SQL au lieu de {}".format(url.format(poet_id), profil, nombre, attendu)
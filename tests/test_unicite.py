@@ -0,0 +1,58 @@
+import sqlite3
+#Importation de sqlite3 pour simuler le refus d'une contrainte UNIQUE étrangère à l'identifiant externe.
+import pytest
+#Importation de pytest pour déclarer les fixtures.
+from flask_login import login_user
+#Importation de login_user : les écritures enregistrent l'utilisateur.rice connecté.e dans les tables d'historique.
+from sqlalchemy.exc import IntegrityError
+#Importation de l'exception levée par SQLAlchemy lorsqu'une contrainte de la base refuse une écriture.
+from WWIPoets.app import db
+#Importation de la base de données
+from WWIPoets.modeles import donnees
+from WWIPoets.modeles.donnees import Publication
+#Importation du module donnees.py (pour y remplacer une fonction) et de la classe Publication
+from WWIPoets.modeles.unicite import uniques, PUBLICATION
+#Importation de l'index d'unicité en mémoire, déclaré dans le fichier unicite.py
+from WWIPoets.modeles.utilisateurs import User
+#Importation de la classe User, déclarée dans le fichier utilisateurs.py
+
+# REFUS DES CONTRAINTES UNIQUE #
+# Un refus de la base (IntegrityError) n'est signalé comme un identifiant déjà utilisé que si la base contient réellement cet identifiant.
+
+POETE = 270
+#Poète de la base du dépôt auquel les publications des tests sont rattachées.
+UTILISATEUR = 2
+#Compte utilisé pour les écritures (PaulineChauvet dans la base du dépôt).
+
+
+@pytest.fixture
+def ecriture(app):
+    """
+    Contexte de requête d'un.e utilisateur.rice connecté.e, pour appeler directement les méthodes d'écriture des modèles.
+    """
+    with app.test_request_context():
+        login_user(User.query.get(UTILISATEUR))
+        yield
+
+
+def test_doublon_confirme(ecriture):
+    #Identifiant enregistré par un autre processus : absent de l'index en mémoire, refusé par l'index UNIQUE de la base.
+    db.session.execute("INSERT INTO Publication (publication_titre, publication_date, publication_poet_id, publication_external_login) "
+                       "VALUES ('Titre', '1916', :poete, 'dbl1')", {"poete": POETE})
+    db.session.commit()
+    assert not uniques.existe(PUBLICATION, "dbl1")
+    reussi, erreurs = Publication.create_publication("Autre titre", "1917", "poésie", POETE, "dbl1")
+    assert not reussi
+    assert erreurs == ["Cet identifiant est déjà utilisé"]
+    assert uniques.existe(PUBLICATION, "dbl1")
+
+
+def test_refus_d_une_autre_contrainte(ecriture, monkeypatch):
+    def refus(poet_ids):
+        raise IntegrityError("INSERT INTO Place_variant ...", {}, sqlite3.IntegrityError("UNIQUE constraint failed: Place_variant.variant"))
+    monkeypatch.setattr(donnees, "rafraichir_evenements", refus)
+    reussi, erreurs = Publication.create_publication("Titre", "1918", "poésie", POETE, "ndbl1")
+    assert not reussi
+    assert "Place_variant" in erreurs[0]
+    assert not uniques.existe(PUBLICATION, "ndbl1")
+    assert Publication.query.filter(Publication.publication_external_login == "ndbl1").count() == 0